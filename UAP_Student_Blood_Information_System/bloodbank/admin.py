@@ -1,17 +1,45 @@
 from django.contrib import admin
-from .models import UserProfile, BloodRequest, Notification
+from .models import (
+    UserProfile, BloodRequest, Notification, NotificationBroadcast, NotificationJob, GeocodedAddress, ArchivedNotification,
+)
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'blood_group', 'is_available', 'is_donor']
     list_filter = ['blood_group', 'is_available', 'is_donor']
+    list_select_related = ['user']
 
 @admin.register(BloodRequest)
 class BloodRequestAdmin(admin.ModelAdmin):
     list_display = ['requester', 'blood_group', 'status', 'urgency', 'created_at']
     list_filter = ['status', 'blood_group', 'urgency']
+    list_select_related = ['requester']
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['user', 'notification_type', 'title', 'is_read', 'created_at']
+    list_display = ['user', 'notification_type', 'display_title', 'is_read', 'created_at']
     list_filter = ['notification_type', 'is_read']
+    list_select_related = ['user', 'broadcast']
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    list_display = ['notification_type', 'title', 'blood_request', 'created_at']
+    list_filter = ['notification_type']
+    # BloodRequest.__str__ shows the requester's username
+    list_select_related = ['blood_request__requester']
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['job_type', 'status', 'attempts', 'idempotency_key', 'created_at', 'finished_at']
+    list_filter = ['job_type', 'status']
+
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    list_display = ['address', 'latitude', 'longitude', 'backend', 'updated_at']
+    list_filter = ['backend']
+    search_fields = ['address']
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user_id', 'notification_type', 'title', 'created_at', 'archived_at']
+    list_filter = ['notification_type']
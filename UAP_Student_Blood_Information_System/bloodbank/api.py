@@ -0,0 +1,224 @@
+import math
+from functools import wraps
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import conditional_page, require_GET
+
+from .geolocation import nearest_donor_ids
+from .matching import recipient_groups_for
+from .models import BloodRequest, Notification, BLOOD_GROUPS
+from .pagination import keyset_page, page_size_from, decode_cursor, encode_distance_cursor, decode_distance_cursor
+from .search import available_donors, search_origin, MAX_SEARCH_RADIUS_KM
+
+# Public field name -> values() lookup, per resource. ?fields= picks a subset,
+# the default is all of them.
+DONOR_FIELDS = {
+    'id': 'id',
+    'username': 'user__username',
+    'blood_group': 'blood_group',
+    'address': 'address',
+    'phone': 'phone',
+    'last_donation_date': 'last_donation_date',
+    'latitude': 'latitude',
+    'longitude': 'longitude',
+    'created_at': 'created_at',
+}
+
+# Radius search only: computed, not a column
+DISTANCE_FIELD = 'distance_km'
+
+REQUEST_FIELDS = {
+    'id': 'id',
+    'requester': 'requester__username',
+    'blood_group': 'blood_group',
+    'units_required': 'units_required',
+    'urgency': 'urgency',
+    'status': 'status',
+    'message': 'message',
+    'hospital_name': 'hospital_name',
+    'hospital_address': 'hospital_address',
+    'contact_person': 'contact_person',
+    'contact_phone': 'contact_phone',
+    'needed_by': 'needed_by',
+    'accepted_by': 'accepted_by__username',
+    'created_at': 'created_at',
+}
+
+NOTIFICATION_FIELDS = {
+    'id': 'id',
+    'type': 'notification_type',
+    # Annotated in my_notifications: fan-out rows keep their text on the broadcast
+    'title': 'text_title',
+    'message': 'text_message',
+    'is_read': 'is_read',
+    'blood_request_id': 'blood_request_id',
+    'created_at': 'created_at',
+}
+
+BLOOD_GROUP_CODES = {code for code, _ in BLOOD_GROUPS}
+
+
+class ApiError(Exception):
+    """Bad query parameters, answered with 400 and the message"""
+
+
+def api_view(view):
+    """
+    Read-only JSON endpoint for signed-in users: 401 instead of a login
+    redirect, ApiError as 400, and gzip plus an ETag of the body so an
+    unchanged page costs a 304 and no transfer.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    return require_GET(gzip_page(conditional_page(cache_control(private=True, no_cache=True)(wrapper))))
+
+
+def _selected_fields(request, available):
+    """Field names from ?fields=a,b in the order given, all of available without it"""
+    fields = [name for name in request.GET.get('fields', '').split(',') if name]
+    if not fields:
+        return list(available)
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def _values(queryset, fields, available):
+    """values() of the selected fields plus id and created_at, which cursors need"""
+    lookups = {available[name] for name in fields} | {'id', 'created_at'}
+    return queryset.values(*lookups)
+
+
+def _serialize(rows, fields, available):
+    return [{name: row[available[name]] for name in fields} for row in rows]
+
+
+def _blood_group_param(request, name):
+    blood_group = request.GET.get(name, '')
+    if blood_group and blood_group not in BLOOD_GROUP_CODES:
+        raise ApiError(f'Unknown blood group: {blood_group}')
+    return blood_group
+
+
+def _radius_param(request):
+    """?radius= in km, clamped to the search limits; nan, inf or text is a 400"""
+    try:
+        radius = float(request.GET['radius'])
+    except ValueError:
+        radius = math.nan
+    if not math.isfinite(radius):
+        raise ApiError(f"radius must be a number of km, not {request.GET['radius']!r}")
+    return min(max(radius, 0.1), MAX_SEARCH_RADIUS_KM)
+
+
+def _cursor_param(request, decode):
+    """?cursor= decoded with decode, None without one; a cursor that does not decode is a 400"""
+    cursor = request.GET.get('cursor')
+    position = decode(cursor)
+    if cursor and position is None:
+        raise ApiError('Invalid cursor')
+    return position
+
+
+def _page(request, queryset, available):
+    fields = _selected_fields(request, available)
+    # keyset_page treats a bad cursor as page 1, the API answers 400 instead
+    _cursor_param(request, decode_cursor)
+    rows, next_cursor = keyset_page(_values(queryset, fields, available), request.GET.get('cursor'), page_size_from(request))
+    return JsonResponse({'results': _serialize(rows, fields, available), 'next_cursor': next_cursor})
+
+
+@api_view
+def donors(request):
+    """
+    Available donors, filtered like the donor list: blood_group, location
+    (text in the address). With radius (km) the search is around lat/lng,
+    or the caller's profile, nearest first and with distance_km.
+    """
+    blood_group = _blood_group_param(request, 'blood_group')
+    queryset = available_donors(blood_group, request.GET.get('location', '')).exclude(user=request.user)
+
+    if 'radius' not in request.GET:
+        return _page(request, queryset, DONOR_FIELDS)
+
+    available = {**DONOR_FIELDS, DISTANCE_FIELD: DISTANCE_FIELD}
+    fields = _selected_fields(request, available)
+    columns = [name for name in fields if name != DISTANCE_FIELD]
+    radius = _radius_param(request)
+    origin = search_origin(request)
+    if origin is None:
+        raise ApiError('Give lat and lng, or set an address in your profile')
+
+    after = _cursor_param(request, decode_distance_cursor)
+    page_size = page_size_from(request)
+    closest = nearest_donor_ids(origin[0], origin[1], radius, page_size + 1, queryset, after)
+
+    page = closest[:page_size]
+    rows_by_id = {row['id']: row for row in _values(queryset, columns, DONOR_FIELDS).filter(pk__in=[pk for _, pk in page])}
+    rows = []
+    for distance, pk in page:
+        # Gone if the donor stopped matching between the two queries
+        row = rows_by_id.get(pk)
+        if row is None:
+            continue
+        row[DISTANCE_FIELD] = round(distance, 2)
+        rows.append(row)
+    next_cursor = encode_distance_cursor(*page[-1]) if len(closest) > page_size else None
+    return JsonResponse({'results': _serialize(rows, fields, available), 'next_cursor': next_cursor})
+
+
+@api_view
+def open_requests(request):
+    """
+    Pending blood requests, newest first: blood_group for one group,
+    compatible_with for every group a donor of that group can give to.
+    """
+    queryset = BloodRequest.objects.filter(status='pending')
+    blood_group = _blood_group_param(request, 'blood_group')
+    if blood_group:
+        queryset = queryset.filter(blood_group=blood_group)
+    donor_group = _blood_group_param(request, 'compatible_with')
+    if donor_group:
+        queryset = queryset.filter(blood_group__in=recipient_groups_for(donor_group))
+    return _page(request, queryset, REQUEST_FIELDS)
+
+
+@api_view
+def my_requests(request):
+    """The caller's blood requests, newest first, optionally of one status"""
+    queryset = BloodRequest.objects.filter(requester=request.user)
+    status = request.GET.get('status')
+    if status:
+        if status not in dict(BloodRequest.STATUS_CHOICES):
+            raise ApiError(f'Unknown status: {status}')
+        queryset = queryset.filter(status=status)
+    return _page(request, queryset, REQUEST_FIELDS)
+
+
+@api_view
+def my_notifications(request):
+    """The caller's notifications, newest first: unread=1 for unread ones, type for one type"""
+    queryset = Notification.objects.filter(user=request.user).annotate(
+        text_title=Coalesce(F('broadcast__title'), F('title')),
+        text_message=Coalesce(F('broadcast__message'), F('message')),
+    )
+    if request.GET.get('unread') == '1':
+        queryset = queryset.filter(is_read=False)
+    notification_type = request.GET.get('type')
+    if notification_type:
+        if notification_type not in dict(Notification.NOTIFICATION_TYPES):
+            raise ApiError(f'Unknown type: {notification_type}')
+        queryset = queryset.filter(notification_type=notification_type)
+    return _page(request, queryset, NOTIFICATION_FIELDS)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class BloodbankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'UAP_Student_Blood_Information_System.bloodbank'  # Full path to the app
+
+    def ready(self):
+        # Fragment cache invalidation on UserProfile/BloodRequest changes
+        from . import signals  # noqa: F401
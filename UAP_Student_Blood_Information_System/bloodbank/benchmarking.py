@@ -0,0 +1,60 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.test import override_settings
+
+from .models import Notification
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def best_of(repeat, func):
+    """Best time of repeat calls to func, in seconds, and the last result"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class QueryCounter:
+    """execute_wrapper counting all queries and those touching the notification table"""
+
+    def __init__(self):
+        self.total = 0
+        self.notifications = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        if Notification._meta.db_table in sql:
+            self.notifications += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        """connection_created receiver, for connections opened in other threads"""
+        connection.execute_wrappers.append(self)
+
+    def reset(self):
+        self.total = self.notifications = 0
+
+
+@contextmanager
+def rolled_back():
+    """A transaction rolled back at the end of the block, so nothing seeded in it is kept"""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def allow_testserver():
+    """Accept the Host: testserver the test client sends, as the test runner does"""
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
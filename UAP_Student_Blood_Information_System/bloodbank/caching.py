@@ -0,0 +1,66 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BLOOD_GROUPS
+
+# Rendered fragments are dropped after this long even if nothing changed
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Version keys outlive the fragments built on them
+GROUP_VERSION_TIMEOUT = 60 * 60 * 24
+
+ALL_BLOOD_GROUPS = [code for code, _ in BLOOD_GROUPS]
+
+
+def group_version_key(kind, blood_group):
+    return f"{kind}_version:{blood_group}"
+
+
+def group_versions(kind, blood_groups):
+    """Current version of kind ('donors', 'requests') rows for each blood group"""
+    keys = [group_version_key(kind, blood_group) for blood_group in blood_groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A version lost from the cache comes back as a new one, never
+            # as one an older fragment was stored under
+            version = time.time_ns()
+            cache.add(key, version, GROUP_VERSION_TIMEOUT)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump_group_versions(kind, blood_groups):
+    """
+    Give blood groups a new version, so every fragment built from their
+    rows is missed. Done right away for reads later in this transaction
+    and again on commit, in case another request cached rows read before it.
+    signals.py calls it on save and delete; update() and bulk_create()
+    send no signals, so code writing rows that way calls it itself.
+    """
+    keys = {group_version_key(kind, blood_group) for blood_group in blood_groups if blood_group}
+    if not keys:
+        return
+    bump = lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), GROUP_VERSION_TIMEOUT)
+    bump()
+    transaction.on_commit(bump)
+
+
+def cached_cards(name, kind, blood_groups, params, build):
+    """
+    Cards of a list fragment: build() returns [(row, html), ...] and runs
+    only on a miss. The key holds params and the versions of the blood groups
+    the rows come from, read before build() so a concurrent change is never
+    cached under the new version.
+    """
+    versions = group_versions(kind, blood_groups)
+    raw = '|'.join(str(part) for part in (*params, *versions))
+    key = f"fragment:{name}:{hashlib.sha256(raw.encode()).hexdigest()}"
+    cards = cache.get(key)
+    if cards is None:
+        cards = build()
+        cache.set(key, cards, FRAGMENT_CACHE_TIMEOUT)
+    return cards
@@ -1,7 +1,8 @@
-from UAP_Student_Blood_Information_System.bloodbank.models import Notification
+from UAP_Student_Blood_Information_System.bloodbank.utils import get_unread_count
 
 def notification_count(request):
     if request.user.is_authenticated:
-        unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+        # Memoized on request.user, so views that already looked it up cost nothing
+        unread_count = get_unread_count(request.user)
         return {'unread_count': unread_count}
     return {'unread_count': 0}
\ No newline at end of file
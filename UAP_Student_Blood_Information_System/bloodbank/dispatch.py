@@ -0,0 +1,203 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_group_versions
+from .images import delete_unused_variants, resize_picture
+from .models import NotificationJob, BloodRequest, UserProfile
+from .utils import send_blood_request_notifications, send_request_accepted_notification, send_donor_available_notifications
+
+# Give up on a job after this many failed attempts
+MAX_ATTEMPTS = 5
+
+# A job still 'running' this long after being claimed belongs to a dead worker
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+def _blood_request_job(payload):
+    blood_request = BloodRequest.objects.select_related('requester').get(pk=payload['blood_request_id'])
+    return send_blood_request_notifications(blood_request)
+
+
+def _request_accepted_job(payload):
+    blood_request = BloodRequest.objects.select_related('requester', 'accepted_by').get(pk=payload['blood_request_id'])
+    send_request_accepted_notification(blood_request)
+    return 1
+
+
+def _donor_available_job(payload):
+    donor_profile = UserProfile.objects.get(pk=payload['profile_id'])
+    return send_donor_available_notifications(donor_profile)
+
+
+def _profile_picture_job(payload):
+    # Skip jobs for a picture that has been replaced since
+    if UserProfile.objects.filter(pk=payload['profile_id'], profile_picture=payload['picture']).exists():
+        digest = resize_picture(payload['picture'])
+        UserProfile.objects.filter(
+            pk=payload['profile_id'], profile_picture=payload['picture']
+        ).update(picture_hash=digest)
+    previous_hash = payload.get('previous_hash')
+    if previous_hash:
+        # After the new hash is committed, and only if no profile shows them
+        transaction.on_commit(lambda: delete_unused_variants(previous_hash))
+    return 0
+
+
+JOB_HANDLERS = {
+    'blood_request': _blood_request_job,
+    'request_accepted': _request_accepted_job,
+    'donor_available': _donor_available_job,
+    'profile_picture': _profile_picture_job,
+}
+
+
+def enqueue(job_type, idempotency_key, **payload):
+    """
+    Queue a background job and return it. A job with the same
+    idempotency_key is only ever queued once.
+    """
+    job, created = NotificationJob.objects.get_or_create(
+        idempotency_key=idempotency_key,
+        defaults={'job_type': job_type, 'payload': payload},
+    )
+
+    # Eager mode runs the job right away, handy for tests and single-process setups
+    if created and getattr(settings, 'NOTIFICATION_QUEUE_EAGER', False):
+        transaction.on_commit(lambda: run_job(job))
+
+    return job
+
+
+def accept_blood_request(blood_request, donor):
+    """
+    Assign a pending request to donor and queue the requester's notification,
+    in one transaction. Returns False when the request was no longer pending.
+    The conditional UPDATE means two donors never both accept the same request.
+    """
+    with transaction.atomic():
+        accepted = BloodRequest.objects.filter(pk=blood_request.pk, status='pending').update(
+            accepted_by=donor,
+            accepted_at=timezone.now(),
+            status='accepted',
+        )
+        if accepted:
+            bump_group_versions('requests', [blood_request.blood_group])
+            enqueue(
+                'request_accepted',
+                f'request_accepted:{blood_request.pk}:{donor.pk}',
+                blood_request_id=blood_request.pk,
+            )
+    return bool(accepted)
+
+
+def queue_depth():
+    """Number of jobs waiting to be processed"""
+    return NotificationJob.objects.filter(status__in=['pending', 'running']).count()
+
+
+class JobLost(Exception):
+    """The job was released and claimed by another worker while this one ran it"""
+
+
+def _stamp_claim(job):
+    """
+    Mark job running, claimed now, if it is still in the state this worker
+    last saw. The claim time doubles as the worker's token: a stale job put
+    back in the queue and claimed again gets a new one.
+    """
+    claimed_at = timezone.now()
+    if not NotificationJob.objects.filter(pk=job.pk, status=job.status, available_at=job.available_at).update(
+        status='running', available_at=claimed_at
+    ):
+        return False
+    job.status, job.available_at = 'running', claimed_at
+    return True
+
+
+def claim_jobs(batch_size):
+    """
+    Mark up to batch_size due jobs as running and return them.
+    The conditional UPDATE means two workers never claim the same job.
+    """
+    due = NotificationJob.objects.filter(status='pending', available_at__lte=timezone.now()).order_by('available_at', 'id')
+    return [job for job in due[:batch_size] if _stamp_claim(job)]
+
+
+def release_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """
+    Put jobs claimed by a worker that died back in the queue. Safe because
+    an unfinished job's notifications were rolled back with it, and a worker
+    that turns out to be alive cannot finish a job claimed again since.
+    """
+    return NotificationJob.objects.filter(
+        status='running', available_at__lt=timezone.now() - timeout
+    ).update(status='pending')
+
+
+def run_job(job, max_attempts=MAX_ATTEMPTS):
+    """
+    Run one job. The notifications and the 'done' mark are committed in the
+    same transaction, and only while this worker still holds the claim, so
+    a failed, retried or released job never leaves duplicates.
+    Returns the number of notifications created (0 on failure).
+    """
+    handler = JOB_HANDLERS[job.job_type]
+    # Renewing the claim right before running keeps jobs that waited their
+    # turn in a batch from looking stale
+    if not _stamp_claim(job):
+        return 0
+    claimed = NotificationJob.objects.filter(pk=job.pk, status='running', available_at=job.available_at)
+    attempts = job.attempts + 1
+    try:
+        with transaction.atomic():
+            created = handler(job.payload)
+            finished_at = timezone.now()
+            if not claimed.update(attempts=attempts, status='done', last_error='', finished_at=finished_at):
+                raise JobLost
+        job.attempts, job.status, job.last_error, job.finished_at = attempts, 'done', '', finished_at
+        return created
+    except JobLost:
+        return 0
+    except Exception as e:
+        job.attempts = attempts
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= max_attempts:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        else:
+            # Exponential backoff: 2, 4, 8, ... seconds
+            job.status = 'pending'
+            job.available_at = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        claimed.update(
+            attempts=job.attempts, status=job.status, last_error=job.last_error,
+            available_at=job.available_at, finished_at=job.finished_at,
+        )
+        return 0
+
+
+def process_batch(batch_size=50, max_attempts=MAX_ATTEMPTS):
+    """
+    Drain one batch of due jobs. Returns a stats dict with jobs processed,
+    failures, notifications created, batch latency and remaining queue depth.
+    """
+    start = time.perf_counter()
+    release_stale_jobs()
+    jobs = claim_jobs(batch_size)
+
+    created = failed = 0
+    for job in jobs:
+        created += run_job(job, max_attempts)
+        if job.status != 'done':
+            failed += 1
+
+    return {
+        'jobs': len(jobs),
+        'failed': failed,
+        'notifications': created,
+        'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+        'queue_depth': queue_depth(),
+    }
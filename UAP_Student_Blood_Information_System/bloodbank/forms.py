@@ -1,3 +1,5 @@
+import os
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
@@ -68,11 +70,6 @@ class ProfileEditForm(forms.ModelForm):
             user.last_name = self.cleaned_data['last_name']
             user.email = self.cleaned_data['email']
             user.save()
-
-            # Handle profile picture
-            if 'profile_picture' in self.changed_data:
-                profile.save() 
-
             profile.save()
 
         return profile
@@ -173,49 +170,3 @@ class BloodRequestForm(forms.ModelForm):
         if commit:
             instance.save()
         return instance
-
-class ProfileEditForm(forms.ModelForm):
-    # User model fields
-    first_name = forms.CharField(max_length=30, required=False, help_text="Your first name")
-    last_name = forms.CharField(max_length=30, required=False, help_text="Your last name")
-    email = forms.EmailField(help_text="Your email address")
-
-    class Meta:
-        model = UserProfile
-        fields = [
-            'first_name', 'last_name', 'email',  # User model fields
-            'blood_group', 'phone', 'address', 'date_of_birth',
-            'is_donor', 'is_available', 'last_donation_date'
-        ]
-        widgets = {
-            'address': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Enter your current address...'}),
-            'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
-            'last_donation_date': forms.DateInput(attrs={'type': 'date'})
-        }
-        help_texts = {
-            'is_available': 'Toggle this if you are currently available to donate blood',
-            'last_donation_date': 'When did you last donate blood? (Important for eligibility)',
-        }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # initial values for User model fields
-        if self.instance and self.instance.user:
-            self.fields['first_name'].initial = self.instance.user.first_name
-            self.fields['last_name'].initial = self.instance.user.last_name
-            self.fields['email'].initial = self.instance.user.email
-
-    def save(self, commit=True):
-        # Save UserProfile first
-        profile = super().save(commit=False)
-        
-        # Update User model fields
-        if commit:
-            user = profile.user
-            user.first_name = self.cleaned_data['first_name']
-            user.last_name = self.cleaned_data['last_name']
-            user.email = self.cleaned_data['email']
-            user.save()
-            profile.save()
-        
-        return profile
\ No newline at end of file
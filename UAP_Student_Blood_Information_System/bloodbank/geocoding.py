@@ -0,0 +1,186 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import GeocodedAddress
+
+# Where an address nobody can place ends up, as before the cache existed
+DEFAULT_LOCATION = (23.8151, 90.4255)
+
+# Addresses the geocoder could not place are asked again after this long
+NEGATIVE_CACHE_TTL = timedelta(days=7)
+
+# Places FixtureGeocoder knows, keyed by normalized name
+UAP_LOCATIONS = {
+    'uap campus': (23.8151, 90.4255),
+    'kuratoli': (23.8151, 90.4255),
+    'mirpur': (23.8067, 90.3683),
+    'dhanmondi': (23.7465, 90.3760),
+    'gulshan': (23.7940, 90.4154),
+    'banani': (23.7940, 90.4054),
+    'uttara': (23.8759, 90.3795),
+}
+
+
+class GeocoderError(Exception):
+    """A lookup failed for a transient reason; the result is not cached"""
+
+
+class FixtureGeocoder:
+    """Offline geocoder matching known place names inside the address"""
+
+    def __init__(self, locations=None):
+        self.locations = {normalize_address(name): tuple(coords) for name, coords in (locations or UAP_LOCATIONS).items()}
+
+    def geocode(self, address):
+        for name, coords in self.locations.items():
+            if name in address:
+                return coords
+        return None
+
+
+class NominatimGeocoder:
+    """
+    OpenStreetMap Nominatim search API, one request per address. Its usage
+    policy allows one request per second, so requests from every instance
+    and thread in the process are spaced min_interval seconds apart.
+    """
+
+    url = 'https://nominatim.openstreetmap.org/search'
+
+    # Shared by all instances: geocode_backfill's worker pool and web
+    # requests each build their own geocoder
+    _throttle = threading.Lock()
+    _last_request = float('-inf')
+
+    def __init__(self, user_agent='uap-blood-bank', timeout=5, country_codes='bd', min_interval=1.0):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.country_codes = country_codes
+        self.min_interval = min_interval
+
+    def wait_for_turn(self):
+        """Block until min_interval has passed since the last request was sent"""
+        cls = type(self)
+        with cls._throttle:
+            delay = cls._last_request + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            cls._last_request = time.monotonic()
+
+    def geocode(self, address):
+        query = urlencode({'q': address, 'format': 'json', 'limit': 1, 'countrycodes': self.country_codes})
+        request = Request(f'{self.url}?{query}', headers={'User-Agent': self.user_agent})
+        self.wait_for_turn()
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                results = json.load(response)
+        except (URLError, TimeoutError, ValueError) as e:
+            raise GeocoderError(str(e)) from e
+        if not results:
+            return None
+        try:
+            return float(results[0]['lat']), float(results[0]['lon'])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise GeocoderError(f'Unexpected Nominatim response: {results!r:.200}') from e
+
+
+def get_geocoder():
+    config = getattr(settings, 'GEOCODER', {})
+    backend = import_string(config.get('BACKEND', 'UAP_Student_Blood_Information_System.bloodbank.geocoding.FixtureGeocoder'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def normalize_address(address):
+    """Lowercase, punctuation dropped, whitespace collapsed: the cache key text"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', address.lower()).split())
+
+
+def address_key(normalized):
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def cached_lookups(normalized_addresses):
+    """
+    Cached results for the given normalized addresses in one query:
+    {address: (lat, lng) or None}. Expired negative entries are left out.
+    """
+    keys = {address_key(address): address for address in normalized_addresses}
+    stale_before = timezone.now() - NEGATIVE_CACHE_TTL
+    results = {}
+    for entry in GeocodedAddress.objects.filter(key__in=keys):
+        if entry.found:
+            results[keys[entry.key]] = (entry.latitude, entry.longitude)
+        elif entry.updated_at >= stale_before:
+            results[keys[entry.key]] = None
+    return results
+
+
+def store_lookups(results, backend):
+    """Save {normalized address: (lat, lng) or None} to the cache table"""
+    GeocodedAddress.objects.bulk_create(
+        [
+            GeocodedAddress(
+                key=address_key(address),
+                address=address,
+                latitude=coords[0] if coords else None,
+                longitude=coords[1] if coords else None,
+                backend=backend,
+            )
+            for address, coords in results.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['latitude', 'longitude', 'backend', 'updated_at'],
+    )
+
+
+def geocode_many(addresses, geocoder=None, executor=None):
+    """
+    Geocode addresses through the cache. Misses go to the geocoder, through
+    executor.map when a worker pool is given. Returns (results, stats):
+    results maps normalized address -> (lat, lng) or None and leaves out
+    addresses whose lookup failed; stats counts cached, looked_up and errors.
+    """
+    geocoder = geocoder or get_geocoder()
+    normalized = {normalize_address(address) for address in addresses} - {''}
+    results = cached_lookups(normalized)
+    misses = sorted(normalized - results.keys())
+
+    def lookup(address):
+        try:
+            return address, geocoder.geocode(address), None
+        except GeocoderError as e:
+            return address, None, e
+
+    looked_up = {}
+    errors = 0
+    for address, coords, error in (executor.map if executor else map)(lookup, misses):
+        if error:
+            errors += 1
+        else:
+            looked_up[address] = coords
+
+    if looked_up:
+        store_lookups(looked_up, type(geocoder).__name__)
+    results.update(looked_up)
+    return results, {'cached': len(normalized) - len(misses), 'looked_up': len(looked_up), 'errors': errors}
+
+
+def geocode_address(address, default=DEFAULT_LOCATION):
+    """
+    Coordinates for address, from the cache when it has been seen before.
+    Returns default when the geocoder cannot place it.
+    """
+    results, _ = geocode_many([address])
+    return results.get(normalize_address(address)) or default
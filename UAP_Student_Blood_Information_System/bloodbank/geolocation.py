@@ -1,12 +1,81 @@
-from math import radians, sin, cos, sqrt, atan2
-from django.db.models import Q
+import heapq
+from itertools import islice
+from math import radians, degrees, sin, cos, sqrt, atan2, floor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, batch functions fall back to calculate_distance
+    np = None
+
+EARTH_RADIUS_KM = 6371
+
+# Size of one spatial grid cell in degrees (~5.5 km of latitude).
+# Donor rows store the cell they fall in so radius searches only have
+# to look at a handful of cells instead of every donor.
+GEO_CELL_SIZE = 0.05
+
+# Beyond this many cells the IN (...) list stops paying off and the
+# bounding box filter alone is used.
+MAX_GEO_CELLS = 400
+
+
+def geo_cell_for(latitude, longitude):
+    """
+    Return the grid cell key ("row:col") for a coordinate
+    """
+    if latitude is None or longitude is None:
+        return None
+    row = floor(float(latitude) / GEO_CELL_SIZE)
+    col = floor(float(longitude) / GEO_CELL_SIZE)
+    return f"{row}:{col}"
+
+
+def bounding_box(latitude, longitude, max_distance_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing the search circle
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    lat_delta = degrees(max_distance_km / EARTH_RADIUS_KM)
+
+    # Longitude degrees shrink towards the poles
+    cos_lat = cos(radians(latitude))
+    if cos_lat < 1e-6 or max_distance_km / EARTH_RADIUS_KM >= cos_lat:
+        lng_delta = 180.0
+    else:
+        lng_delta = degrees(max_distance_km / (EARTH_RADIUS_KM * cos_lat))
+
+    return (
+        max(latitude - lat_delta, -90.0),
+        min(latitude + lat_delta, 90.0),
+        max(longitude - lng_delta, -180.0),
+        min(longitude + lng_delta, 180.0),
+    )
+
+
+def cells_in_bbox(min_lat, max_lat, min_lng, max_lng):
+    """
+    List the grid cell keys covering a bounding box, or None if there are
+    too many of them to be worth filtering on
+    """
+    min_row, max_row = floor(min_lat / GEO_CELL_SIZE), floor(max_lat / GEO_CELL_SIZE)
+    min_col, max_col = floor(min_lng / GEO_CELL_SIZE), floor(max_lng / GEO_CELL_SIZE)
+
+    if (max_row - min_row + 1) * (max_col - min_col + 1) > MAX_GEO_CELLS:
+        return None
+
+    return [
+        f"{row}:{col}"
+        for row in range(min_row, max_row + 1)
+        for col in range(min_col, max_col + 1)
+    ]
+
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """
     Calculate distance between two points using Haversine formula
     Returns distance in kilometers
     """
-    R = 6371  # Earth's radius in kilometers
+    R = EARTH_RADIUS_KM
     
     lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
     
@@ -18,55 +87,137 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return R * c
 
+def distance_matrix(origin_lats, origin_lngs, latitudes, longitudes):
+    """
+    Haversine distances in kilometers from every origin to every point.
+    Returns a len(origins) x len(points) array (nested lists without NumPy).
+    """
+    if np is None:
+        return [
+            [calculate_distance(o_lat, o_lng, lat, lng) for lat, lng in zip(latitudes, longitudes)]
+            for o_lat, o_lng in zip(origin_lats, origin_lngs)
+        ]
+
+    lat1 = np.radians(np.asarray(origin_lats, dtype=float))[:, np.newaxis]
+    lon1 = np.radians(np.asarray(origin_lngs, dtype=float))[:, np.newaxis]
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))[np.newaxis, :]
+    lon2 = np.radians(np.asarray(longitudes, dtype=float))[np.newaxis, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+def batch_distances(latitude, longitude, latitudes, longitudes):
+    """
+    Haversine distances in kilometers from one origin to many points
+    """
+    return distance_matrix([latitude], [longitude], latitudes, longitudes)[0]
+
+def distances_within(latitude, longitude, max_distance_km, ids, latitudes, longitudes):
+    """
+    Return [(distance, id), ...] for the points within max_distance_km
+    """
+    distances = batch_distances(latitude, longitude, latitudes, longitudes)
+    if np is None:
+        return [(d, i) for d, i in zip(distances, ids) if d <= max_distance_km]
+
+    keep = np.flatnonzero(distances <= max_distance_km)
+    return [(float(distances[k]), ids[k]) for k in keep]
+
+def nearby_donor_candidates(latitude, longitude, max_distance_km=1, donors=None):
+    """
+    Narrow a donor queryset to the grid cells and bounding box around a point.
+    Every donor within max_distance_km is kept; some further away may remain
+    and still need the exact Haversine check.
+    """
+    from .models import UserProfile, eligible_to_donate
+
+    if donors is None:
+        donors = UserProfile.objects.filter(eligible_to_donate(), is_donor=True, is_available=True)
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, max_distance_km)
+    donors = donors.filter(
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lng, max_lng),
+    )
+
+    cells = cells_in_bbox(min_lat, max_lat, min_lng, max_lng)
+    if cells is not None:
+        donors = donors.filter(geo_cell__in=cells)
+
+    return donors
+
 def get_nearby_donors(latitude, longitude, max_distance_km=1, blood_group=None):
     """
     Find donors within max_distance_km radius
-    This is a simplified version - for production use PostGIS
+    Candidates come from the geo_cell index and a bounding box prefilter,
+    only those get the exact Haversine check
     """
-    from .models import UserProfile
-    
+    from .models import UserProfile, eligible_to_donate
+
     donors = UserProfile.objects.filter(
+        eligible_to_donate(),
         is_donor=True,
         is_available=True,
-        latitude__isnull=False,
-        longitude__isnull=False
     )
-    
+
     if blood_group:
         donors = donors.filter(blood_group=blood_group)
-    
+
+    donors = list(nearby_donor_candidates(latitude, longitude, max_distance_km, donors))
+
+    within = distances_within(
+        latitude, longitude, max_distance_km,
+        range(len(donors)),
+        [donor.latitude for donor in donors],
+        [donor.longitude for donor in donors],
+    )
+
     nearby_donors = []
-    for donor in donors:
-        distance = calculate_distance(
-            latitude, longitude,
-            donor.latitude, donor.longitude
-        )
-        if distance <= max_distance_km:
-            donor.distance = round(distance, 2)  # Add distance to donor object
-            nearby_donors.append(donor)
-    
-    return sorted(nearby_donors, key=lambda x: x.distance)
-
-def geocode_address(address):
-    """
-    Convert address to coordinates using a geocoding service
-    For now, we'll use a mock - integrate with Google Maps/OpenStreetMap later
-    """
-    # Mock coordinates for UAP areas
-    uap_locations = {
-        'uap campus': (23.8151, 90.4255),
-        'kuratoli': (23.8151, 90.4255),
-        'mirpur': (23.8067, 90.3683),
-        'dhanmondi': (23.7465, 90.3760),
-        'gulshan': (23.7940, 90.4154),
-        'banani': (23.7940, 90.4054),
-        'uttara': (23.8759, 90.3795),
-    }
-    
-    address_lower = address.lower()
-    for location, coords in uap_locations.items():
-        if location in address_lower:
-            return coords
-    
-    # Default to UAP campus if no match
-    return (23.8151, 90.4255)
\ No newline at end of file
+    for distance, index in sorted(within):
+        donor = donors[index]
+        donor.distance = round(distance, 2)  # Add distance to donor object
+        nearby_donors.append(donor)
+
+    return nearby_donors
+
+def nearest_donor_ids(latitude, longitude, max_distance_km=1, limit=20, donors=None, after=None):
+    """
+    [(distance, id), ...] of the top-K nearest donors within max_distance_km,
+    sorted by distance. Only (id, latitude, longitude) tuples of the
+    candidates are streamed from the database. after=(distance, id) skips
+    that donor and every nearer one, to page through the results.
+    """
+    candidates = nearby_donor_candidates(latitude, longitude, max_distance_km, donors)
+    rows = candidates.values_list('id', 'latitude', 'longitude').iterator(chunk_size=2000)
+
+    closest = []
+    while True:
+        chunk = list(islice(rows, 2000))
+        if not chunk:
+            break
+        ids, lats, lngs = zip(*chunk)
+        within = distances_within(latitude, longitude, max_distance_km, ids, lats, lngs)
+        if after is not None:
+            within = [point for point in within if point > after]
+        closest = heapq.nsmallest(limit, closest + within)
+    return closest
+
+def nearest_donors(latitude, longitude, max_distance_km=1, limit=20, donors=None):
+    """
+    Top-K nearest donors within max_distance_km, sorted by distance.
+    Full rows are loaded for the K winners only.
+    """
+    from .models import UserProfile
+
+    closest = nearest_donor_ids(latitude, longitude, max_distance_km, limit, donors)
+    donors_by_id = UserProfile.objects.select_related('user').in_bulk(
+        [donor_id for _, donor_id in closest]
+    )
+    result = []
+    for distance, donor_id in closest:
+        donor = donors_by_id[donor_id]
+        donor.distance = round(distance, 2)
+        result.append(donor)
+    return result
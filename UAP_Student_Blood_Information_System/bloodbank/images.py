@@ -0,0 +1,71 @@
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Resized variants generated for every profile picture
+PICTURE_SIZES = {
+    'avatar': (200, 200),
+    'thumbnail': (64, 64),
+}
+
+PICTURE_DIR = 'profile_pics/resized'
+
+
+def picture_variant_name(content_hash, size):
+    """Storage name of a resized variant, e.g. profile_pics/resized/<hash>_avatar.jpg"""
+    return f"{PICTURE_DIR}/{content_hash}_{size}.jpg"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def resize_picture(picture_name, storage=default_storage):
+    """
+    Generate every size in PICTURE_SIZES for a stored picture from a single
+    decode. Variants are named by content hash, so a picture whose variants
+    already exist is never decoded or re-encoded again.
+
+    Returns the content hash.
+    """
+    from PIL import Image
+
+    with storage.open(picture_name, 'rb') as f:
+        data = f.read()
+    digest = content_hash(data)
+
+    missing = {
+        size: dimensions for size, dimensions in PICTURE_SIZES.items()
+        if not storage.exists(picture_variant_name(digest, size))
+    }
+    if not missing:
+        return digest
+
+    with Image.open(BytesIO(data)) as img:
+        # JPEG has no alpha channel or palette
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        # Largest first, each smaller variant is scaled down from the previous one
+        for size, dimensions in sorted(missing.items(), key=lambda item: -item[1][0] * item[1][1]):
+            img = img.copy()
+            img.thumbnail(dimensions, Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            img.save(buffer, 'JPEG', quality=85)
+            storage.save(picture_variant_name(digest, size), ContentFile(buffer.getvalue()))
+
+    return digest
+
+
+def delete_unused_variants(content_hash, storage=default_storage):
+    """Delete the resized variants of content_hash unless a profile still shows them"""
+    from .models import UserProfile
+
+    if not content_hash or UserProfile.objects.filter(picture_hash=content_hash).exists():
+        return
+    for size in PICTURE_SIZES:
+        name = picture_variant_name(content_hash, size)
+        if storage.exists(name):
+            storage.delete(name)
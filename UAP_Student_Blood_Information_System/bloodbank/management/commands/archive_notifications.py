@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank.retention import (
+    ARCHIVE_BATCH_SIZE, FileArchive, TableArchive, archive_notifications, compact_database, retention_policy,
+)
+
+
+def format_bytes(count):
+    if count is None:
+        return 'unknown'
+    for unit in ('B', 'KB', 'MB'):
+        if abs(count) < 1024:
+            return f'{count:.0f} {unit}' if unit == 'B' else f'{count:.1f} {unit}'
+        count /= 1024
+    return f'{count:.1f} GB'
+
+
+class Command(BaseCommand):
+    help = 'Move read notifications past their retention (NOTIFICATION_RETENTION_DAYS) into the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--to-files', metavar='DIRECTORY',
+                            help='Write per-month JSON lines files here instead of the archive table')
+        parser.add_argument('--vacuum', action='store_true', help='Compact the database afterwards')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        policy = retention_policy()
+        archive = FileArchive(options['to_files']) if options['to_files'] else TableArchive()
+        stats = archive_notifications(
+            policy, archive, batch_size=options['batch_size'], pause=options['pause'], dry_run=options['dry_run'],
+        )
+
+        verb = 'would move' if options['dry_run'] else 'moved'
+        for notification_type, count in stats['moved'].items():
+            self.stdout.write(f"{notification_type:<18} older than {policy[notification_type]:>3} days: {verb} {count}")
+
+        summary = f"{stats['total']} notifications {verb} in {stats['batches']} batches, {stats['elapsed_ms']} ms"
+        if options['to_files']:
+            summary += f", {format_bytes(stats['archived_bytes'])} written to {options['to_files']}"
+        if not options['dry_run']:
+            summary += f", {stats['pruned_broadcasts']} emptied broadcasts deleted"
+            summary += f", table {format_bytes(stats['table_bytes_before'])} -> {format_bytes(stats['table_bytes_after'])}" \
+                       f" ({format_bytes(stats['reclaimed_bytes'])} reclaimed)"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+        if options['vacuum'] and not options['dry_run']:
+            if compact_database():
+                self.stdout.write('Database compacted')
+            else:
+                self.stdout.write(self.style.WARNING('Compaction is not supported on this database'))
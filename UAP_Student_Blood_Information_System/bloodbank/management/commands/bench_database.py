@@ -0,0 +1,186 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, OperationalError
+from django.test import override_settings
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import percentile
+from UAP_Student_Blood_Information_System.bloodbank.models import BloodRequest, Notification, BLOOD_GROUPS
+from UAP_Student_Blood_Information_System.bloodbank.seeding import seed_donors, seed_requests, seed_notifications
+
+BENCH_ALIAS = 'bench_database'
+
+MODES = ('sqlite', 'sqlite_tuned', 'configured')
+
+# Notifications written by one simulated fan-out
+FAN_OUT_SIZE = 50
+
+
+class BenchRouter:
+    """Sends every query to the benchmark database, seeding included"""
+
+    def db_for_read(self, model, **hints):
+        return BENCH_ALIAS
+
+    db_for_write = db_for_read
+
+
+def read_unread_count(rng, user_ids, request_ids):
+    Notification.objects.filter(user_id=rng.choice(user_ids), is_read=False).count()
+
+
+def read_notifications(rng, user_ids, request_ids):
+    list(Notification.objects.filter(user_id=rng.choice(user_ids)).order_by('-created_at')[:20])
+
+
+def read_pending_requests(rng, user_ids, request_ids):
+    blood_group = rng.choice(BLOOD_GROUPS)[0]
+    list(BloodRequest.objects.filter(blood_group=blood_group, status='pending').order_by('-urgency', '-created_at')[:20])
+
+
+def write_fan_out(rng, user_ids, request_ids):
+    request_id = rng.choice(request_ids)
+    with transaction.atomic(using=BENCH_ALIAS):
+        Notification.objects.bulk_create([
+            Notification(user_id=user_id, notification_type='blood_request', title='Benchmark fan-out',
+                         message='Generated by bench_database', blood_request_id=request_id)
+            for user_id in rng.sample(user_ids, min(FAN_OUT_SIZE, len(user_ids)))
+        ])
+
+
+def write_mark_read(rng, user_ids, request_ids):
+    Notification.objects.filter(user_id=rng.choice(user_ids), is_read=False).update(is_read=True)
+
+
+READS = [read_unread_count, read_notifications, read_pending_requests]
+WRITES = [write_fan_out, write_mark_read]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark mixed read/write traffic from several threads against each database mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=['sqlite', 'sqlite_tuned'],
+                            help='configured uses DATABASES["default"], e.g. a server database from DB_ENGINE')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds of traffic per mode')
+        parser.add_argument('--write-share', type=float, default=0.2, help='Share of operations that write')
+        parser.add_argument('--donors', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--notifications', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='bench_database_')
+        try:
+            for mode in options['modes']:
+                result = self.run_mode(mode, directory, options)
+                self.stdout.write(
+                    f"{mode:<13} {result['ops_per_s']:9.1f} ops/s | "
+                    f"read p50 {result['read_p50_ms']:7.2f} p95 {result['read_p95_ms']:7.2f} ms | "
+                    f"write p50 {result['write_p50_ms']:7.2f} p95 {result['write_p95_ms']:7.2f} ms | "
+                    f"{result['errors']} lock errors | journal {result['journal_mode']}"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def database_settings(self, mode, directory):
+        if mode == 'configured':
+            database = dict(settings.DATABASES['default'])
+            if database['ENGINE'] == 'django.db.backends.sqlite3':
+                database['TEST'] = {'NAME': os.path.join(directory, 'configured.sqlite3')}
+            return database
+
+        # A file, not the in-memory test database, so every thread sees the same data
+        path = os.path.join(directory, f'{mode}.sqlite3')
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': dict(settings.SQLITE_TUNED_OPTIONS) if mode == 'sqlite_tuned' else {},
+            'TEST': {'NAME': path},
+        }
+
+    def run_mode(self, mode, directory, options):
+        settings.DATABASES[BENCH_ALIAS] = self.database_settings(mode, directory)
+        connections.configure_settings(settings.DATABASES)
+        creation = connections[BENCH_ALIAS].creation
+        # A fresh test_ database, also for a server database: never the real one
+        old_name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DATABASE_ROUTERS=[BenchRouter()]):
+                rng = random.Random(options['seed'])
+                user_ids = seed_donors(options['donors'], rng, prefix='bench_database_')
+                request_ids = seed_requests(options['requests'], rng, user_ids)
+                seed_notifications(options['notifications'], rng, user_ids, request_ids)
+                result = self.traffic(user_ids, request_ids, options)
+                result['journal_mode'] = self.journal_mode(connections[BENCH_ALIAS])
+            return result
+        finally:
+            connections[BENCH_ALIAS].close()
+            creation.destroy_test_db(old_name, verbosity=0)
+            del connections[BENCH_ALIAS]
+            del settings.DATABASES[BENCH_ALIAS]
+
+    def journal_mode(self, connection):
+        if connection.vendor != 'sqlite':
+            return '-'
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def traffic(self, user_ids, request_ids, options):
+        if not user_ids or not request_ids:
+            raise CommandError('Seed at least one donor and one request')
+
+        reads, writes, errors = [], [], []
+        lock = threading.Lock()
+        # The last thread to arrive starts the clock for everyone
+        deadline = []
+        barrier = threading.Barrier(
+            options['threads'], action=lambda: deadline.append(time.perf_counter() + options['duration']),
+        )
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            local_reads, local_writes, local_errors = [], [], 0
+            try:
+                barrier.wait()
+                while time.perf_counter() < deadline[0]:
+                    is_write = rng.random() < options['write_share']
+                    operation = rng.choice(WRITES if is_write else READS)
+                    start = time.perf_counter()
+                    try:
+                        operation(rng, user_ids, request_ids)
+                    except OperationalError:
+                        # "database is locked": the busy timeout ran out
+                        local_errors += 1
+                        continue
+                    (local_writes if is_write else local_reads).append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+                with lock:
+                    reads.extend(local_reads)
+                    writes.extend(local_writes)
+                    errors.append(local_errors)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'ops': len(reads) + len(writes),
+            'ops_per_s': (len(reads) + len(writes)) / options['duration'],
+            'read_p50_ms': percentile(reads, 50),
+            'read_p95_ms': percentile(reads, 95),
+            'write_p50_ms': percentile(writes, 50),
+            'write_p95_ms': percentile(writes, 95),
+            'errors': sum(errors),
+        }
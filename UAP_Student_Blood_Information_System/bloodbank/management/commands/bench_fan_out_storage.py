@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import rolled_back
+from UAP_Student_Blood_Information_System.bloodbank.matching import eligible_donors_query
+from UAP_Student_Blood_Information_System.bloodbank.models import BloodRequest, Notification, BLOOD_GROUPS
+from UAP_Student_Blood_Information_System.bloodbank.retention import notification_table_bytes
+from UAP_Student_Blood_Information_System.bloodbank.seeding import seed_donors
+from UAP_Student_Blood_Information_System.bloodbank.utils import (
+    blood_request_notification_text, bulk_create_notifications, send_blood_request_notifications,
+)
+
+
+def per_row_fan_out(blood_request):
+    """The layout before broadcasts: the full text copied into every donor's row"""
+    title, message = blood_request_notification_text(blood_request)
+    recipient_ids = eligible_donors_query(blood_request).values_list('user_id', flat=True)
+    return bulk_create_notifications(
+        Notification(user_id=user_id, notification_type='blood_request', title=title, message=message,
+                     blood_request=blood_request)
+        for user_id in recipient_ids.iterator()
+    )
+
+
+LAYOUTS = {'per_row': per_row_fan_out, 'broadcast': send_blood_request_notifications}
+
+
+class Command(BaseCommand):
+    help = 'Compare storage and write time of one blood request fan-out, per-row text vs one broadcast'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=50000)
+        parser.add_argument('--blood-group', choices=[code for code, _ in BLOOD_GROUPS], default='AB+',
+                            help='AB+ can take blood from everyone, so every eligible donor is notified')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with rolled_back():
+            user_ids = seed_donors(options['donors'], rng, prefix='bench_fan_out_')
+            if not user_ids:
+                raise CommandError('Seed at least one donor')
+            blood_request = BloodRequest.objects.create(
+                requester_id=user_ids[0], blood_group=options['blood_group'], units_required=1,
+                hospital_name='Dhaka Medical College Hospital',
+            )
+
+            results = {}
+            for layout, fan_out in LAYOUTS.items():
+                results[layout] = result = self.measure(fan_out, blood_request, options['repeat'])
+                per_recipient = result['bytes'] / result['rows'] if result['bytes'] is not None and result['rows'] else None
+                self.stdout.write(
+                    f"{layout:<10} {result['rows']:>7} recipients | write {result['ms']:9.2f} ms | "
+                    + (f"{result['bytes'] / 1024:10.1f} KB | {per_recipient:6.1f} B/recipient"
+                       if per_recipient is not None else 'size unknown')
+                )
+
+            before, after = results['per_row'], results['broadcast']
+            if before['bytes'] and after['bytes'] is not None and before['ms']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"broadcast: {100 * (1 - after['bytes'] / before['bytes']):.0f}% less storage, "
+                    f"{100 * (1 - after['ms'] / before['ms']):.0f}% less write time"
+                ))
+
+    def measure(self, fan_out, blood_request, repeat):
+        """Best write time of repeat fan-outs, each rolled back, and the bytes one adds"""
+        best, rows, added = None, 0, None
+        for _ in range(repeat):
+            with rolled_back():
+                bytes_before = notification_table_bytes()
+                start = time.perf_counter()
+                rows = fan_out(blood_request)
+                elapsed = (time.perf_counter() - start) * 1000
+                bytes_after = notification_table_bytes()
+            best = elapsed if best is None else min(best, elapsed)
+            if bytes_before is not None and bytes_after is not None:
+                added = bytes_after - bytes_before
+        return {'rows': rows, 'ms': best, 'bytes': added}
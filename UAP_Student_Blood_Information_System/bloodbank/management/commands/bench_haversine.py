@@ -0,0 +1,55 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank import geolocation
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import best_of
+from UAP_Student_Blood_Information_System.bloodbank.geolocation import calculate_distance, batch_distances, distance_matrix
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark the scalar Haversine against the batch and matrix versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--origins', type=int, default=100, help='Origins for the distance matrix run')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+
+        if geolocation.np is None:
+            self.stdout.write(self.style.WARNING('NumPy is not installed, batch functions use the scalar fallback'))
+
+        for size in options['points']:
+            lats = [23.8 + rng.uniform(-0.25, 0.25) for _ in range(size)]
+            lngs = [90.4 + rng.uniform(-0.25, 0.25) for _ in range(size)]
+            origin = (23.8151, 90.4255)
+
+            scalar, _ = best_of(repeat, lambda: [
+                calculate_distance(origin[0], origin[1], lat, lng) for lat, lng in zip(lats, lngs)
+            ])
+            batch, _ = best_of(repeat, lambda: batch_distances(origin[0], origin[1], lats, lngs))
+            self.stdout.write(
+                f'{size:>7} points | scalar loop {scalar * 1000:9.2f} ms | '
+                f'batch {batch * 1000:8.2f} ms | speedup {scalar / batch:6.1f}x'
+            )
+
+        origins = options['origins']
+        size = options['points'][0]
+        o_lats = [23.8 + rng.uniform(-0.25, 0.25) for _ in range(origins)]
+        o_lngs = [90.4 + rng.uniform(-0.25, 0.25) for _ in range(origins)]
+        lats = [23.8 + rng.uniform(-0.25, 0.25) for _ in range(size)]
+        lngs = [90.4 + rng.uniform(-0.25, 0.25) for _ in range(size)]
+
+        scalar, _ = best_of(repeat, lambda: [
+            [calculate_distance(o_lat, o_lng, lat, lng) for lat, lng in zip(lats, lngs)]
+            for o_lat, o_lng in zip(o_lats, o_lngs)
+        ])
+        matrix, _ = best_of(repeat, lambda: distance_matrix(o_lats, o_lngs, lats, lngs))
+        self.stdout.write(
+            f'{origins}x{size} matrix | scalar loop {scalar * 1000:9.2f} ms | '
+            f'matrix {matrix * 1000:8.2f} ms | speedup {scalar / matrix:6.1f}x'
+        )
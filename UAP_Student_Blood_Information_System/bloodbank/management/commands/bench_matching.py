@@ -0,0 +1,45 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import best_of, rolled_back
+from UAP_Student_Blood_Information_System.bloodbank.matching import eligible_donors, open_requests_for
+from UAP_Student_Blood_Information_System.bloodbank.models import UserProfile, BloodRequest, BLOOD_GROUPS
+from UAP_Student_Blood_Information_System.bloodbank.seeding import seed_donors, seed_requests
+
+CENTER = (23.8151, 90.4255)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark compatibility-aware donor matching latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=100000)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with rolled_back():
+            user_ids = self.seed(options['donors'], options['requests'], rng)
+
+            for blood_group, _ in BLOOD_GROUPS:
+                blood_request = BloodRequest(requester_id=user_ids[0], blood_group=blood_group)
+                elapsed, rows = best_of(options['repeat'], lambda: eligible_donors(blood_request, origin=CENTER))
+                top, _ = best_of(options['repeat'], lambda: eligible_donors(blood_request, limit=20, origin=CENTER))
+                self.stdout.write(
+                    f'eligible donors for {blood_group:>3}: {len(rows):>6} matches | '
+                    f'all ranked {elapsed * 1000:8.2f} ms | top 20 {top * 1000:8.2f} ms'
+                )
+
+            for blood_group, _ in BLOOD_GROUPS:
+                donor = UserProfile(user_id=user_ids[0], blood_group=blood_group)
+                elapsed, rows = best_of(options['repeat'], lambda: list(open_requests_for(donor, limit=20)))
+                self.stdout.write(f'open requests for {blood_group:>3} donor: {len(rows):>3} shown | {elapsed * 1000:8.2f} ms')
+
+    def seed(self, donors, requests, rng):
+        user_ids = seed_donors(donors, rng, prefix='bench_match_')
+        seed_requests(requests, rng, user_ids)
+        return user_ids
@@ -0,0 +1,65 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import best_of, rolled_back
+from UAP_Student_Blood_Information_System.bloodbank.geolocation import calculate_distance, get_nearby_donors
+from UAP_Student_Blood_Information_System.bloodbank.models import UserProfile, eligible_to_donate
+from UAP_Student_Blood_Information_System.bloodbank.seeding import seed_donors
+
+# Searches start near the UAP campus, donors cluster around Dhaka neighbourhoods (see seeding.py)
+CENTER = (23.8151, 90.4255)
+
+
+def full_scan_nearby_donors(latitude, longitude, max_distance_km=1, blood_group=None):
+    """The original implementation: Haversine over every available donor"""
+    donors = UserProfile.objects.filter(
+        eligible_to_donate(),
+        is_donor=True,
+        is_available=True,
+        latitude__isnull=False,
+        longitude__isnull=False
+    )
+    if blood_group:
+        donors = donors.filter(blood_group=blood_group)
+
+    nearby_donors = []
+    for donor in donors:
+        distance = calculate_distance(latitude, longitude, donor.latitude, donor.longitude)
+        if distance <= max_distance_km:
+            donor.distance = round(distance, 2)
+            nearby_donors.append(donor)
+    return sorted(nearby_donors, key=lambda x: x.distance)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark get_nearby_donors against a full-table Haversine scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--radius', type=float, default=1.0, help='Search radius in km')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        for size in options['sizes']:
+            with rolled_back():
+                seed_donors(size, rng, prefix=f'bench_geo_{size}_')
+                origin = (CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.05, 0.05))
+
+                scan_time, scan_result = best_of(options['repeat'], lambda: full_scan_nearby_donors(*origin, max_distance_km=radius))
+                grid_time, grid_result = best_of(options['repeat'], lambda: get_nearby_donors(*origin, max_distance_km=radius))
+
+                # Compared as sets: donors at the same rounded distance may come out in either order
+                if {d.id for d in scan_result} != {d.id for d in grid_result}:
+                    self.stdout.write(self.style.ERROR(f'{size} donors: results differ!'))
+
+                self.stdout.write(
+                    f'{size:>7} donors | found {len(grid_result):>5} | '
+                    f'full scan {scan_time * 1000:9.2f} ms | '
+                    f'grid index {grid_time * 1000:9.2f} ms | '
+                    f'speedup {scan_time / grid_time if grid_time else 0:6.1f}x'
+                )
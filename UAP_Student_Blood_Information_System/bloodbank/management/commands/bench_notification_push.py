@@ -0,0 +1,172 @@
+import asyncio
+import time
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from django.urls import reverse
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import QueryCounter, allow_testserver, percentile
+from UAP_Student_Blood_Information_System.bloodbank.models import Notification
+from UAP_Student_Blood_Information_System.bloodbank.utils import bulk_create_notifications
+
+PREFIX = 'bench_push_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the notification push channel (long-poll and SSE) with many connected clients. '
+        'Requests go through the ASGI handler: both modes need an ASGI server in production, '
+        'under WSGI the stream is refused and polls are answered at once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--notify', type=int, default=100, help='Clients that receive a notification mid-test')
+        parser.add_argument('--wait', type=float, default=3.0, help='Seconds each client stays connected after everyone is')
+        parser.add_argument('--publish-after', type=float, default=1.0)
+        parser.add_argument('--mode', choices=['poll', 'stream', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        # Views run in other threads with their own connections, so the data
+        # is committed and removed afterwards instead of rolled back
+        user_ids, session_keys = self.seed(options['clients'])
+        counter = QueryCounter()
+        connection_created.connect(counter.install)
+        connections.close_all()
+        try:
+            modes = ['poll', 'stream'] if options['mode'] == 'both' else [options['mode']]
+            with allow_testserver():
+                for mode in modes:
+                    counter.reset()
+                    asyncio.run(self.run(mode, user_ids, session_keys, counter, options))
+        finally:
+            connection_created.disconnect(counter.install)
+            self.cleanup(session_keys)
+
+    async def run(self, mode, user_ids, session_keys, counter, options):
+        clients = []
+        for session_key in session_keys:
+            client = AsyncClient()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            clients.append(client)
+
+        connect = self.poll_client if mode == 'poll' else self.stream_client
+        notified = user_ids[:options['notify']]
+        published = {}
+
+        # Publish once every client is connected, so the wake-up latency
+        # is not mixed up with the time it takes to connect them all
+        connected = asyncio.Event()
+        pending = [len(clients)]
+
+        async def ready():
+            pending[0] -= 1
+            if not pending[0]:
+                connected.set()
+            await connected.wait()
+
+        async def publish():
+            await connected.wait()
+            await asyncio.sleep(options['publish_after'])
+            published['idle_queries'] = counter.total
+            published['at'] = time.perf_counter()
+            await sync_to_async(self.publish)(notified)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            publish(),
+            *[connect(client, user_id, options['wait'], ready) for client, user_id in zip(clients, user_ids)],
+        )
+        wall = time.perf_counter() - start
+
+        results = results[1:]
+        woken = [finished - published['at'] for changed, finished in results if changed]
+        idle = len(results) - len(woken)
+        self.stdout.write(
+            f'{mode:<6} | {len(results):>5} clients | {len(woken):>5} woken, {idle:>5} idle | '
+            f'wake latency p50 {percentile(woken, 50) * 1000:7.1f} ms p95 {percentile(woken, 95) * 1000:7.1f} ms | '
+            f'queries before publish {published["idle_queries"]:>5}, total {counter.total:>5}, '
+            f'notification table {counter.notifications:>5} | wall {wall:5.2f} s'
+        )
+
+    async def poll_client(self, client, user_id, wait, ready):
+        """
+        Like the page script: a first request fetches the state and its ETag,
+        then a long-poll waits with If-None-Match. True if it was woken by a change.
+        """
+        url = reverse('notification_poll')
+        response = await client.get(url)
+        await ready()
+        response = await client.get(url, {'timeout': wait}, headers={'If-None-Match': response['ETag']})
+        return response.status_code == 200, time.perf_counter()
+
+    async def stream_client(self, client, user_id, wait, ready):
+        """
+        An SSE connection held open for wait seconds once connected; True if
+        a push arrived after the initial event
+        """
+        response = await client.get(reverse('notification_stream'))
+        events = response.streaming_content
+        pushes = 0
+        loop = asyncio.get_running_loop()
+        deadline = None
+        try:
+            while pushes < 2:
+                if deadline is None and pushes:
+                    # The generator is paused meanwhile, nothing is missed
+                    await ready()
+                    deadline = loop.time() + wait
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    chunk = await asyncio.wait_for(anext(events), remaining)
+                except (asyncio.TimeoutError, StopAsyncIteration):
+                    break
+                if chunk.startswith(b'event: notifications'):
+                    pushes += 1
+        finally:
+            await events.aclose()
+        return pushes >= 2, time.perf_counter()
+
+    def publish(self, user_ids):
+        return bulk_create_notifications(
+            Notification(
+                user_id=user_id,
+                notification_type='system',
+                title='Load test',
+                message='Push channel load test notification',
+            )
+            for user_id in user_ids
+        )
+
+    def seed(self, clients):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f'{PREFIX}{i}', password='!') for i in range(clients)],
+                batch_size=2000,
+            )
+            session_keys = []
+            for user in users:
+                session = store_class()
+                session[SESSION_KEY] = str(user.pk)
+                session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+                session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+                session.create()
+                session_keys.append(session.session_key)
+        return [user.pk for user in users], session_keys
+
+    def cleanup(self, session_keys):
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        with transaction.atomic():
+            for session_key in session_keys:
+                store_class().delete(session_key)
+            User.objects.filter(username__startswith=PREFIX).delete()
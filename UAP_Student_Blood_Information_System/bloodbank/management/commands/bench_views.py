@@ -0,0 +1,180 @@
+import json
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from UAP_Student_Blood_Information_System.bloodbank.benchmarking import QueryCounter, allow_testserver, percentile, rolled_back
+from UAP_Student_Blood_Information_System.bloodbank.dispatch import process_batch
+from UAP_Student_Blood_Information_System.bloodbank.seeding import seed_donors, seed_requests, seed_notifications
+
+CENTER = (23.8151, 90.4255)
+
+REQUEST_FORM = {
+    'blood_group': 'B+', 'units_required': 1, 'urgency': 'urgent',
+    'hospital_name': 'UAP Medical Center', 'hospital_address': 'Dhaka',
+    'contact_person': 'Staff', 'contact_phone': '0123456789',
+    'needed_by_date': '2030-01-01', 'needed_by_time': '12:00',
+}
+
+# Latency and bytes may grow by this share before compare calls it a regression
+DEFAULT_THRESHOLD = 0.20
+# ...and latency by at least this much, sub-millisecond jitter is not a regression
+DEFAULT_MIN_DELTA_MS = 2.0
+
+
+def scenarios():
+    ajax = {'X-Requested-With': 'XMLHttpRequest'}
+    return [
+        {'name': 'dashboard', 'path': reverse('dashboard')},
+        {'name': 'donor_list_text', 'path': reverse('donor_list'), 'data': {'blood_group': 'B+', 'location': 'Mirpur'}},
+        {'name': 'donor_list_radius', 'path': reverse('donor_list'),
+         'data': {'use_radius': '1', 'radius': 5, 'lat': CENTER[0], 'lng': CENTER[1]}},
+        # Fan-out normally happens in the worker, it is run right after the POST and timed with it
+        {'name': 'request_blood', 'method': 'post', 'path': reverse('request_blood'), 'data': REQUEST_FORM, 'fan_out': True},
+        {'name': 'notifications', 'path': reverse('notifications')},
+        {'name': 'request_history', 'path': reverse('request_history')},
+        {'name': 'notification_count', 'path': reverse('notification_count'), 'headers': ajax},
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views on a seeded dataset: latency percentiles, queries and bytes, as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--notifications', type=int, default=100000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', nargs='+', help='Scenario names to run')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to check the results against')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+        parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    def handle(self, *args, **options):
+        selected = [s for s in scenarios() if not options['only'] or s['name'] in options['only']]
+        if not selected:
+            raise CommandError(f"No scenario named {options['only']}")
+
+        with allow_testserver(), rolled_back():
+            user = self.seed(options)
+            client = Client()
+            client.force_login(user)
+            cache.clear()
+            results = {s['name']: self.measure(client, s, options['iterations'], options['warmup']) for s in selected}
+
+        report = {
+            'meta': {
+                'donors': options['donors'],
+                'requests': options['requests'],
+                'notifications': options['notifications'],
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'results': results,
+        }
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<20} p50 {result['p50_ms']:8.2f} ms | p95 {result['p95_ms']:8.2f} ms | "
+                f"p99 {result['p99_ms']:8.2f} ms | {result['queries']:>4} queries | {result['bytes']:>8} bytes"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(baseline, report, options['threshold'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}'))
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        user_ids = seed_donors(options['donors'], rng, prefix='bench_views_')
+        request_ids = seed_requests(options['requests'], rng, user_ids)
+        seed_notifications(options['notifications'], rng, user_ids, request_ids)
+
+        # The benchmark user gets a heavier history than the average donor
+        user_id = user_ids[0]
+        seed_requests(100, rng, [user_id])
+        seed_notifications(500, rng, [user_id], request_ids)
+        return User.objects.get(pk=user_id)
+
+    def measure(self, client, scenario, iterations, warmup):
+        method = getattr(client, scenario.get('method', 'get'))
+        timings, queries, sizes = [], [], []
+        status = None
+
+        for i in range(warmup + iterations):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = method(scenario['path'], scenario.get('data', {}), headers=scenario.get('headers'))
+                if scenario.get('fan_out'):
+                    process_batch()
+                elapsed = time.perf_counter() - start
+
+            status = response.status_code
+            if status >= 400:
+                raise CommandError(f"{scenario['name']} answered {status}")
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(counter.total)
+                sizes.append(len(response.content))
+
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p90_ms': round(percentile(timings, 90), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(max(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': max(queries),
+            'bytes': int(statistics.median(sizes)),
+            'status': status,
+        }
+
+    def compare(self, baseline, report, threshold, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+        """Print a comparison table and return the regressions found"""
+        regressions = []
+        for name, result in report['results'].items():
+            before = baseline.get('results', {}).get(name)
+            if before is None:
+                self.stdout.write(f'{name:<20} not in baseline')
+                continue
+
+            problems = []
+            for metric in ('p50_ms', 'p95_ms', 'bytes'):
+                slack = min_delta_ms if metric.endswith('_ms') else 0
+                if result[metric] > before[metric] * (1 + threshold) + slack:
+                    problems.append(f'{metric} {before[metric]} -> {result[metric]}')
+            # Any extra query is a regression, they do not vary between runs
+            if result['queries'] > before['queries']:
+                problems.append(f"queries {before['queries']} -> {result['queries']}")
+
+            change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            if problems:
+                regressions.append((name, problems))
+                self.stdout.write(self.style.ERROR(f"{name:<20} REGRESSION: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f'{name:<20} ok (p50 {change:+.1f}%)')
+        return regressions
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank.expiry import EXPIRY_BATCH_SIZE, expire_overdue_requests
+
+
+class Command(BaseCommand):
+    help = 'Expire pending blood requests whose needed-by time has passed and notify their requesters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EXPIRY_BATCH_SIZE)
+        parser.add_argument('--grace-minutes', type=int, default=0, help='Only expire requests overdue by more than this')
+        parser.add_argument('--no-notify', action='store_true', help='Expire without notifying requesters')
+        parser.add_argument('--every', type=float, help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                stats = expire_overdue_requests(
+                    grace=timedelta(minutes=options['grace_minutes']),
+                    batch_size=options['batch_size'],
+                    notify=not options['no_notify'],
+                )
+                self.stdout.write(
+                    f"swept {stats['swept']} requests in {stats['batches']} batches, "
+                    f"{stats['notified']} requesters notified, {stats['still_pending']} still pending, "
+                    f"{stats['elapsed_ms']} ms"
+                )
+                if options['every'] is None:
+                    break
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,82 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from UAP_Student_Blood_Information_System.bloodbank.geocoding import geocode_many, get_geocoder, normalize_address
+from UAP_Student_Blood_Information_System.bloodbank.geolocation import geo_cell_for
+from UAP_Student_Blood_Information_System.bloodbank.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Fill in latitude/longitude for profiles without coordinates, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent geocoder lookups; NominatimGeocoder still sends at most one per second')
+        parser.add_argument('--checkpoint', default='geocode_backfill.json', help='File recording the last profile id done')
+        parser.add_argument('--reset', action='store_true', help='Ignore the checkpoint and start over')
+
+    def handle(self, *args, **options):
+        path = options['checkpoint']
+        last_id = 0 if options['reset'] else self.load_checkpoint(path)
+        if last_id:
+            self.stdout.write(f'Resuming after profile {last_id}')
+
+        geocoder = get_geocoder()
+        missing = UserProfile.objects.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+        totals = {'profiles': 0, 'updated': 0, 'unresolved': 0, 'cached': 0, 'looked_up': 0, 'errors': 0}
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                rows = list(missing.filter(id__gt=last_id).order_by('id').values_list('id', 'address')[:options['batch_size']])
+                if not rows:
+                    break
+
+                results, stats = geocode_many([address for _, address in rows], geocoder, pool)
+                profiles = []
+                for pk, address in rows:
+                    coords = results.get(normalize_address(address))
+                    if coords:
+                        profiles.append(UserProfile(pk=pk, latitude=coords[0], longitude=coords[1], geo_cell=geo_cell_for(*coords)))
+                with transaction.atomic():
+                    UserProfile.objects.bulk_update(profiles, ['latitude', 'longitude', 'geo_cell'])
+
+                last_id = rows[-1][0]
+                self.save_checkpoint(path, last_id)
+
+                totals['profiles'] += len(rows)
+                totals['updated'] += len(profiles)
+                totals['unresolved'] += len(rows) - len(profiles)
+                for name, value in stats.items():
+                    totals[name] += value
+                self.stdout.write(f'up to profile {last_id}: {len(profiles)}/{len(rows)} geocoded, {stats}')
+
+        # Finished: the next run starts from the beginning again
+        if os.path.exists(path):
+            os.remove(path)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['updated']} of {totals['profiles']} profiles geocoded in {elapsed:.2f} s "
+            f"({totals['unresolved']} unresolved; addresses: {totals['cached']} cached, "
+            f"{totals['looked_up']} looked up, {totals['errors']} errors)"
+        ))
+
+    def load_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return int(json.load(f)['last_id'])
+        except FileNotFoundError:
+            return 0
+
+    def save_checkpoint(self, path, last_id):
+        # Write then rename, so an interrupted run never leaves half a file
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({'last_id': last_id}, f)
+        os.replace(f'{path}.tmp', path)
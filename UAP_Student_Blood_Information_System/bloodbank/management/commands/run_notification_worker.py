@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from UAP_Student_Blood_Information_System.bloodbank.dispatch import process_batch, queue_depth, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Drain the dispatch queue (notification fan-out, picture resizing) in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--stats', action='store_true', help='Only print the queue depth')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(f'queue depth: {queue_depth()}')
+            return
+
+        self.stdout.write(self.style.SUCCESS('Notification worker started'))
+        try:
+            while True:
+                stats = process_batch(options['batch_size'], options['max_attempts'])
+                if stats['jobs']:
+                    self.stdout.write(
+                        f"batch: {stats['jobs']} jobs, {stats['failed']} failed, "
+                        f"{stats['notifications']} notifications in {stats['latency_ms']} ms, "
+                        f"queue depth {stats['queue_depth']}"
+                    )
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Notification worker stopped'))
@@ -0,0 +1,54 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from UAP_Student_Blood_Information_System.bloodbank.seeding import (
+    SEED_CHUNK_SIZE, seed_donors, seed_requests, seed_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset of donors, blood requests and notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--notifications', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=SEED_CHUNK_SIZE)
+        parser.add_argument('--prefix', default='seed_', help='Username prefix of the generated users')
+        parser.add_argument('--password', default='password123', help='Password shared by every generated user')
+        parser.add_argument('--clear', action='store_true', help='Delete users with the prefix (and their data) first')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=prefix)
+        if options['clear']:
+            deleted, _ = existing.delete()
+            self.stdout.write(f'Deleted {deleted} rows from a previous run')
+        elif existing.exists():
+            raise CommandError(f'Users starting with {prefix!r} already exist, use --clear or another --prefix')
+        if options['donors'] < 1 and (options['requests'] or options['notifications']):
+            raise CommandError('Requests and notifications need at least one donor')
+
+        rng = random.Random(options['seed'])
+        chunk_size = options['chunk_size']
+
+        user_ids = self.timed('donors', lambda: seed_donors(
+            options['donors'], rng, prefix, options['password'], chunk_size))
+        request_ids = self.timed('requests', lambda: seed_requests(
+            options['requests'], rng, user_ids, chunk_size))
+        self.timed('notifications', lambda: seed_notifications(
+            options['notifications'], rng, user_ids, request_ids, chunk_size))
+
+    def timed(self, label, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        rows = result if isinstance(result, int) else len(result)
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows:>9} {label:<13} in {elapsed:7.2f} s ({rows / elapsed if elapsed else 0:,.0f} rows/s)'
+        ))
+        return result
@@ -0,0 +1,135 @@
+from math import cos, radians
+
+from django.db.models import Case, When, Value, IntegerField, F, FloatField, ExpressionWrapper
+from django.utils import timezone
+
+from .geolocation import batch_distances
+from .models import UserProfile, BloodRequest, BLOOD_GROUPS, eligible_to_donate
+
+# Red cell compatibility: donor group -> recipient groups that can receive it
+CAN_DONATE_TO = {
+    'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
+    'O+': ['O+', 'A+', 'B+', 'AB+'],
+    'A-': ['A-', 'A+', 'AB-', 'AB+'],
+    'A+': ['A+', 'AB+'],
+    'B-': ['B-', 'B+', 'AB-', 'AB+'],
+    'B+': ['B+', 'AB+'],
+    'AB-': ['AB-', 'AB+'],
+    'AB+': ['AB+'],
+}
+
+# Precomputed reverse table: recipient group -> donor groups it can receive from
+CAN_RECEIVE_FROM = {
+    recipient: [donor for donor, _ in BLOOD_GROUPS if recipient in CAN_DONATE_TO[donor]]
+    for recipient, _ in BLOOD_GROUPS
+}
+
+URGENCY_RANK = {'emergency': 0, 'urgent': 1, 'normal': 2}
+
+
+def donor_groups_for(recipient_group):
+    """Blood groups that can donate to recipient_group"""
+    return CAN_RECEIVE_FROM.get(recipient_group, [recipient_group])
+
+
+def recipient_groups_for(donor_group):
+    """Blood groups donor_group can donate to"""
+    return CAN_DONATE_TO.get(donor_group, [donor_group])
+
+
+def _exact_match(blood_group):
+    return Case(When(blood_group=blood_group, then=Value(0)), default=Value(1), output_field=IntegerField())
+
+
+def _urgency_rank():
+    return Case(
+        *[When(urgency=urgency, then=Value(rank)) for urgency, rank in URGENCY_RANK.items()],
+        default=Value(len(URGENCY_RANK)),
+        output_field=IntegerField(),
+    )
+
+
+def _requester_origin(blood_request):
+    coords = UserProfile.objects.filter(user_id=blood_request.requester_id).values_list('latitude', 'longitude').first()
+    if coords and coords[0] is not None and coords[1] is not None:
+        return coords
+    return None
+
+
+def eligible_donors_query(blood_request):
+    """Available donors whose blood the request can receive, as one IN query"""
+    return UserProfile.objects.filter(
+        eligible_to_donate(),
+        is_donor=True,
+        is_available=True,
+        blood_group__in=donor_groups_for(blood_request.blood_group),
+    ).exclude(user_id=blood_request.requester_id)
+
+
+def _squared_degrees_from(origin):
+    """
+    Squared equirectangular distance to origin, in degrees of latitude.
+    Plain arithmetic, so any database can order by it; it ranks points the
+    same way as the Haversine distance at city scale. NULL without coordinates.
+    """
+    lng_scale = cos(radians(origin[0]))
+    d_lat = F('latitude') - Value(origin[0])
+    d_lng = (F('longitude') - Value(origin[1])) * Value(lng_scale)
+    return ExpressionWrapper(d_lat * d_lat + d_lng * d_lng, output_field=FloatField())
+
+
+def eligible_donors(blood_request, limit=None, origin=None):
+    """
+    Donors who can give blood for blood_request, exact blood group first,
+    then nearest to origin (default: the requester's profile coordinates).
+    Ranked and cut to limit in SQL, so only the returned rows are loaded.
+    Returns dicts with id, user_id, username, blood_group, exact and distance.
+    """
+    if origin is None:
+        origin = _requester_origin(blood_request)
+
+    donors = eligible_donors_query(blood_request).annotate(exact=_exact_match(blood_request.blood_group))
+    if origin:
+        donors = donors.annotate(proximity=_squared_degrees_from(origin)).order_by(
+            'exact', F('proximity').asc(nulls_last=True), 'id',
+        )
+    else:
+        donors = donors.order_by('exact', 'id')
+    donors = donors.values('id', 'user_id', 'user__username', 'blood_group', 'latitude', 'longitude', 'exact')
+    rows = list(donors[:limit] if limit else donors)
+
+    for row in rows:
+        row['distance'] = None
+    located = [row for row in rows if row['latitude'] is not None and row['longitude'] is not None]
+    if origin and located:
+        distances = batch_distances(
+            origin[0], origin[1],
+            [row['latitude'] for row in located],
+            [row['longitude'] for row in located],
+        )
+        for row, distance in zip(located, distances):
+            row['distance'] = round(float(distance), 2)
+    return rows
+
+
+def can_donate_today(donor_profile):
+    """False while donor_profile is in the cooldown after a donation"""
+    return donor_profile.eligible_from is None or donor_profile.eligible_from <= timezone.localdate()
+
+
+def open_requests_for(donor_profile, limit=None, exclude_own=True):
+    """
+    Pending requests donor_profile can serve, in one query: exact blood
+    group first, then most urgent, then newest.
+    """
+    requests = BloodRequest.objects.filter(
+        status='pending',
+        blood_group__in=recipient_groups_for(donor_profile.blood_group),
+    )
+    if exclude_own:
+        requests = requests.exclude(requester_id=donor_profile.user_id)
+    requests = requests.annotate(
+        exact=_exact_match(donor_profile.blood_group),
+        urgency_rank=_urgency_rank(),
+    ).order_by('exact', 'urgency_rank', '-created_at')
+    return requests[:limit] if limit else requests
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:27
+
+from math import floor
+
+from django.db import migrations, models
+
+# Frozen copy of geolocation.GEO_CELL_SIZE at the time of this migration
+GEO_CELL_SIZE = 0.05
+
+
+def backfill_geo_cells(apps, schema_editor):
+    UserProfile = apps.get_model('bloodbank', 'UserProfile')
+    profiles = UserProfile.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).only('id', 'latitude', 'longitude')
+
+    batch = []
+    for profile in profiles.iterator(chunk_size=2000):
+        row = floor(profile.latitude / GEO_CELL_SIZE)
+        col = floor(profile.longitude / GEO_CELL_SIZE)
+        profile.geo_cell = f"{row}:{col}"
+        batch.append(profile)
+        if len(batch) >= 2000:
+            UserProfile.objects.bulk_update(batch, ['geo_cell'])
+            batch = []
+    if batch:
+        UserProfile.objects.bulk_update(batch, ['geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbank', '0006_userprofile_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+    ]
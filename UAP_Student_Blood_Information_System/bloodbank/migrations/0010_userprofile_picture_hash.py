@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbank', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='notificationjob',
+            name='job_type',
+            field=models.CharField(choices=[('blood_request', 'Blood Request Fan-out'), ('request_accepted', 'Request Accepted'), ('donor_available', 'Donor Available'), ('profile_picture', 'Profile Picture Resize')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:38
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Frozen copy of models.DONATION_COOLDOWN_DAYS at the time of this migration
+DONATION_COOLDOWN_DAYS = 56
+
+
+def backfill_eligible_from(apps, schema_editor):
+    UserProfile = apps.get_model('bloodbank', 'UserProfile')
+    profiles = UserProfile.objects.filter(
+        last_donation_date__isnull=False
+    ).only('id', 'last_donation_date')
+
+    batch = []
+    for profile in profiles.iterator(chunk_size=2000):
+        profile.eligible_from = profile.last_donation_date + timedelta(days=DONATION_COOLDOWN_DAYS)
+        batch.append(profile)
+        if len(batch) >= 2000:
+            UserProfile.objects.bulk_update(batch, ['eligible_from'])
+            batch = []
+    if batch:
+        UserProfile.objects.bulk_update(batch, ['eligible_from'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbank', '0010_userprofile_picture_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='eligible_from',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_eligible_from, migrations.RunPython.noop),
+    ]
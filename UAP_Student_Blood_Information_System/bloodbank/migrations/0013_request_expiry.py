@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbank', '0012_geocodedaddress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('blood_request', '🔴 New Blood Request'), ('request_accepted', '📌 Request Accepted'), ('request_completed', '🟢 Request Completed'), ('request_cancelled', '🔴 Request Cancelled'), ('request_expired', '⏰ Request Expired'), ('donor_available', '🟢 Donor Available'), ('system', '🔵 System Notification')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['needed_by'], name='request_pending_due_idx'),
+        ),
+    ]
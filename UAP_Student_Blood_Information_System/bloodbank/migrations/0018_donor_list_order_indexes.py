@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bloodbank', '0017_keyset_index_tie_break'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='userprofile',
+            name='profile_available_donor_idx',
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_available', True), ('is_donor', True)), fields=['blood_group', '-created_at', '-id'], name='profile_available_donor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_available', True), ('is_donor', True)), fields=['-created_at', '-id'], name='profile_available_recent_idx'),
+        ),
+    ]
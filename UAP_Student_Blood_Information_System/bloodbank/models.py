@@ -1,53 +1,32 @@
+from datetime import date, timedelta
+
 from django.contrib.auth.models import User
 from django.db import models
 from django.utils import timezone
 from django.core.files.storage import default_storage
-import os
-from PIL import Image
-from django.core.validators import FileExtensionValidator
+from django.db import transaction
 
+from .geolocation import geo_cell_for
+from .images import delete_unused_variants, picture_variant_name
 
-class UserProfile(models.Model):
-    profile_picture = models.ImageField(
-        upload_to='profile_pics/',
-        null=True,
-        blank=True,
-        help_text='Upload your profile picture (JPG, PNG, JPEG)',
-        validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]
-    )
 
-    def save(self, *args, **kwargs):
-        # Delete old profile picture when new one is uploaded
-        try:
-            old = UserProfile.objects.get(pk=self.pk)
-            if old.profile_picture and old.profile_picture != self.profile_picture:
-                if default_storage.exists(old.profile_picture.name):
-                    default_storage.delete(old.profile_picture.name)
-        except UserProfile.DoesNotExist:
-            pass
+# Days a donor has to wait between whole blood donations
+DONATION_COOLDOWN_DAYS = 56
 
-        super().save(*args, **kwargs)
 
-        # Resize image if it exists
-        if self.profile_picture:
-            self.resize_image()
+def eligible_from_for(last_donation_date):
+    if last_donation_date is None:
+        return None
+    if isinstance(last_donation_date, str):
+        last_donation_date = date.fromisoformat(last_donation_date)
+    return last_donation_date + timedelta(days=DONATION_COOLDOWN_DAYS)
+
+
+def eligible_to_donate(today=None):
+    """Filter for donors outside their cooldown window"""
+    today = today or timezone.localdate()
+    return models.Q(eligible_from__isnull=True) | models.Q(eligible_from__lte=today)
 
-    def resize_image(self, size=(200, 200)):
-        """Resize profile picture to save storage"""
-        if self.profile_picture:
-            try:
-                img_path = self.profile_picture.path
-                with Image.open(img_path) as img:
-                    # Convert to RGB if necessary
-                    if img.mode in ('RGBA', 'P'):
-                        img = img.convert('RGB')
-
-                    # Resize image
-                    img.thumbnail(size, Image.Resampling.LANCZOS)
-                    img.save(img_path, 'JPEG', quality=85)
-            except Exception as e:
-                # If there's an error, just keep the original
-                print(f"Error resizing image: {e}")
 
 BLOOD_GROUPS = [
     ('A+', 'A+'), ('A-', 'A-'),
@@ -64,15 +43,115 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=15)
     address = models.TextField()
     profile_picture = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
+    # Content hash of profile_picture once its resized variants exist, see images.py
+    picture_hash = models.CharField(max_length=64, blank=True, editable=False)
     date_of_birth = models.DateField(null=True, blank=True)
     is_donor = models.BooleanField(default=True)
     last_donation_date = models.DateField(null=True, blank=True)
+    # First day the donor may give blood again (last_donation_date + cooldown)
+    eligible_from = models.DateField(null=True, blank=True, db_index=True, editable=False)
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     # Geolocation Fields
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Spatial grid cell of (latitude, longitude), see geolocation.geo_cell_for
+    geo_cell = models.CharField(max_length=32, null=True, blank=True, db_index=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored picture so save() can spot a change without a SELECT
+        if 'profile_picture' in field_names:
+            instance._loaded_picture = instance.profile_picture.name or None
+        # ...and the stored blood group, see signals.donor_changed
+        if 'blood_group' in field_names:
+            instance._loaded_blood_group = instance.blood_group
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # A deferred field loaded on access comes through here, not from_db
+        if fields is None:
+            fields = {field.attname for field in self._meta.concrete_fields} - self.get_deferred_fields()
+        if 'profile_picture' in fields:
+            self._loaded_picture = self.profile_picture.name or None
+        if 'blood_group' in fields:
+            self._loaded_blood_group = self.blood_group
+
+    def save(self, *args, **kwargs):
+        # Derived from the fields they follow; bulk_create() and bulk_update()
+        # skip save(), so code writing profiles that way sets them too
+        self.geo_cell = geo_cell_for(self.latitude, self.longitude)
+        self.eligible_from = eligible_from_for(self.last_donation_date)
+
+        picture_changed = False
+        if 'profile_picture' not in self.get_deferred_fields():
+            picture = self.profile_picture.name or None
+            old_picture = getattr(self, '_loaded_picture', None)
+            picture_changed = picture != old_picture
+        if picture_changed:
+            # Variants of the old picture no longer apply
+            old_hash, self.picture_hash = self.picture_hash, ''
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if update_fields & {'latitude', 'longitude'}:
+                update_fields.add('geo_cell')
+            if 'last_donation_date' in update_fields:
+                update_fields.add('eligible_from')
+            if 'profile_picture' in update_fields:
+                update_fields.add('picture_hash')
+            kwargs['update_fields'] = update_fields
+
+        super().save(*args, **kwargs)
+
+        if picture_changed:
+            # A new upload only gets its final storage name during save
+            picture = self.profile_picture.name or None
+            self._loaded_picture = picture
+            self._picture_changed(old_picture, picture, old_hash)
+
+    def _picture_changed(self, old_picture, picture, old_hash):
+        from .dispatch import enqueue
+
+        def delete_old_picture():
+            if default_storage.exists(old_picture):
+                default_storage.delete(old_picture)
+
+        if old_picture:
+            transaction.on_commit(delete_old_picture)
+        if picture:
+            # Resizing runs in the worker, not in the web request. The old
+            # variants go once the new hash is committed, so no page is left
+            # pointing at a deleted file
+            enqueue(
+                'profile_picture',
+                f'profile_picture:{self.pk}:{picture}:{timezone.now().timestamp()}',
+                profile_id=self.pk,
+                picture=picture,
+                previous_hash=old_hash,
+            )
+        elif old_hash:
+            transaction.on_commit(lambda: delete_unused_variants(old_hash))
+
+    def picture_url(self, size):
+        """URL of a resized variant ('avatar', 'thumbnail'), the original until it is ready"""
+        if self.picture_hash:
+            return default_storage.url(picture_variant_name(self.picture_hash, size))
+        if self.profile_picture:
+            return self.profile_picture.url
+        return ''
+
+    @property
+    def avatar_url(self):
+        return self.picture_url('avatar')
+
+    @property
+    def thumbnail_url(self):
+        return self.picture_url('thumbnail')
 
     # string representation for the model
     def __str__(self):
@@ -81,6 +160,25 @@ class UserProfile(models.Model):
     # app_label in case it is necessary
     class Meta:
         app_label = 'bloodbank'  # Explicitly set the app_label for this model
+        indexes = [
+            # donor_list, notification fan-out and matching
+            models.Index(fields=['is_donor', 'is_available', 'blood_group'], name='profile_donor_avail_bg_idx'),
+            # Same access path limited to available donors; SQLite can only use
+            # an index for bare boolean filters through a matching partial index
+            # The donor list pages newest first, so the order is in the index
+            # too and a page stops after page_size rows instead of sorting them all
+            models.Index(
+                fields=['blood_group', '-created_at', '-id'],
+                condition=models.Q(is_donor=True, is_available=True),
+                name='profile_available_donor_idx',
+            ),
+            # ...and the same without a blood group filter
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(is_donor=True, is_available=True),
+                name='profile_available_recent_idx',
+            ),
+        ]
 
 
 class BloodRequest(models.Model):
@@ -126,6 +224,29 @@ class BloodRequest(models.Model):
     )
     accepted_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # dashboard pending requests for a blood group
+            models.Index(fields=['blood_group', 'status', '-urgency', '-created_at'], name='request_bg_status_idx'),
+            models.Index(
+                fields=['blood_group', '-urgency', '-created_at'],
+                condition=models.Q(status='pending'),
+                name='request_pending_bg_idx',
+            ),
+            # request history and dashboard "my requests"
+            models.Index(fields=['requester', '-created_at', '-id'], name='request_requester_created_idx'),
+            # expire_requests sweeper: overdue pending requests, oldest deadline first
+            models.Index(fields=['needed_by'], condition=models.Q(status='pending'), name='request_pending_due_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored blood group, see signals.request_changed
+        if 'blood_group' in field_names:
+            instance._loaded_blood_group = instance.blood_group
+        return instance
+
     def __str__(self):
         return f"Request for {self.blood_group} by {self.requester.username}"
 
@@ -149,24 +270,147 @@ class Notification(models.Model):
         ('request_accepted', '📌 Request Accepted'),
         ('request_completed', '🟢 Request Completed'),
         ('request_cancelled', '🔴 Request Cancelled'),
+        ('request_expired', '⏰ Request Expired'),
         ('donor_available', '🟢 Donor Available'),
         ('system', '🔵 System Notification'),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
-    title = models.CharField(max_length=255)
-    message = models.TextField()
+    title = models.CharField(max_length=255, blank=True)
+    message = models.TextField(blank=True)
+    # Fan-out rows leave title and message empty and share the broadcast's text
+    broadcast = models.ForeignKey(
+        'NotificationBroadcast', on_delete=models.CASCADE, null=True, blank=True, related_name='deliveries'
+    )
     blood_request = models.ForeignKey('BloodRequest', on_delete=models.CASCADE, null=True, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # notifications page and dashboard recent notifications
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            # unread counts only ever look at unread rows
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notif_user_unread_idx'),
+            # archive_notifications: old read rows of one type, oldest first
+            models.Index(
+                fields=['notification_type', 'created_at'],
+                condition=models.Q(is_read=True),
+                name='notif_read_type_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_notification_type_display()} - {self.user.username}"
 
+    # Load these with select_related('broadcast'), or each one is a query
+    @property
+    def display_title(self):
+        return self.broadcast.title if self.broadcast_id else self.title
+
+    @property
+    def display_message(self):
+        return self.broadcast.message if self.broadcast_id else self.message
+
     @property
     def is_recent(self):
         return (timezone.now() - self.created_at).days < 1
+
+
+class NotificationJob(models.Model):
+    """
+    Background job queue, drained by the run_notification_worker command.
+    Mostly notification fan-out; profile picture resizing is queued here too,
+    as its own job_type that creates no notifications.
+    """
+    JOB_TYPES = [
+        ('blood_request', 'Blood Request Fan-out'),
+        ('request_accepted', 'Request Accepted'),
+        ('donor_available', 'Donor Available'),
+        ('profile_picture', 'Profile Picture Resize'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_type = models.CharField(max_length=30, choices=JOB_TYPES)
+    payload = models.JSONField(default=dict)
+    # Enqueueing the same key twice is a no-op, so a job runs at most once
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='notifjob_status_avail_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} [{self.status}] {self.idempotency_key}"
+
+
+class GeocodedAddress(models.Model):
+    """
+    Persistent geocoding cache, one row per normalized address. A row
+    without coordinates records that the geocoder found nothing.
+    """
+    # sha256 of the normalized address, addresses themselves can be long
+    key = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    backend = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def found(self):
+        return self.latitude is not None and self.longitude is not None
+
+    def __str__(self):
+        return f"{self.address} -> {(self.latitude, self.longitude) if self.found else 'not found'}"
+
+
+class NotificationBroadcast(models.Model):
+    """
+    Text of one notification fan-out, stored once. Each recipient gets a
+    compact Notification row pointing here that only holds delivery and
+    read state, see utils.broadcast_notifications.
+    """
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    blood_request = models.ForeignKey('BloodRequest', on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_notification_type_display()}: {self.title}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Read notifications moved out of Notification by archive_notifications.
+    Keeps the original id and plain ids instead of foreign keys, so the
+    archive has no constraints or indexes to maintain beyond the user lookup.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user_id = models.BigIntegerField(db_index=True)
+    notification_type = models.CharField(max_length=20)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    blood_request_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.notification_type} for user {self.user_id} ({self.created_at:%Y-%m-%d})"
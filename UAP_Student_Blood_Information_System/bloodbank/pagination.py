@@ -0,0 +1,88 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor pointing just after the row (created_at, pk)"""
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_distance_cursor(distance, pk):
+    """Cursor pointing just after the row (distance, pk) of a nearest-first list"""
+    raw = f"{distance!r}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_distance_cursor(cursor):
+    """Return (distance, pk) from a distance cursor, or None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        distance, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return float(distance), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk) from a cursor, or None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_size_from(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def older_than(created_at, pk, inclusive=False):
+    """
+    Q for rows after (created_at, pk) in newest-first order, and that row
+    itself if inclusive. The outer created_at__lte bounds the index range;
+    without it the OR makes SQLite read every newer row first.
+    """
+    same_time = {'id__lte' if inclusive else 'id__lt': pk}
+    return Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(**same_time))
+
+
+def keyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Newest-first page of queryset after the given cursor, ordered by
+    (-created_at, -id). The WHERE on the cursor keeps every page an index
+    range read, so deep pages cost the same as the first one.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Rows may be model instances or values() dicts with created_at and id.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+
+    position = decode_cursor(cursor)
+    if position:
+        queryset = queryset.filter(older_than(*position))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        else:
+            next_cursor = encode_cursor(last.created_at, last.pk)
+    return rows, next_cursor
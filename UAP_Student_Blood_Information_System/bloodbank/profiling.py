@@ -0,0 +1,214 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import base as template_base
+from django.utils import timezone
+
+# Requests kept in the in-process store unless PROFILING_HISTORY says otherwise
+DEFAULT_HISTORY = 200
+
+# Slowest queries kept per request
+DEFAULT_SLOW_QUERIES = 5
+
+# Frames from these paths are skipped when looking for the code that ran a query
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_LIBRARY_MARKERS = ('site-packages', 'dist-packages', f'{os.sep}lib{os.sep}python')
+
+_current = ContextVar('bloodbank_profile', default=None)
+
+
+class ProfileStore:
+    """Rolling, thread-safe list of the most recent request profiles"""
+
+    def __init__(self, size=DEFAULT_HISTORY):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        """Newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def resize(self, size):
+        with self._lock:
+            if size != self._entries.maxlen:
+                self._entries = deque(self._entries, maxlen=size)
+
+    def summary(self):
+        """Per-view request count, wall time percentiles and average queries"""
+        by_view = {}
+        for entry in self.entries():
+            by_view.setdefault(entry['view'], []).append(entry)
+
+        rows = []
+        for view, entries in by_view.items():
+            walls = sorted(e['wall_ms'] for e in entries)
+            rows.append({
+                'view': view,
+                'requests': len(entries),
+                'p50_ms': walls[len(walls) // 2],
+                'p95_ms': walls[min(len(walls) - 1, int(len(walls) * 0.95))],
+                'avg_queries': round(sum(e['queries'] for e in entries) / len(entries), 1),
+                'duplicates': sum(e['duplicates'] for e in entries),
+            })
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+
+store = ProfileStore()
+
+
+def _source_line():
+    """File:line and function of the innermost project frame outside this module"""
+    frame = sys._getframe(2)
+    while frame:
+        filename = frame.f_code.co_filename
+        if not any(marker in filename for marker in _LIBRARY_MARKERS) and filename != __file__:
+            return f'{os.path.relpath(filename)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryRecorder:
+    """execute_wrapper collecting SQL, parameters, duration and source line"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'ms': (time.perf_counter() - start) * 1000,
+                'source': _source_line(),
+            })
+
+
+def _timed_template_render(render):
+    def wrapper(self, context):
+        profile = _current.get()
+        # Only the outermost render is timed, includes are part of it
+        if profile is None or profile['rendering']:
+            return render(self, context)
+        profile['rendering'] = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile['template_ms'] += (time.perf_counter() - start) * 1000
+            profile['rendering'] = False
+
+    wrapper.profiling = True
+    return wrapper
+
+
+def _instrument_templates():
+    # Django only sends template_rendered under the test runner, so the
+    # render method itself is wrapped, once, when profiling is switched on
+    if not getattr(template_base.Template.render, 'profiling', False):
+        template_base.Template.render = _timed_template_render(template_base.Template.render)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in per-request profiling, enabled with PROFILING_ENABLED. Records
+    wall time, SQL count and time, duplicated queries, template render time
+    and the slowest queries with the line that ran them into `store`.
+    A PROFILING_CPROFILE_RATE share of requests to PROFILING_CPROFILE_PATHS
+    also runs under cProfile, written to PROFILING_CPROFILE_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_queries = getattr(settings, 'PROFILING_SLOW_QUERIES', DEFAULT_SLOW_QUERIES)
+        self.cprofile_rate = getattr(settings, 'PROFILING_CPROFILE_RATE', 0)
+        self.cprofile_paths = getattr(settings, 'PROFILING_CPROFILE_PATHS', [])
+        self.cprofile_dir = getattr(settings, 'PROFILING_CPROFILE_DIR', None)
+        store.resize(getattr(settings, 'PROFILING_HISTORY', DEFAULT_HISTORY))
+        _instrument_templates()
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        profile = {'template_ms': 0.0, 'rendering': False}
+        token = _current.set(profile)
+        profiler = cProfile.Profile() if self.should_cprofile(request) else None
+
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                if profiler:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        entry = self.build_entry(request, response, wall_ms, profile['template_ms'], recorder.queries)
+        if profiler:
+            entry['cprofile'] = self.dump(profiler, entry)
+        store.add(entry)
+        return response
+
+    def should_cprofile(self, request):
+        if not self.cprofile_dir or random.random() >= self.cprofile_rate:
+            return False
+        return not self.cprofile_paths or any(request.path.startswith(path) for path in self.cprofile_paths)
+
+    def build_entry(self, request, response, wall_ms, template_ms, queries):
+        exact = Counter((q['sql'], q['params']) for q in queries)
+        similar = Counter(q['sql'] for q in queries)
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'at': timezone.now(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall_ms, 2),
+            'queries': len(queries),
+            'sql_ms': round(sum(q['ms'] for q in queries), 2),
+            'template_ms': round(template_ms, 2),
+            # Same SQL and parameters run again, e.g. a count looked up twice
+            'duplicates': sum(n - 1 for n in exact.values()),
+            # Same SQL with other parameters, the N+1 pattern
+            'similar': sum(n - 1 for n in similar.values()),
+            'duplicated_sql': [sql for (sql, _), n in exact.most_common() if n > 1],
+            'slowest': [
+                {**q, 'ms': round(q['ms'], 3)}
+                for q in sorted(queries, key=lambda q: q['ms'], reverse=True)[:self.slow_queries]
+            ],
+            'cprofile': None,
+        }
+
+    def dump(self, profiler, entry):
+        os.makedirs(self.cprofile_dir, exist_ok=True)
+        name = f"{entry['at']:%Y%m%d-%H%M%S-%f}-{entry['view'].replace(':', '-').replace('/', '_')}.prof"
+        path = os.path.join(self.cprofile_dir, name)
+        profiler.dump_stats(path)
+        return path
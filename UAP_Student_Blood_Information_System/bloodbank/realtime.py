@@ -0,0 +1,119 @@
+import asyncio
+import math
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Notification
+from .utils import notification_version_key, unread_count_for
+
+# How often a connected client's version key is checked, in seconds. Each
+# check is one cache read: a file stat and read with the default file cache,
+# but a SELECT per client if CACHE_BACKEND is set to the database cache
+PUSH_CHECK_INTERVAL = 1
+
+# A long-poll request answers 304 after waiting this long without a change
+LONG_POLL_TIMEOUT = 25
+
+# Under WSGI polls are answered at once and clients poll again after this
+# many seconds, instead of pinning a worker thread for LONG_POLL_TIMEOUT.
+# Every request also saves the session (SESSION_SAVE_EVERY_REQUEST), so this
+# stays at the 30 s of the unread count polling it replaced
+WSGI_POLL_INTERVAL = 30
+
+# Comment line sent on an idle stream so proxies keep the connection open
+STREAM_KEEPALIVE = 15
+
+# Streams are closed after this long, EventSource reconnects with Last-Event-ID
+STREAM_MAX_AGE = 300
+
+# Newest notifications sent in one push, older ones are on the notifications page
+MAX_PUSHED_NOTIFICATIONS = 20
+
+
+def notification_etag(user_id, version):
+    return f'"n{user_id}-{version}"'
+
+
+async def current_version(user_id):
+    return await cache.aget(notification_version_key(user_id)) or 0
+
+
+async def wait_for_change(user_id, etag, timeout=LONG_POLL_TIMEOUT):
+    """
+    Wait until the user's notification version no longer matches etag.
+    Returns the new version, or None if nothing changed within timeout.
+    Only the cache is read while waiting, which runs no SQL unless the
+    cache itself is the database. A timeout that is not finite (nan, inf)
+    is treated as no wait at all.
+    """
+    if not math.isfinite(timeout):
+        timeout = 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        version = await current_version(user_id)
+        if notification_etag(user_id, version) != etag:
+            return version
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(PUSH_CHECK_INTERVAL, remaining))
+
+
+def notification_changes(user_id, after_id=0):
+    """
+    Unread count plus the notifications newer than after_id, rendered with
+    notification_items.html so clients can prepend them as they are.
+    """
+    new = list(
+        Notification.objects.filter(user_id=user_id, id__gt=after_id)
+        .select_related('broadcast')
+        .only('id', 'notification_type', 'title', 'message', 'is_read', 'created_at', 'blood_request_id',
+              'broadcast__title', 'broadcast__message')
+        .order_by('-id')[:MAX_PUSHED_NOTIFICATIONS]
+    )
+    return {
+        'count': unread_count_for(user_id),
+        'last_id': new[0].id if new else after_id,
+        'new': len(new),
+        'html': render_to_string('notification_items.html', {'notifications': new}) if new else '',
+    }
+
+
+def _event(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def notification_events(user_id, last_id=0, max_age=STREAM_MAX_AGE):
+    """
+    Server-Sent Events for one user: a 'notifications' event whenever the
+    version key changes, keep-alive comments otherwise. Notifications are
+    only queried when something actually changed; see PUSH_CHECK_INTERVAL
+    for what waiting costs.
+    """
+    loop = asyncio.get_running_loop()
+    started = idle_since = loop.time()
+    seen = None
+
+    # Tell EventSource how long to wait before reconnecting
+    yield f'retry: {PUSH_CHECK_INTERVAL * 1000}\n\n'
+
+    while loop.time() - started < max_age:
+        version = await current_version(user_id)
+        if version != seen:
+            seen = version
+            changes = await sync_to_async(notification_changes)(user_id, last_id)
+            last_id = changes['last_id']
+            yield _event('notifications', changes, event_id=last_id)
+            idle_since = loop.time()
+        elif loop.time() - idle_since >= STREAM_KEEPALIVE:
+            yield ': keep-alive\n\n'
+            idle_since = loop.time()
+        await asyncio.sleep(PUSH_CHECK_INTERVAL)
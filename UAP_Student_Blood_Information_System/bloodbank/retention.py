@@ -0,0 +1,194 @@
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
+
+from .models import Notification, NotificationBroadcast, ArchivedNotification
+
+# Rows copied and deleted per transaction, small enough that writers
+# (a notification fan-out) never wait long behind the job
+ARCHIVE_BATCH_SIZE = 1000
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'notification_type', 'title', 'message', 'blood_request_id', 'created_at')
+
+# Fan-out rows keep their text on the broadcast, archived rows get a copy
+BROADCAST_TEXT_FIELDS = {'title': 'broadcast__title', 'message': 'broadcast__message'}
+
+
+def retention_policy():
+    """notification_type -> days read notifications are kept"""
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {})
+
+
+def archivable_notifications(notification_type, days, now=None):
+    """Read notifications of notification_type older than days"""
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Notification.objects.filter(notification_type=notification_type, is_read=True, created_at__lt=cutoff)
+
+
+def archive_row(row):
+    """An ARCHIVE_FIELDS row with the broadcast's text filled in"""
+    for field, source in BROADCAST_TEXT_FIELDS.items():
+        text = row.pop(source)
+        if text is not None:
+            row[field] = text
+    return row
+
+
+class TableArchive:
+    """Copies rows into ArchivedNotification, in the batch's transaction"""
+
+    def write(self, rows):
+        # The original ids make a batch that is copied twice harmless
+        ArchivedNotification.objects.bulk_create(
+            [ArchivedNotification(**row) for row in rows], ignore_conflicts=True,
+        )
+        # Stays in the same database, nothing written elsewhere
+        return 0
+
+
+class FileArchive:
+    """
+    Appends rows as JSON lines to one notifications-YYYY-MM.jsonl file per
+    month of created_at. Files are synced before the rows are deleted; a
+    crash in between can write a row twice, never lose one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, rows):
+        by_month = {}
+        for row in rows:
+            line = json.dumps({**row, 'created_at': row['created_at'].isoformat()}, ensure_ascii=False)
+            by_month.setdefault(f"{row['created_at']:%Y-%m}", []).append(line + '\n')
+
+        written = 0
+        for month, lines in by_month.items():
+            with open(os.path.join(self.directory, f'notifications-{month}.jsonl'), 'a', encoding='utf-8') as f:
+                data = ''.join(lines)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            written += len(data.encode())
+        return written
+
+
+def table_bytes(*models):
+    """Bytes the models' tables and their indexes take, None where it can't be measured"""
+    tables = [model._meta.db_table for model in models]
+    placeholders = ', '.join(['%s'] * len(tables))
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # dbstat is in most SQLite builds, a DatabaseError where it is not
+                cursor.execute(
+                    'SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN '
+                    f'(SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}))',
+                    tables,
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute(f'SELECT SUM(pg_total_relation_size(t)) FROM unnest(ARRAY[{placeholders}]) AS t', tables)
+            else:
+                return None
+            return int(cursor.fetchone()[0] or 0)
+    except DatabaseError:
+        return None
+
+
+def notification_table_bytes():
+    """Bytes the notification tables and their indexes take"""
+    return table_bytes(Notification, NotificationBroadcast)
+
+
+def prune_broadcasts(batch_size=ARCHIVE_BATCH_SIZE, pause=0):
+    """
+    Delete broadcasts whose deliveries have all been archived, batch_size
+    ids at a time in pk order, each batch in its own short transaction.
+    Returns the number deleted.
+    """
+    orphaned = NotificationBroadcast.objects.filter(deliveries__isnull=True)
+    pruned, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            ids = list(orphaned.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Still orphaned: the ids may have been read before a delivery was added
+            pruned += orphaned.filter(pk__in=ids).delete()[0]
+        last_id = ids[-1]
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return pruned
+
+
+def archive_notifications(policy=None, archive=None, now=None, batch_size=ARCHIVE_BATCH_SIZE, pause=0, dry_run=False):
+    """
+    Move read notifications past their type's retention to archive (the
+    ArchivedNotification table by default), oldest first. Each batch is
+    one short transaction: copy, then a single DELETE by id. Returns run
+    metrics; with dry_run only counts what would move.
+    """
+    policy = retention_policy() if policy is None else policy
+    archive = archive or TableArchive()
+    now = now or timezone.now()
+    start = time.perf_counter()
+    bytes_before = notification_table_bytes()
+    moved, batches, archived_bytes = {}, 0, 0
+
+    for notification_type, days in sorted(policy.items()):
+        rows = archivable_notifications(notification_type, days, now).order_by('created_at', 'id')
+        if dry_run:
+            moved[notification_type] = rows.count()
+            continue
+
+        moved[notification_type] = 0
+        while True:
+            with transaction.atomic():
+                batch = [
+                    archive_row(row)
+                    for row in rows.values(*ARCHIVE_FIELDS, *BROADCAST_TEXT_FIELDS.values())[:batch_size]
+                ]
+                if not batch:
+                    break
+                archived_bytes += archive.write(batch)
+                Notification.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+            moved[notification_type] += len(batch)
+            batches += 1
+            if len(batch) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+    pruned = 0 if dry_run else prune_broadcasts(batch_size, pause)
+    bytes_after = notification_table_bytes()
+    return {
+        'moved': moved,
+        'total': sum(moved.values()),
+        'batches': batches,
+        'pruned_broadcasts': pruned,
+        'archived_bytes': archived_bytes,
+        'table_bytes_before': bytes_before,
+        'table_bytes_after': bytes_after,
+        'reclaimed_bytes': bytes_before - bytes_after if bytes_before is not None and bytes_after is not None else None,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def compact_database():
+    """Give the space freed by deletes back: VACUUM, outside any transaction"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(Notification._meta.db_table)}')
+        else:
+            return False
+    return True
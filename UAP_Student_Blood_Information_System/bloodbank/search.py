@@ -0,0 +1,53 @@
+import math
+
+from .models import UserProfile, eligible_to_donate
+
+# Radius search defaults for donor_list and the donors API
+DEFAULT_SEARCH_RADIUS_KM = 1
+MAX_SEARCH_RADIUS_KM = 50
+
+# Columns donor_cards.html renders, loaded with the user in one query
+DONOR_CARD_FIELDS = [
+    'id', 'user__username', 'blood_group', 'address', 'phone',
+    'last_donation_date', 'created_at', 'latitude', 'longitude',
+]
+
+
+def available_donors(blood_group, location):
+    """Available, eligible donors, optionally of one blood group and with location in their address"""
+    donors = UserProfile.objects.filter(
+        eligible_to_donate(),
+        is_donor=True,
+        is_available=True
+    ).select_related('user').only(*DONOR_CARD_FIELDS)
+
+    # Apply blood group filter if provided
+    if blood_group:
+        donors = donors.filter(blood_group=blood_group)
+
+    # Apply location filter if provided (simple text search in address)
+    if location:
+        donors = donors.filter(address__icontains=location)
+    return donors
+
+
+def float_param(request, name, default):
+    """Float query parameter, default when it is missing, malformed or not finite (nan, inf)"""
+    try:
+        value = float(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return value if math.isfinite(value) else default
+
+
+def search_origin(request):
+    """Origin for radius search: ?lat=&lng= if given, else the viewer's profile"""
+    lat = float_param(request, 'lat', None)
+    lng = float_param(request, 'lng', None)
+    if lat is not None and lng is not None and -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+
+    coords = UserProfile.objects.filter(user=request.user).values_list('latitude', 'longitude').first()
+    if coords and coords[0] is not None and coords[1] is not None:
+        return coords
+    return None
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_group_versions, ALL_BLOOD_GROUPS
+from .geocoding import UAP_LOCATIONS
+from .geolocation import geo_cell_for
+from .models import UserProfile, BloodRequest, Notification, eligible_from_for
+
+SEED_CHUNK_SIZE = 5000
+
+# Rows per UPDATE ... CASE when created_at is set after the insert
+BACKDATE_BATCH_SIZE = 1000
+
+# Approximate blood group shares in Bangladesh
+BLOOD_GROUP_WEIGHTS = {
+    'B+': 0.30, 'O+': 0.29, 'A+': 0.25, 'AB+': 0.09,
+    'A-': 0.02, 'B-': 0.02, 'O-': 0.02, 'AB-': 0.01,
+}
+REQUEST_STATUS_WEIGHTS = {'pending': 0.30, 'accepted': 0.20, 'completed': 0.35, 'cancelled': 0.10, 'expired': 0.05}
+URGENCY_WEIGHTS = {'normal': 0.60, 'urgent': 0.30, 'emergency': 0.10}
+NOTIFICATION_TYPE_WEIGHTS = {'blood_request': 0.60, 'donor_available': 0.15, 'request_accepted': 0.10, 'system': 0.15}
+
+# Donors cluster around these neighbourhoods, about 2 km standard deviation
+LOCATION_SPREAD = 0.02
+# Share of donors without coordinates, like the ones add_sample_donors creates
+UNLOCATED_SHARE = 0.10
+
+# created_at is spread over this many days before now
+HISTORY_DAYS = 180
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def chunks(count, size=SEED_CHUNK_SIZE):
+    for start in range(0, count, size):
+        yield range(start, min(start + size, count))
+
+
+def bulk_create_backdated(model, objects):
+    """
+    bulk_create objects, then restore the created_at each was built with:
+    auto_now_add overwrites it on insert. One UPDATE per batch of rows.
+    """
+    created_at = [obj.created_at for obj in objects]
+    objects = model.objects.bulk_create(objects)
+    for obj, moment in zip(objects, created_at):
+        obj.created_at = moment
+    model.objects.bulk_update(objects, ['created_at'], batch_size=BACKDATE_BATCH_SIZE)
+    return objects
+
+
+def past_moment(rng, now, days=HISTORY_DAYS):
+    return now - timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+
+
+def seed_donors(count, rng, prefix='seed_', password='password123', chunk_size=SEED_CHUNK_SIZE):
+    """
+    count users with donor profiles: weighted blood groups, clustered
+    locations, some unavailable or in their donation cooldown. The password
+    is hashed once and shared. Returns the new user ids.
+    """
+    password_hash = make_password(password)
+    places = sorted(UAP_LOCATIONS.items())
+    today = timezone.localdate()
+    now = timezone.now()
+    user_ids = []
+
+    for part in chunks(count, chunk_size):
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}{i}', email=f'{prefix}{i}@uap.edu.bd', password=password_hash)
+                for i in part
+            ])
+            profiles = []
+            for user in users:
+                name, (lat, lng) = rng.choice(places)
+                if rng.random() < UNLOCATED_SHARE:
+                    lat = lng = None
+                else:
+                    lat, lng = rng.gauss(lat, LOCATION_SPREAD), rng.gauss(lng, LOCATION_SPREAD)
+                last_donation = today - timedelta(days=rng.randrange(365)) if rng.random() < 0.4 else None
+                profiles.append(UserProfile(
+                    user=user,
+                    blood_group=weighted(rng, BLOOD_GROUP_WEIGHTS),
+                    phone=f'01{rng.randrange(10 ** 9):09d}',
+                    address=f'{name.title()}, Dhaka',
+                    is_donor=rng.random() < 0.85,
+                    is_available=rng.random() < 0.70,
+                    last_donation_date=last_donation,
+                    eligible_from=eligible_from_for(last_donation),
+                    latitude=lat,
+                    longitude=lng,
+                    geo_cell=geo_cell_for(lat, lng),
+                    created_at=past_moment(rng, now),
+                ))
+            bulk_create_backdated(UserProfile, profiles)
+            user_ids.extend(user.pk for user in users)
+    bump_group_versions('donors', ALL_BLOOD_GROUPS)
+    return user_ids
+
+
+def seed_requests(count, rng, user_ids, chunk_size=SEED_CHUNK_SIZE):
+    """count blood requests from random users, with weighted status and urgency. Returns their ids."""
+    now = timezone.now()
+    request_ids = []
+
+    for part in chunks(count, chunk_size):
+        requests = []
+        for _ in part:
+            status = weighted(rng, REQUEST_STATUS_WEIGHTS)
+            created_at = past_moment(rng, now)
+            requests.append(BloodRequest(
+                requester_id=rng.choice(user_ids),
+                blood_group=weighted(rng, BLOOD_GROUP_WEIGHTS),
+                units_required=rng.choice([1, 1, 1, 2, 2, 3]),
+                urgency=weighted(rng, URGENCY_WEIGHTS),
+                status=status,
+                accepted_by_id=rng.choice(user_ids) if status in ('accepted', 'completed') else None,
+                created_at=created_at,
+                needed_by=created_at + timedelta(hours=rng.randrange(6, 24 * 7)),
+            ))
+        with transaction.atomic():
+            request_ids.extend(request.pk for request in bulk_create_backdated(BloodRequest, requests))
+    bump_group_versions('requests', ALL_BLOOD_GROUPS)
+    return request_ids
+
+
+def seed_notifications(count, rng, user_ids, request_ids, chunk_size=SEED_CHUNK_SIZE):
+    """count notifications for random users, most of them already read. Returns the number created."""
+    now = timezone.now()
+    created = 0
+
+    for part in chunks(count, chunk_size):
+        notifications = []
+        for _ in part:
+            notification_type = weighted(rng, NOTIFICATION_TYPE_WEIGHTS)
+            linked = notification_type != 'system' and request_ids
+            notifications.append(Notification(
+                user_id=rng.choice(user_ids),
+                notification_type=notification_type,
+                title=f'Synthetic {notification_type.replace("_", " ")}',
+                message='Generated by seed_data',
+                blood_request_id=rng.choice(request_ids) if linked else None,
+                is_read=rng.random() < 0.70,
+                created_at=past_moment(rng, now),
+            ))
+        with transaction.atomic():
+            bulk_create_backdated(Notification, notifications)
+        created += len(notifications)
+    return created
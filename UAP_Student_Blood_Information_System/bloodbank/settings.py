@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +27,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Does nothing unless PROFILING_ENABLED is True
+    'UAP_Student_Blood_Information_System.bloodbank.profiling.ProfilingMiddleware',
 ]
 
 # Set the root URL configuration
@@ -58,10 +61,63 @@ TEMPLATES = [
 ]
 
 
-DATABASES = {
+# Database, from the environment. Without DB_ENGINE this is the SQLite file
+# next to the project; set DB_ENGINE (e.g. django.db.backends.postgresql),
+# DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT for a server database.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+# SQLITE_TUNED=1 for SQLite-only deployments: WAL lets reads carry on while
+# a notification fan-out holds the single write lock, synchronous=NORMAL is
+# safe under WAL and skips an fsync per commit, mmap_size serves reads from
+# mapped pages. Writers wait up to `timeout` seconds for the lock instead of
+# failing with "database is locked", and IMMEDIATE takes it at BEGIN so a
+# read-then-write transaction cannot fail halfway when upgrading its lock.
+SQLITE_TUNED_OPTIONS = {
+    'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456',
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+}
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': SQLITE_TUNED_OPTIONS if os.environ.get('SQLITE_TUNED') == '1' else {},
+            # Opening a SQLite file is cheap, persistent connections are opt-in
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', 'bloodbank'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Keep connections open between requests, and check they are
+            # still alive before reusing one after a database restart
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# Unread counters, notification and blood group versions and cached cards.
+# The web process, the notification worker and the cron commands all read and
+# write them, so they need a cache every process shares, not per-process
+# memory. Files in a shared directory cost no SQL and no SQLite write lock;
+# point CACHE_BACKEND/CACHE_LOCATION at e.g. RedisCache when the processes
+# run on more than one host.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'bloodbank_cache')),
+        'OPTIONS': {
+            # One counter and one version key per active user, plus fragments
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000)),
+        },
     }
 }
 
@@ -106,6 +162,43 @@ LOGIN_URL = '/login/'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Notification dispatch queue: views enqueue jobs, the run_notification_worker
+# command sends them. Set to True to run jobs right after the request commits
+# (no worker needed, but the response waits for the fan-out again).
+NOTIFICATION_QUEUE_EAGER = False
+
+# Read notifications older than this many days, per notification_type, are
+# moved out of the Notification table by the archive_notifications command.
+# Unread notifications and types not listed here are kept.
+NOTIFICATION_RETENTION_DAYS = {
+    'blood_request': 30,
+    'donor_available': 30,
+    'request_accepted': 180,
+    'request_completed': 180,
+    'request_cancelled': 180,
+    'request_expired': 180,
+    'system': 365,
+}
+
+# Address -> coordinates lookups, cached in the GeocodedAddress table.
+# FixtureGeocoder matches a fixed list of UAP-area places offline;
+# NominatimGeocoder asks OpenStreetMap (OPTIONS: user_agent, timeout).
+GEOCODER = {
+    'BACKEND': 'UAP_Student_Blood_Information_System.bloodbank.geocoding.FixtureGeocoder',
+    'OPTIONS': {},
+}
+
+# Per-request profiling: wall time, SQL, duplicate queries and template time
+# for the last PROFILING_HISTORY requests, shown to staff at /profiling/.
+# PROFILING_CPROFILE_RATE of the requests to PROFILING_CPROFILE_PATHS (all
+# paths if empty) also run under cProfile, .prof files go to PROFILING_CPROFILE_DIR.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILING_HISTORY = 200
+PROFILING_SLOW_QUERIES = 5
+PROFILING_CPROFILE_RATE = 0
+PROFILING_CPROFILE_PATHS = ['/dashboard/', '/donors/', '/notifications/']
+PROFILING_CPROFILE_DIR = BASE_DIR / 'profiles'
+
 # Media files settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
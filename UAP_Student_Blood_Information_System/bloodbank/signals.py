@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import bump_group_versions
+from .models import UserProfile, BloodRequest
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def donor_changed(sender, instance, **kwargs):
+    # A changed blood group moves the donor out of the old group's lists too
+    bump_group_versions('donors', {instance.blood_group, getattr(instance, '_loaded_blood_group', None)})
+    instance._loaded_blood_group = instance.blood_group
+
+
+@receiver([post_save, post_delete], sender=BloodRequest)
+def request_changed(sender, instance, **kwargs):
+    bump_group_versions('requests', {instance.blood_group, getattr(instance, '_loaded_blood_group', None)})
+    instance._loaded_blood_group = instance.blood_group
@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management.base import CommandError
+from django.db import connection, connections, OperationalError
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, RequestFactory
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import api, caching, dispatch, geocoding, geolocation, realtime, views
+from .dispatch import enqueue, process_batch, queue_depth, accept_blood_request
+from .caching import bump_group_versions
+from .expiry import expire_overdue_requests
+from .management.commands.bench_database import BENCH_ALIAS
+from .geocoding import (
+    DEFAULT_LOCATION, NEGATIVE_CACHE_TTL, FixtureGeocoder, GeocoderError, NominatimGeocoder, geocode_address, geocode_many,
+)
+from .geolocation import calculate_distance, get_nearby_donors, geo_cell_for, batch_distances, distance_matrix
+from .images import PICTURE_SIZES, picture_variant_name
+from .models import UserProfile, BloodRequest, Notification, NotificationBroadcast, NotificationJob, GeocodedAddress, ArchivedNotification, DONATION_COOLDOWN_DAYS
+from .pagination import keyset_page, decode_cursor, encode_cursor, older_than
+from .profiling import ProfilingMiddleware, store as profile_store
+from .retention import FileArchive, archive_notifications, prune_broadcasts
+from .search import available_donors
+from .matching import CAN_DONATE_TO, donor_groups_for, eligible_donors, eligible_donors_query, open_requests_for
+from .utils import send_blood_request_notifications, create_notification, get_unread_count, unread_count_key
+from .realtime import WSGI_POLL_INTERVAL, wait_for_change
+
+
+def make_profile(username, blood_group='A+', **kwargs):
+    user = User.objects.create(username=username)
+    return UserProfile.objects.create(
+        user=user,
+        blood_group=blood_group,
+        phone='0123456789',
+        address=kwargs.pop('address', 'UAP Campus, Dhaka'),
+        **kwargs
+    )
+
+
+class GeoCellTests(TestCase):
+    def test_geo_cell_follows_coordinates(self):
+        profile = make_profile('donor', latitude=23.8151, longitude=90.4255)
+        self.assertEqual(profile.geo_cell, geo_cell_for(23.8151, 90.4255))
+
+        profile.latitude, profile.longitude = 23.7465, 90.3760
+        profile.save(update_fields=['latitude', 'longitude'])
+        profile.refresh_from_db()
+        self.assertEqual(profile.geo_cell, geo_cell_for(23.7465, 90.3760))
+
+        profile.latitude = profile.longitude = None
+        profile.save()
+        profile.refresh_from_db()
+        self.assertIsNone(profile.geo_cell)
+
+    def test_nearby_donors_matches_full_scan(self):
+        origin = (23.8151, 90.4255)
+        points = [
+            (23.8151, 90.4255), (23.8200, 90.4300), (23.8067, 90.3683),
+            (23.7940, 90.4154), (23.8160, 90.4260), (23.8001, 90.4249),
+        ]
+        for i, (lat, lng) in enumerate(points):
+            make_profile(f'donor{i}', latitude=lat, longitude=lng)
+
+        for radius in (0.5, 1, 2.5, 10):
+            expected = sorted(
+                i for i, (lat, lng) in enumerate(points)
+                if calculate_distance(origin[0], origin[1], lat, lng) <= radius
+            )
+            found = get_nearby_donors(origin[0], origin[1], max_distance_km=radius)
+            self.assertEqual(sorted(int(d.user.username[5:]) for d in found), expected)
+            self.assertEqual([d.distance for d in found], sorted(d.distance for d in found))
+
+
+class BatchDistanceTests(SimpleTestCase):
+    origins = [(23.8151, 90.4255), (23.7465, 90.3760)]
+    points = [(23.8067, 90.3683), (23.7940, 90.4154), (23.8759, 90.3795)]
+
+    def check_against_scalar(self):
+        lats, lngs = zip(*self.points)
+        o_lats, o_lngs = zip(*self.origins)
+
+        matrix = distance_matrix(o_lats, o_lngs, lats, lngs)
+        for row, (o_lat, o_lng) in zip(matrix, self.origins):
+            expected = [calculate_distance(o_lat, o_lng, lat, lng) for lat, lng in self.points]
+            self.assertEqual([round(d, 9) for d in row], [round(d, 9) for d in expected])
+
+        single = batch_distances(o_lats[0], o_lngs[0], lats, lngs)
+        self.assertEqual([round(d, 9) for d in single], [round(d, 9) for d in matrix[0]])
+
+    def test_matches_scalar(self):
+        self.check_against_scalar()
+
+    def test_matches_scalar_without_numpy(self):
+        with mock.patch.object(geolocation, 'np', None):
+            self.check_against_scalar()
+
+
+class DonorListRadiusTests(TestCase):
+    def setUp(self):
+        self.viewer = make_profile('viewer', latitude=23.8151, longitude=90.4255)
+        make_profile('near_a', 'A+', latitude=23.8160, longitude=90.4260)
+        make_profile('near_b', 'B+', latitude=23.8200, longitude=90.4300)
+        make_profile('far_a', 'A+', latitude=23.8759, longitude=90.3795, address='Uttara, Dhaka')
+        self.client.force_login(self.viewer.user)
+
+    def usernames(self, response):
+        return [donor.user.username for donor in response.context['donors']]
+
+    def test_radius_uses_profile_coordinates(self):
+        response = self.client.get('/donors/', {'use_radius': 'true', 'radius': 2})
+        self.assertEqual(self.usernames(response), ['near_a', 'near_b'])
+        self.assertEqual(response.context['donors'][0].distance, round(calculate_distance(23.8151, 90.4255, 23.8160, 90.4260), 2))
+
+    def test_radius_with_explicit_origin_and_filters(self):
+        params = {'use_radius': 'true', 'radius': 20, 'lat': 23.8759, 'lng': 90.3795}
+        response = self.client.get('/donors/', params)
+        self.assertEqual(self.usernames(response), ['far_a', 'near_b', 'near_a'])
+
+        response = self.client.get('/donors/', dict(params, blood_group='A+', location='uttara'))
+        self.assertEqual(self.usernames(response), ['far_a'])
+
+    def test_non_finite_numbers_fall_back_to_defaults(self):
+        for value in ('nan', 'inf', '-inf'):
+            response = self.client.get('/donors/', {'use_radius': 'true', 'radius': value, 'lat': value, 'lng': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['radius'], 1)
+            # Searched around the profile, not around nan
+            self.assertEqual(self.usernames(response), ['near_a', 'near_b'])
+
+    def test_radius_page_size(self):
+        response = self.client.get('/donors/', {'use_radius': 'true', 'radius': 20, 'page_size': 1})
+        self.assertEqual(self.usernames(response), ['near_a'])
+
+
+class NotificationFanOutTests(TestCase):
+    def setUp(self):
+        self.requester = User.objects.create(username='requester')
+
+    def add_donors(self, count, start=0, blood_group='O+'):
+        for i in range(start, start + count):
+            make_profile(f'fanout_donor{i}', blood_group)
+
+    def fan_out(self):
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        with CaptureQueriesContext(connection) as ctx:
+            created = send_blood_request_notifications(blood_request)
+        return created, len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        self.add_donors(5)
+        created_small, queries_small = self.fan_out()
+
+        self.add_donors(95, start=5)
+        created_large, queries_large = self.fan_out()
+
+        self.assertEqual((created_small, created_large), (5, 100))
+        self.assertEqual(queries_small, queries_large)
+        self.assertEqual(Notification.objects.filter(notification_type='blood_request').count(), 105)
+
+    def test_skips_requester_and_unavailable_donors(self):
+        self.add_donors(3)
+        make_profile('busy', 'O+', is_available=False)
+        make_profile('other_group', 'A+')
+        UserProfile.objects.create(user=self.requester, blood_group='O+', phone='1', address='x')
+
+        created, _ = self.fan_out()
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('user__username', flat=True)),
+            {'fanout_donor0', 'fanout_donor1', 'fanout_donor2'},
+        )
+        notification = Notification.objects.select_related('broadcast').first()
+        self.assertEqual(notification.display_title, 'New Blood Request for O+')
+        self.assertIn('requester needs 1 unit(s) of O+ blood', notification.display_message)
+
+    def test_text_is_stored_once_per_broadcast(self):
+        self.add_donors(4)
+        self.fan_out()
+
+        broadcast = NotificationBroadcast.objects.get()
+        self.assertEqual(broadcast.title, 'New Blood Request for O+')
+        self.assertEqual(broadcast.deliveries.count(), 4)
+        self.assertFalse(Notification.objects.exclude(title='', message='').exists())
+
+    def test_no_broadcast_without_recipients(self):
+        self.assertEqual(self.fan_out()[0], 0)
+        self.assertFalse(NotificationBroadcast.objects.exists())
+
+    def test_views_and_counts_read_broadcast_text(self):
+        self.add_donors(1)
+        self.fan_out()
+        self.fan_out()
+        create_notification(User.objects.get(username='fanout_donor0'), 'system', 'Direct title', 'Direct text')
+        self.client.force_login(User.objects.get(username='fanout_donor0'))
+
+        self.assertEqual(self.client.get('/notifications/count/', HTTP_X_REQUESTED_WITH='XMLHttpRequest').json(), {'count': 3})
+        self.assertContains(self.client.get('/dashboard/'), 'New Blood Request for O+', count=2)
+        # One query for the page, however many broadcasts it shows
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/notifications/')
+        self.assertContains(response, 'New Blood Request for O+', count=2)
+        self.assertContains(response, 'Direct title')
+        self.assertEqual(len([q for q in ctx.captured_queries if 'bloodbank_notificationbroadcast' in q['sql']]), 1)
+
+    def test_storage_benchmark_compares_layouts(self):
+        out = StringIO()
+        call_command('bench_fan_out_storage', '--donors', '30', '--repeat', '1', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('per_row') and lines[1].startswith('broadcast'))
+        self.assertIn(' recipients | write', lines[1])
+        self.assertFalse(User.objects.filter(username__startswith='bench_fan_out_').exists())
+
+
+class NotificationQueueTests(TestCase):
+    def setUp(self):
+        self.requester = User.objects.create(username='requester')
+        make_profile('queue_donor1', 'O+')
+        make_profile('queue_donor2', 'O+')
+        self.client.force_login(self.requester)
+
+    def post_request(self):
+        return self.client.post('/request-blood/', {
+            'blood_group': 'O+', 'units_required': 1, 'urgency': 'normal',
+            'hospital_name': 'UAP Medical Center', 'hospital_address': 'Dhaka',
+            'contact_person': 'Staff', 'contact_phone': '0123456789',
+            'needed_by_date': '2030-01-01', 'needed_by_time': '12:00',
+        })
+
+    def test_view_enqueues_and_worker_drains(self):
+        response = self.post_request()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(queue_depth(), 1)
+
+        stats = process_batch()
+        self.assertEqual((stats['jobs'], stats['failed'], stats['notifications']), (1, 0, 2))
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_enqueue_is_idempotent(self):
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        for _ in range(3):
+            enqueue('blood_request', f'blood_request:{blood_request.pk}', blood_request_id=blood_request.pk)
+        process_batch()
+        process_batch()
+        self.assertEqual(NotificationJob.objects.count(), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_failed_job_is_retried_without_duplicates(self):
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        job = enqueue('blood_request', 'retry-test', blood_request_id=blood_request.pk)
+
+        # Fail after the notifications were inserted: they must be rolled back
+        def flaky(payload):
+            send_blood_request_notifications(blood_request)
+            raise RuntimeError('boom')
+
+        with mock.patch.dict(dispatch.JOB_HANDLERS, {'blood_request': flaky}):
+            stats = process_batch()
+        job.refresh_from_db()
+        self.assertEqual((stats['failed'], job.status, job.attempts), (1, 'pending', 1))
+        self.assertEqual(Notification.objects.count(), 0)
+
+        NotificationJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+        process_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+    def test_released_job_is_finished_by_one_worker_only(self):
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        enqueue('blood_request', 'stale-test', blood_request_id=blood_request.pk)
+        (first,) = dispatch.claim_jobs(50)
+
+        # The first worker looks dead, its job goes to a second one
+        NotificationJob.objects.filter(pk=first.pk).update(available_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(dispatch.release_stale_jobs(), 1)
+        (second,) = dispatch.claim_jobs(50)
+        self.assertEqual(dispatch.run_job(second), 2)
+
+        # The first worker wakes up: its claim is gone, it runs nothing
+        self.assertEqual(dispatch.run_job(first), 0)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(NotificationJob.objects.get().attempts, 1)
+
+    def test_job_claimed_away_mid_run_rolls_back(self):
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        enqueue('blood_request', 'lost-test', blood_request_id=blood_request.pk)
+        (job,) = dispatch.claim_jobs(50)
+
+        def slow(payload):
+            created = send_blood_request_notifications(blood_request)
+            # Meanwhile another worker claims the job after a release
+            NotificationJob.objects.filter(pk=job.pk).update(available_at=timezone.now() + timedelta(seconds=1))
+            return created
+
+        with mock.patch.dict(dispatch.JOB_HANDLERS, {'blood_request': slow}):
+            self.assertEqual(dispatch.run_job(job), 0)
+        self.assertEqual(Notification.objects.count(), 0)
+
+
+class UnreadCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        self.other = User.objects.create(username='other')
+        make_profile('count_donor', 'O+')
+        self.client.force_login(self.user)
+
+    def notify(self, user=None):
+        return create_notification(user or self.user, 'system', 'Hello', 'Test message')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/dashboard/')
+        count_queries = [q for q in ctx.captured_queries if 'COUNT(' in q['sql'] and 'notification' in q['sql']]
+        return response, len(count_queries)
+
+    def test_page_render_counts_at_most_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notify()
+        response, counts = self.count_queries()
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(counts, 1)
+
+        # Cached now: no COUNT at all
+        response, counts = self.count_queries()
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(counts, 0)
+
+    def test_create_and_read_paths_keep_counter_in_sync(self):
+        self.client.get('/dashboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.notify()
+            self.notify()
+        # Dropped, not incremented: the next read counts again
+        self.assertIsNone(cache.get(unread_count_key(self.user.pk)))
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        self.assertEqual(self.client.get('/notifications/count/', **ajax).json(), {'count': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/notifications/{first.pk}/read/', **ajax)
+            self.client.post(f'/notifications/{first.pk}/read/', **ajax)
+        self.assertEqual(self.client.get('/notifications/count/', **ajax).json(), {'count': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/notifications/')
+        self.assertEqual(self.client.get('/notifications/count/', **ajax).json(), {'count': 0})
+
+    def test_counters_are_shared_with_other_processes(self):
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        self.assertEqual(self.client.get('/notifications/count/', **ajax).json(), {'count': 0})
+
+        # A separate cache connection stands in for the notification worker
+        worker_cache = caches.create_connection('default')
+        Notification.objects.create(user=self.user, notification_type='system', title='From the worker', message='m')
+        worker_cache.delete(unread_count_key(self.user.pk))
+        self.assertEqual(self.client.get('/notifications/count/', **ajax).json(), {'count': 1})
+
+    def test_bulk_fan_out_invalidates_and_reconcile_fixes_drift(self):
+        donor = User.objects.get(username='count_donor')
+        cache.set(unread_count_key(donor.pk), 0)
+        blood_request = BloodRequest.objects.create(requester=self.other, blood_group='O+')
+        with self.captureOnCommitCallbacks(execute=True):
+            send_blood_request_notifications(blood_request)
+        self.assertIsNone(cache.get(unread_count_key(donor.pk)))
+
+        cache.set(unread_count_key(donor.pk), 7)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_unread_counts', stdout=out)
+        self.assertIn('fixed 1 drifted', out.getvalue())
+        # Dropped rather than overwritten, the next read counts it
+        self.assertIsNone(cache.get(unread_count_key(donor.pk)))
+        self.assertEqual(get_unread_count(donor), 1)
+
+
+class BulkMarkNotificationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='bulk_reader')
+        self.client.force_login(self.user)
+        now = timezone.now()
+        self.rows = []
+        for i in range(6):
+            notification = Notification.objects.create(
+                user=self.user, notification_type='system' if i % 2 else 'blood_request', title=f'n{i}', message='m',
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=now - timedelta(minutes=10 - i))
+            notification.created_at = now - timedelta(minutes=10 - i)
+            self.rows.append(notification)
+        self.other = create_notification(User.objects.create(username='bulk_other'), 'system', 'Not yours', 'm')
+
+    def mark(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/notifications/mark/', data)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "bloodbank_notification"')]
+        return response, len(updates)
+
+    def unread(self):
+        return set(Notification.objects.filter(user=self.user, is_read=False).values_list('title', flat=True))
+
+    def test_marks_ids_in_one_update_and_returns_count(self):
+        response, updates = self.mark(ids=[self.rows[0].pk, self.rows[1].pk, self.other.pk])
+        self.assertEqual(response.json(), {'changed': 2, 'count': 4})
+        self.assertEqual(updates, 1)
+        self.assertFalse(Notification.objects.get(pk=self.other.pk).is_read)
+        # The cached counter follows
+        self.assertEqual(self.client.get('/notifications/count/', HTTP_X_REQUESTED_WITH='XMLHttpRequest').json(), {'count': 4})
+
+    def test_before_cursor_includes_that_row_and_older_ones(self):
+        response, _ = self.mark(before=encode_cursor(self.rows[2].created_at, self.rows[2].pk))
+        self.assertEqual(response.json(), {'changed': 3, 'count': 3})
+        self.assertEqual(self.unread(), {'n3', 'n4', 'n5'})
+
+    def test_type_and_unread_and_combined_filters(self):
+        self.assertEqual(self.mark(type='system')[0].json(), {'changed': 3, 'count': 3})
+        self.assertEqual(self.unread(), {'n0', 'n2', 'n4'})
+
+        response, _ = self.mark(type='system', before=encode_cursor(self.rows[3].created_at, self.rows[3].pk), read='0')
+        self.assertEqual(response.json(), {'changed': 2, 'count': 5})
+        self.assertEqual(self.unread(), {'n0', 'n1', 'n2', 'n3', 'n4'})
+
+        # Already in that state: nothing changes, nothing is recounted
+        response, _ = self.mark(ids=[self.rows[0].pk], read='0')
+        self.assertEqual(response.json(), {'changed': 0, 'count': 5})
+
+    def test_marking_drops_the_cached_counter_instead_of_setting_it(self):
+        key = unread_count_key(self.user.pk)
+        cache.set(key, 6)
+        self.assertEqual(self.mark(type='system')[0].json(), {'changed': 3, 'count': 3})
+        # Another process may have added a notification after the recount
+        self.assertIsNone(cache.get(key))
+        Notification.objects.create(user=self.user, notification_type='system', title='elsewhere', message='m')
+        response = self.client.get('/notifications/count/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'count': 4})
+
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.client.get('/notifications/mark/').status_code, 405)
+        for data in ({}, {'ids': 'x'}, {'before': 'nonsense!'}, {'type': 'spam'}, {'ids': list(range(501))}):
+            self.assertEqual(self.mark(**data)[0].status_code, 400, data)
+        self.assertEqual(len(self.unread()), 6)
+
+    def test_visiting_keeps_newer_notifications_unread(self):
+        # Arrives between reading the page and marking it read
+        def late_arrival(*args, **kwargs):
+            create_notification(self.user, 'system', 'late', 'm')
+            return original(*args, **kwargs)
+
+        original = views.mark_notifications
+        with mock.patch.object(views, 'mark_notifications', late_arrival):
+            response = self.client.get('/notifications/')
+        self.assertEqual(response.context['unread_count'], 1)
+        self.assertEqual(self.unread(), {'late'})
+
+
+class NotificationPushTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='listener')
+        self.client.force_login(self.user)
+
+    def notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(self.user, 'system', 'Hello', 'Pushed message')
+
+    def test_long_poll_answers_304_without_touching_notifications(self):
+        first = self.client.get('/notifications/poll/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['count'], 0)
+
+        with CaptureQueriesContext(connection) as ctx:
+            idle = self.client.get('/notifications/poll/', {'timeout': 0}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(idle.status_code, 304)
+        self.assertEqual(idle['ETag'], first['ETag'])
+        self.assertFalse([q for q in ctx.captured_queries if 'bloodbank_notification' in q['sql']])
+
+        notification = self.notify()
+        changed = self.client.get(
+            '/notifications/poll/', {'timeout': 0, 'last_id': 0}, HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        data = changed.json()
+        self.assertEqual((data['count'], data['last_id'], data['new']), (1, notification.pk, 1))
+        self.assertIn(f'notification-{notification.pk}', data['html'])
+
+    def test_poll_does_not_wait_under_wsgi_or_for_non_finite_timeouts(self):
+        etag = self.client.get('/notifications/poll/')['ETag']
+        # The sync test client is a WSGI request: answered at once, client told to pace itself
+        with mock.patch('asyncio.sleep') as sleep:
+            idle = self.client.get('/notifications/poll/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(idle.status_code, 304)
+        self.assertEqual(idle['X-Poll-Interval'], str(WSGI_POLL_INTERVAL))
+        sleep.assert_not_called()
+
+        for timeout in (float('nan'), float('inf')):
+            self.assertIsNone(async_to_sync(wait_for_change)(self.user.pk, etag, timeout))
+
+        # Idle waiting reads the shared cache only, no SQL in any thread
+        with mock.patch.object(realtime, 'PUSH_CHECK_INTERVAL', 0.01), \
+                mock.patch('django.db.backends.utils.CursorWrapper.execute', side_effect=AssertionError('SQL')):
+            self.assertIsNone(async_to_sync(wait_for_change)(self.user.pk, etag, 0.05))
+
+        async def asgi_poll():
+            await self.async_client.aforce_login(self.user)
+            return await self.async_client.get('/notifications/poll/', {'timeout': 'nan'}, headers={'If-None-Match': etag})
+
+        response = async_to_sync(asgi_poll)()
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Poll-Interval', response)
+
+    def test_stream_pushes_over_asgi_and_refuses_wsgi(self):
+        # The sync test client is a WSGI request, EventSource should fall back
+        self.assertEqual(self.client.get('/notifications/stream/').status_code, 204)
+
+        notification = self.notify()
+
+        async def first_event():
+            await self.async_client.aforce_login(self.user)
+            response = await self.async_client.get('/notifications/stream/')
+            events = response.streaming_content
+            chunks = [await anext(events), await anext(events)]
+            await events.aclose()
+            return response, b''.join(chunks).decode()
+
+        response, body = async_to_sync(first_event)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: notifications', body)
+        self.assertIn(f'id: {notification.pk}', body)
+        self.assertIn('"count": 1', body)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'plan assertions are written against SQLite EXPLAIN QUERY PLAN')
+class QueryPlanTests(TestCase):
+    """
+    Hot view querysets must be answered from an index. SQLite reports a
+    full table read as "SCAN <table>" without "USING ... INDEX".
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='planner')
+
+    def assert_indexed(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            table_scan = re.search(r'\bSCAN (bloodbank_\w+)', line)
+            if table_scan and 'INDEX' not in line:
+                self.fail(f'Full scan of {table_scan.group(1)}:\n{plan}\n{queryset.query}')
+        return plan
+
+    def test_donor_list(self):
+        # The query _donor_cards pages through, first and later pages, with and without a blood group
+        for blood_group in ('', 'A+'):
+            donors = available_donors(blood_group, '').order_by('-created_at', '-id')
+            for page in (donors, donors.filter(older_than(timezone.now(), 1000))):
+                plan = self.assert_indexed(page[:21])
+                self.assertNotIn('TEMP B-TREE', plan)
+                # eligible_from is checked on the rows read, not ORed over its own index
+                self.assertNotIn('MULTI-INDEX OR', plan)
+
+    def test_fan_out_recipients(self):
+        blood_request = BloodRequest(requester=self.user, blood_group='AB+')
+        self.assert_indexed(eligible_donors_query(blood_request).values_list('user_id', flat=True))
+
+    def test_dashboard_pending_requests(self):
+        donor = UserProfile(user=self.user, blood_group='O-')
+        self.assert_indexed(open_requests_for(donor)[:3])
+
+    def test_request_history(self):
+        self.assert_indexed(BloodRequest.objects.filter(requester=self.user).order_by('-created_at'))
+
+    def test_notifications(self):
+        self.assert_indexed(Notification.objects.filter(user=self.user))
+        self.assert_indexed(Notification.objects.filter(user=self.user).order_by('-created_at')[:5])
+
+    def test_cursor_pages_are_bounded_index_ranges(self):
+        position = (timezone.now(), 1000)
+        for queryset, index in (
+            (Notification.objects.filter(user=self.user), 'notif_user_created_idx'),
+            (BloodRequest.objects.filter(requester=self.user), 'request_requester_created_idx'),
+        ):
+            for inclusive in (False, True):
+                page = queryset.filter(older_than(*position, inclusive=inclusive)).order_by('-created_at', '-id')[:21]
+                plan = self.assert_indexed(page)
+                # A range on created_at within the user's rows, no sort afterwards
+                self.assertRegex(plan, rf'USING INDEX {index} \(\w+=\? AND created_at<\?\)')
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_unread_count(self):
+        plan = self.assert_indexed(Notification.objects.filter(user_id=self.user.pk, is_read=False).values('id'))
+        self.assertIn('INDEX', plan)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='pager')
+        self.client.force_login(self.user)
+        # Identical timestamps force the id tie-breaker
+        now = timezone.now()
+        Notification.objects.bulk_create([
+            Notification(user=self.user, notification_type='system', title=f'n{i}', message='m')
+            for i in range(25)
+        ])
+        Notification.objects.filter(user=self.user).update(created_at=now)
+        for i in range(3):
+            BloodRequest.objects.create(requester=self.user, blood_group='A+')
+
+    def test_cursor_round_trip(self):
+        rows, cursor = keyset_page(Notification.objects.filter(user=self.user), page_size=10)
+        self.assertEqual(decode_cursor(cursor), (rows[-1].created_at, rows[-1].pk))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+
+    def test_pages_cover_everything_once(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(Notification.objects.filter(user=self.user), cursor, 10)
+            seen.extend(n.title for n in rows)
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'n{i}' for i in reversed(range(25))])
+
+    def test_views_and_json_endpoints(self):
+        response = self.client.get('/notifications/', {'page_size': 10})
+        self.assertEqual(len(response.context['notifications']), 10)
+        cursor = response.context['next_cursor']
+
+        data = self.client.get('/notifications/page/', {'page_size': 10, 'cursor': cursor}).json()
+        self.assertEqual(data['html'].count('class="notification-item'), 10)
+        data = self.client.get('/notifications/page/', {'page_size': 10, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(data['html'].count('class="notification-item'), 5)
+        self.assertIsNone(data['next_cursor'])
+
+        response = self.client.get('/request-history/', {'page_size': 2})
+        self.assertEqual(len(response.context['user_requests']), 2)
+        data = self.client.get('/request-history/page/', {'page_size': 2, 'cursor': response.context['next_cursor']}).json()
+        self.assertEqual(data['html'].count('class="request-card"'), 1)
+
+    def test_donor_list_pages_keep_filters(self):
+        for i in range(3):
+            make_profile(f'page_a{i}', 'A+')
+        make_profile('page_b', 'B+')
+
+        response = self.client.get('/donors/', {'blood_group': 'A+', 'page_size': 2})
+        self.assertEqual(len(response.context['donors']), 2)
+        data = self.client.get('/donors/page/', {
+            'blood_group': 'A+', 'page_size': 2, 'cursor': response.context['next_cursor'],
+        }).json()
+        self.assertEqual(data['html'].count('class="donor-card"'), 1)
+        self.assertIsNone(data['next_cursor'])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_profile('viewer', 'O-')
+        self.client.force_login(self.viewer.user)
+
+    def queries_on(self, url, table, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        return response, [q['sql'] for q in ctx.captured_queries if table in q['sql']]
+
+    def beyond_session(self, queries):
+        """Queries other than the session and auth middleware's: app tables and the cache alike"""
+        return [sql for sql in queries if not re.search(r'"(django_session|auth_user)"|SAVEPOINT', sql)]
+
+    def donor_names(self, params):
+        response, _ = self.queries_on('/donors/', 'bloodbank_userprofile', params)
+        return [donor.user.username for donor in response.context['donors']]
+
+    def test_donor_cards_hit_runs_no_sql(self):
+        make_profile('a1', 'A+')
+        make_profile('a2', 'A+')
+        _, queries = self.queries_on('/donors/', 'bloodbank_userprofile', {'blood_group': 'A+'})
+        self.assertEqual(len(queries), 1)
+        response, queries = self.queries_on('/donors/', '', {'blood_group': 'A+'})
+        self.assertEqual(self.beyond_session(queries), [])
+        self.assertContains(response, '<h3>a1</h3>')
+        self.assertContains(response, '<h3>a2</h3>')
+
+    def test_bump_from_another_process_drops_cached_cards(self):
+        make_profile('a1', 'A+')
+        self.assertEqual(self.donor_names({'blood_group': 'A+'}), ['a1'])
+
+        # A cron command (own process, own cache connection) changes rows in
+        # bulk, so no signal fires, and bumps the version itself
+        UserProfile.objects.filter(user__username='a1').update(is_available=False)
+        with mock.patch.object(caching, 'cache', caches.create_connection('default')):
+            bump_group_versions('donors', ['A+'])
+        self.assertEqual(self.donor_names({'blood_group': 'A+'}), [])
+
+    def test_saves_invalidate_the_blood_group(self):
+        self.assertEqual(self.donor_names({'blood_group': 'A+'}), [])
+        moving = make_profile('moving', 'A+')
+        self.assertEqual(self.donor_names({'blood_group': 'A+'}), ['moving'])
+        self.assertEqual(self.donor_names({'blood_group': 'B+'}), [])
+
+        # Both the old and the new group's cards are dropped
+        moving = UserProfile.objects.get(pk=moving.pk)
+        moving.blood_group = 'B+'
+        moving.save()
+        self.assertEqual(self.donor_names({'blood_group': 'A+'}), [])
+        self.assertEqual(self.donor_names({'blood_group': 'B+'}), ['moving'])
+
+        # Cached lists of other groups are untouched
+        self.donor_names({'blood_group': 'O+'})
+        make_profile('other', 'AB+')
+        _, queries = self.queries_on('/donors/', 'bloodbank_userprofile', {'blood_group': 'O+'})
+        self.assertEqual(queries, [])
+
+        moving.delete()
+        self.assertEqual(self.donor_names({'blood_group': 'B+'}), [])
+
+    def test_cards_are_shared_but_skip_the_viewer(self):
+        for i in range(3):
+            make_profile(f'o{i}', 'O-')
+        self.assertEqual(self.donor_names({'blood_group': 'O-', 'page_size': 2}), ['o2', 'o1'])
+
+        other = User.objects.get(username='o2')
+        self.client.force_login(other)
+        # Their navbar counter is cached too, only the cards are under test
+        cache.set(unread_count_key(other.pk), 0)
+        response, queries = self.queries_on('/donors/', '', {'blood_group': 'O-', 'page_size': 2})
+        self.assertEqual([d.user.username for d in response.context['donors']], ['o1', 'o0'])
+        self.assertEqual(self.beyond_session(queries), [])
+        data = self.client.get('/donors/page/', {
+            'blood_group': 'O-', 'page_size': 2, 'cursor': response.context['next_cursor'],
+        }).json()
+        self.assertIn('<h3>viewer</h3>', data['html'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_open_request_cards(self):
+        requester = make_profile('needs_blood', 'A+').user
+        blood_request = BloodRequest.objects.create(requester=requester, blood_group='A+', hospital_name='Square')
+        # The viewer's own request is in the cached cards but never shown to them
+        BloodRequest.objects.create(requester=self.viewer.user, blood_group='B+')
+
+        response, queries = self.queries_on('/dashboard/', 'CASE WHEN')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.context['pending_requests'], [blood_request])
+        response, queries = self.queries_on('/dashboard/', 'CASE WHEN')
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'Square')
+
+        # update() paths bump the version themselves
+        self.assertTrue(accept_blood_request(blood_request, make_profile('helper').user))
+        response, queries = self.queries_on('/dashboard/', 'CASE WHEN')
+        self.assertEqual(len(queries), 1)
+        self.assertNotContains(response, 'Square')
+
+
+class QueryCountTests(TestCase):
+    """
+    Every list view must run the same number of queries no matter how
+    many rows there are, i.e. no per-row lazy loading of related objects.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create(username='viewer', is_staff=True, is_superuser=True)
+        UserProfile.objects.create(user=self.viewer, blood_group='A+', phone='1', address='Dhaka')
+        self.client.force_login(self.viewer)
+        self.seeded = 0
+
+    def seed(self, total):
+        """Grow the dataset to `total` donors, requests and notifications"""
+        count = total - self.seeded
+        users = User.objects.bulk_create([
+            User(username=f'qc_{self.seeded + i}', password='!') for i in range(count)
+        ])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, blood_group='A+', phone='1', address='Dhaka') for user in users
+        ])
+        requests = BloodRequest.objects.bulk_create([
+            BloodRequest(requester=self.viewer, blood_group='A+', accepted_by=user) for user in users
+        ])
+        others = BloodRequest.objects.bulk_create([
+            BloodRequest(requester=user, blood_group='A+') for user in users
+        ])
+        NotificationBroadcast.objects.bulk_create([
+            NotificationBroadcast(notification_type='blood_request', title='t', message='m', blood_request=r)
+            for r in others
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=self.viewer, notification_type='blood_request', title='t', message='m', blood_request=r)
+            for r in requests
+        ])
+        self.seeded = total
+
+    def queries_for(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.seed(10)
+        small = self.queries_for(url)
+        self.seed(1000)
+        large = self.queries_for(url)
+        self.assertEqual(small, large, url)
+
+    def test_donor_list(self):
+        self.assert_constant_queries('/donors/')
+
+    def test_donor_list_radius(self):
+        UserProfile.objects.filter(user=self.viewer).update(latitude=23.8151, longitude=90.4255)
+        locate_donors = lambda: UserProfile.objects.exclude(user=self.viewer).update(
+            latitude=23.8152, longitude=90.4256, geo_cell=geo_cell_for(23.8152, 90.4256)
+        )
+        self.seed(10)
+        locate_donors()
+        small = self.queries_for('/donors/?use_radius=true')
+        self.seed(1000)
+        locate_donors()
+        large = self.queries_for('/donors/?use_radius=true')
+        self.assertEqual(small, large)
+
+    def test_dashboard(self):
+        self.assert_constant_queries('/dashboard/')
+
+    def test_request_history(self):
+        self.assert_constant_queries('/request-history/')
+
+    def test_notifications(self):
+        self.assert_constant_queries('/notifications/')
+
+    def test_admin_changelists(self):
+        for model in ('userprofile', 'bloodrequest', 'notification', 'notificationbroadcast'):
+            with self.subTest(model=model):
+                self.seeded = 0
+                User.objects.filter(username__startswith='qc_').delete()
+                self.assert_constant_queries(f'/admin/bloodbank/{model}/')
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, color='red', name='me.png'):
+        buffer = BytesIO()
+        Image.new('RGBA', (800, 600), color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_save_without_picture_change_runs_no_select(self):
+        profile = make_profile('pic_user')
+        profile = UserProfile.objects.get(pk=profile.pk)
+        profile.phone = '999'
+        with CaptureQueriesContext(connection) as ctx:
+            profile.save()
+        self.assertEqual([q['sql'].split()[0] for q in ctx.captured_queries], ['UPDATE'])
+        self.assertFalse(NotificationJob.objects.exists())
+
+    def test_upload_is_resized_in_background(self):
+        profile = make_profile('pic_user')
+        profile.profile_picture = self.upload()
+        profile.save()
+        self.assertEqual(profile.avatar_url, profile.profile_picture.url)
+
+        job = NotificationJob.objects.get(job_type='profile_picture')
+        process_batch()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+        profile.refresh_from_db()
+        self.assertTrue(profile.picture_hash)
+        for size, dimensions in PICTURE_SIZES.items():
+            with Image.open(os.path.join(self.media, picture_variant_name(profile.picture_hash, size))) as img:
+                self.assertEqual(img.format, 'JPEG')
+                self.assertLessEqual(img.size, dimensions)
+        self.assertIn(profile.picture_hash, profile.avatar_url)
+
+    def test_unchanged_image_is_not_reencoded(self):
+        first = make_profile('pic_a')
+        first.profile_picture = self.upload()
+        first.save()
+        process_batch()
+
+        second = make_profile('pic_b')
+        second.profile_picture = self.upload(name='same.png')
+        second.save()
+        with mock.patch('PIL.Image.open') as image_open:
+            process_batch()
+        image_open.assert_not_called()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.picture_hash, second.picture_hash)
+
+    def test_replacing_picture_deletes_old_file(self):
+        profile = make_profile('pic_user')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_picture = self.upload()
+            profile.save()
+        old_path = profile.profile_picture.path
+        process_batch()
+
+        profile = UserProfile.objects.get(pk=profile.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_picture = self.upload('blue', 'new.png')
+            profile.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(profile.picture_hash, '')
+
+    def test_new_picture_removes_old_variants_once_resized(self):
+        profile = make_profile('pic_user')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_picture = self.upload()
+            profile.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_batch()
+        profile.refresh_from_db()
+        old_variants = [os.path.join(self.media, picture_variant_name(profile.picture_hash, size)) for size in PICTURE_SIZES]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_picture = self.upload('blue', 'new.png')
+            profile.save()
+        # Still there until the new variants are in place
+        self.assertTrue(all(os.path.exists(path) for path in old_variants))
+        with self.captureOnCommitCallbacks(execute=True):
+            process_batch()
+        self.assertFalse(any(os.path.exists(path) for path in old_variants))
+        profile.refresh_from_db()
+        self.assertTrue(os.path.exists(os.path.join(self.media, picture_variant_name(profile.picture_hash, 'avatar'))))
+
+    def test_variants_shared_with_another_profile_are_kept(self):
+        first, second = make_profile('pic_a'), make_profile('pic_b')
+        for profile in (first, second):
+            profile.profile_picture = self.upload()
+            profile.save()
+        process_batch()
+        first.refresh_from_db()
+        shared = os.path.join(self.media, picture_variant_name(first.picture_hash, 'avatar'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.profile_picture = self.upload('blue', 'new.png')
+            first.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_batch()
+        self.assertTrue(os.path.exists(shared))
+
+    def test_deferred_picture_loaded_later_is_not_a_change(self):
+        profile = make_profile('pic_user')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.profile_picture = self.upload()
+            profile.save()
+        process_batch()
+        NotificationJob.objects.all().delete()
+
+        profile = UserProfile.objects.only('id', 'user', 'phone').get(pk=profile.pk)
+        self.assertTrue(profile.profile_picture)
+        self.assertTrue(profile.picture_hash)
+        profile.phone = '999'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertTrue(profile.picture_hash)
+        self.assertFalse(NotificationJob.objects.exists())
+
+    def test_edit_profile_upload(self):
+        profile = make_profile('pic_user')
+        self.client.force_login(profile.user)
+        response = self.client.post('/profile/edit/', {
+            'first_name': 'Pic', 'last_name': 'User', 'email': 'pic@uap.edu.bd',
+            'blood_group': 'A+', 'phone': '0123456789', 'address': 'UAP Campus, Dhaka',
+            'is_donor': 'on', 'is_available': 'on', 'profile_picture': self.upload(),
+        })
+        self.assertEqual(response.status_code, 302)
+        profile.refresh_from_db()
+        self.assertEqual(profile.user.first_name, 'Pic')
+        self.assertTrue(profile.profile_picture.name.startswith('profile_pics/'))
+        self.assertTrue(NotificationJob.objects.filter(job_type='profile_picture').exists())
+
+
+class MatchingTests(TestCase):
+    def setUp(self):
+        self.requester = User.objects.create(username='patient')
+        UserProfile.objects.create(user=self.requester, blood_group='A+', phone='1', address='x',
+                                   latitude=23.8151, longitude=90.4255)
+
+    def test_compatibility_table(self):
+        self.assertEqual(sorted(donor_groups_for('AB+')), sorted(CAN_DONATE_TO))
+        self.assertEqual(donor_groups_for('O-'), ['O-'])
+        self.assertEqual(sorted(donor_groups_for('A+')), ['A+', 'A-', 'O+', 'O-'])
+
+    def test_eligible_donors_ranked_by_exact_match_then_distance(self):
+        make_profile('o_neg_near', 'O-', latitude=23.8152, longitude=90.4256)
+        make_profile('a_pos_far', 'A+', latitude=23.8759, longitude=90.3795)
+        make_profile('a_pos_near', 'A+', latitude=23.8160, longitude=90.4260)
+        make_profile('b_pos', 'B+', latitude=23.8152, longitude=90.4256)
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='A+')
+
+        with self.assertNumQueries(2):
+            rows = eligible_donors(blood_request)
+        self.assertEqual([r['user__username'] for r in rows], ['a_pos_near', 'a_pos_far', 'o_neg_near'])
+        self.assertEqual(rows[0]['distance'], round(calculate_distance(23.8151, 90.4255, 23.8160, 90.4260), 2))
+
+        make_profile('a_pos_unlocated', 'A+')
+        with CaptureQueriesContext(connection) as ctx:
+            top = eligible_donors(blood_request, limit=2, origin=(23.8759, 90.3795))
+        # Ranked and cut in SQL, not after loading every match
+        self.assertIn('LIMIT 2', ctx.captured_queries[-1]['sql'])
+        self.assertEqual([r['user__username'] for r in top], ['a_pos_far', 'a_pos_near'])
+        self.assertEqual(
+            [r['user__username'] for r in eligible_donors(blood_request, origin=(23.8759, 90.3795))][2:],
+            ['a_pos_unlocated', 'o_neg_near'],
+        )
+
+    def test_fan_out_reaches_universal_donors(self):
+        make_profile('o_neg', 'O-')
+        make_profile('b_pos', 'B+')
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='A+')
+        self.assertEqual(send_blood_request_notifications(blood_request), 1)
+        self.assertEqual(Notification.objects.get().user.username, 'o_neg')
+
+    def test_open_requests_for_donor(self):
+        other = User.objects.create(username='other')
+        normal_exact = BloodRequest.objects.create(requester=other, blood_group='O-', urgency='normal')
+        emergency = BloodRequest.objects.create(requester=other, blood_group='AB+', urgency='emergency')
+        urgent = BloodRequest.objects.create(requester=other, blood_group='A+', urgency='urgent')
+        BloodRequest.objects.create(requester=other, blood_group='A+', status='completed')
+        donor = make_profile('universal', 'O-')
+
+        with self.assertNumQueries(1):
+            found = list(open_requests_for(donor))
+        self.assertEqual(found, [normal_exact, emergency, urgent])
+        self.assertEqual(list(open_requests_for(make_profile('ab', 'AB+'))), [emergency])
+
+
+class DonationCooldownTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.requester = User.objects.create(username='cooldown_requester')
+
+    def test_eligible_from_follows_last_donation(self):
+        profile = make_profile('donor', last_donation_date=self.today)
+        self.assertEqual(profile.eligible_from, self.today + timedelta(days=DONATION_COOLDOWN_DAYS))
+
+        profile.last_donation_date = None
+        profile.save(update_fields=['last_donation_date'])
+        profile.refresh_from_db()
+        self.assertIsNone(profile.eligible_from)
+
+    def test_donors_in_cooldown_are_not_matched(self):
+        make_profile('rested', 'O+', last_donation_date=self.today - timedelta(days=DONATION_COOLDOWN_DAYS))
+        make_profile('never', 'O+')
+        make_profile('recent', 'O+', last_donation_date=self.today - timedelta(days=7))
+
+        blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='O+')
+        self.assertEqual(
+            sorted(eligible_donors_query(blood_request).values_list('user__username', flat=True)),
+            ['never', 'rested'],
+        )
+
+        self.client.force_login(self.requester)
+        response = self.client.get('/donors/')
+        self.assertEqual(sorted(d.user.username for d in response.context['donors']), ['never', 'rested'])
+
+    def test_cooldown_end_needs_no_refresh_job(self):
+        make_profile('ends_today', last_donation_date=self.today - timedelta(days=DONATION_COOLDOWN_DAYS))
+        self.client.force_login(self.requester)
+
+        def donor_names():
+            return [d.user.username for d in self.client.get('/donors/').context['donors']]
+
+        with mock.patch('django.utils.timezone.localdate', return_value=self.today - timedelta(days=1)):
+            self.assertNotIn('ends_today', donor_names())
+        # Cached cards are keyed by date, so the next day's list is built afresh
+        self.assertIn('ends_today', donor_names())
+
+
+@override_settings(GEOCODER={
+    'BACKEND': 'UAP_Student_Blood_Information_System.bloodbank.geocoding.FixtureGeocoder',
+    'OPTIONS': {'locations': {'Mirpur': (23.8067, 90.3683), 'Uttara': (23.8759, 90.3795)}},
+})
+class GeocodingTests(TestCase):
+    def setUp(self):
+        original = FixtureGeocoder.geocode
+        patcher = mock.patch.object(FixtureGeocoder, 'geocode', autospec=True, side_effect=original)
+        self.lookups = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_is_keyed_by_normalized_address(self):
+        self.assertEqual(geocode_address('Mirpur-10, Dhaka'), (23.8067, 90.3683))
+        self.assertEqual(geocode_address('  mirpur 10   DHAKA '), (23.8067, 90.3683))
+        self.assertEqual(self.lookups.call_count, 1)
+        self.assertEqual(GeocodedAddress.objects.get().address, 'mirpur 10 dhaka')
+
+    def test_misses_are_cached_until_they_expire(self):
+        self.assertEqual(geocode_address('Nowhere'), DEFAULT_LOCATION)
+        self.assertIsNone(geocode_address('Nowhere', default=None))
+        self.assertEqual(self.lookups.call_count, 1)
+
+        GeocodedAddress.objects.update(updated_at=timezone.now() - NEGATIVE_CACHE_TTL - timedelta(minutes=1))
+        geocode_address('Nowhere')
+        self.assertEqual(self.lookups.call_count, 2)
+
+    def test_transient_errors_are_not_cached(self):
+        self.lookups.side_effect = GeocoderError('timeout')
+        self.assertEqual(geocode_address('Uttara'), DEFAULT_LOCATION)
+        self.assertFalse(GeocodedAddress.objects.exists())
+
+    def test_edit_profile_geocodes_a_changed_address(self):
+        profile = make_profile('mover', address='Mirpur, Dhaka', latitude=23.8067, longitude=90.3683)
+        self.client.force_login(profile.user)
+        self.client.post('/profile/edit/', {
+            'email': 'mover@uap.edu.bd', 'blood_group': 'A+', 'phone': '0123456789',
+            'address': 'Sector 7, Uttara', 'is_donor': 'on', 'is_available': 'on',
+        })
+        profile.refresh_from_db()
+        self.assertEqual((profile.latitude, profile.longitude), (23.8759, 90.3795))
+        self.assertEqual(profile.geo_cell, geo_cell_for(23.8759, 90.3795))
+
+    def test_backfill_resumes_from_checkpoint(self):
+        done = make_profile('done_before', address='Mirpur')
+        todo = [make_profile(f'todo_{i}', address=address) for i, address in enumerate(['Mirpur', 'Uttara', 'Atlantis'])]
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(checkpoint))
+        with open(checkpoint, 'w') as f:
+            f.write(f'{{"last_id": {done.pk}}}')
+
+        out = StringIO()
+        call_command('geocode_backfill', checkpoint=checkpoint, batch_size=2, workers=2, stdout=out)
+
+        done.refresh_from_db()
+        self.assertIsNone(done.latitude)
+        coords = [UserProfile.objects.values_list('latitude', 'longitude').get(pk=p.pk) for p in todo]
+        self.assertEqual(coords, [(23.8067, 90.3683), (23.8759, 90.3795), (None, None)])
+        self.assertEqual(UserProfile.objects.get(pk=todo[1].pk).geo_cell, geo_cell_for(23.8759, 90.3795))
+        self.assertIn('2 of 3 profiles geocoded', out.getvalue())
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_nominatim_spaces_requests_across_threads_and_rejects_bad_responses(self):
+        sent = []
+
+        def fake_urlopen(request, timeout):
+            sent.append(time.monotonic())
+            return BytesIO(b'[{"lat": "23.8067", "lon": "90.3683"}]')
+
+        geocoder = NominatimGeocoder(min_interval=0.05)
+        with mock.patch.object(geocoding, 'urlopen', fake_urlopen), ThreadPoolExecutor(max_workers=4) as pool:
+            results, stats = geocode_many(['Mirpur 1', 'Mirpur 2', 'Mirpur 10', 'Mirpur 12'], geocoder, pool)
+        self.assertEqual(stats['looked_up'], 4)
+        self.assertEqual(set(results.values()), {(23.8067, 90.3683)})
+        gaps = [later - earlier for earlier, later in zip(sent, sent[1:])]
+        self.assertTrue(all(gap >= 0.05 for gap in gaps), gaps)
+
+        for body in (b'[{"display_name": "Mirpur"}]', b'{"error": "Unable to geocode"}', b'[{"lat": null, "lon": "1"}]'):
+            with mock.patch.object(geocoding, 'urlopen', return_value=BytesIO(body)):
+                with self.assertRaises(GeocoderError):
+                    NominatimGeocoder(min_interval=0).geocode('mirpur')
+
+
+class SeedDataTests(TestCase):
+    def seed(self):
+        call_command(
+            'seed_data', donors=60, requests=20, notifications=100, seed=7, chunk_size=25, clear=True, stdout=StringIO(),
+        )
+        return list(
+            UserProfile.objects.order_by('user__username')
+            .values_list('user__username', 'blood_group', 'latitude', 'is_available', 'eligible_from')
+        )
+
+    def test_same_seed_gives_the_same_dataset(self):
+        first = self.seed()
+        self.assertEqual(len(first), 60)
+        self.assertEqual(first, self.seed())
+        self.assertEqual(BloodRequest.objects.count(), 20)
+        self.assertEqual(Notification.objects.count(), 100)
+
+    def test_rows_look_like_real_ones(self):
+        # Other threads keep saving while seeding runs: auto_now_add must stay on
+        original = Notification.objects.bulk_create
+
+        def bulk_create(*args, **kwargs):
+            self.assertTrue(Notification._meta.get_field('created_at').auto_now_add)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'bulk_create', bulk_create):
+            self.seed()
+        # One hash shared by everyone, and it is a working password
+        self.assertEqual(User.objects.values('password').distinct().count(), 1)
+        self.assertTrue(User.objects.first().check_password('password123'))
+
+        located = UserProfile.objects.filter(latitude__isnull=False).first()
+        self.assertEqual(located.geo_cell, geo_cell_for(located.latitude, located.longitude))
+        for model in (UserProfile, BloodRequest, Notification):
+            self.assertGreater(model.objects.values('created_at__date').distinct().count(), 1, model)
+
+
+class ViewBenchmarkTests(TestCase):
+    def run_bench(self, *args):
+        out = StringIO()
+        call_command(
+            'bench_views', '--donors', '30', '--requests', '10', '--notifications', '50',
+            '--iterations', '2', '--warmup', '0', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_writes_json_and_compares_against_a_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = os.path.join(directory, 'baseline.json')
+
+        self.run_bench('--output', baseline)
+        with open(baseline) as f:
+            report = json.load(f)
+        self.assertEqual(set(report['results']), {
+            'dashboard', 'donor_list_text', 'donor_list_radius', 'request_blood',
+            'notifications', 'request_history', 'notification_count',
+        })
+        self.assertGreater(report['results']['dashboard']['bytes'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='bench_views_').exists())
+
+        # One query fewer in the baseline is flagged
+        report['results']['dashboard']['queries'] -= 1
+        with open(baseline, 'w') as f:
+            json.dump(report, f)
+        with self.assertRaisesMessage(CommandError, '1 regression(s)'):
+            self.run_bench('--only', 'dashboard', '--compare', baseline, '--min-delta-ms', '10000')
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profile_store.clear()
+        self.addCleanup(profile_store.clear)
+        self.user = User.objects.create(username='profiled')
+
+    def profiled_request(self, view, **settings):
+        with override_settings(PROFILING_ENABLED=True, **settings):
+            middleware = ProfilingMiddleware(view)
+        request = RequestFactory().get('/dashboard/')
+        request.user = self.user
+        middleware(request)
+        return profile_store.entries()[0]
+
+    def test_disabled_unless_opted_in(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_records_queries_duplicates_and_template_time(self):
+        def view(request):
+            Notification.objects.filter(user=request.user, is_read=False).count()
+            Notification.objects.filter(user=request.user, is_read=False).count()
+            UserProfile.objects.filter(user=request.user).exists()
+            return render(request, 'notification_items.html', {'notifications': []})
+
+        # The navbar counter is cached, so only the view's own queries are recorded
+        cache.set(unread_count_key(self.user.pk), 0)
+        entry = self.profiled_request(view)
+        self.assertEqual((entry['status'], entry['queries'], entry['duplicates']), (200, 3, 1))
+        self.assertIn('COUNT(*)', entry['duplicated_sql'][0])
+        self.assertGreater(entry['template_ms'], 0)
+        self.assertIn('tests.py', entry['slowest'][0]['source'])
+        self.assertIsNone(entry['cprofile'])
+
+    def test_sampled_requests_are_exported_for_cprofile(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        entry = self.profiled_request(
+            lambda request: HttpResponse('ok'),
+            PROFILING_CPROFILE_RATE=1, PROFILING_CPROFILE_DIR=directory, PROFILING_CPROFILE_PATHS=['/dashboard/'],
+        )
+        self.assertTrue(os.path.exists(entry['cprofile']))
+
+    def test_report_is_staff_only(self):
+        self.profiled_request(lambda request: HttpResponse('ok'))
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/profiling/').status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertContains(self.client.get('/profiling/'), '/dashboard/')
+        self.assertEqual(self.client.get('/profiling/', {'format': 'json'}).json()['requests'][0]['path'], '/dashboard/')
+
+
+class RequestExpiryTests(TestCase):
+    def setUp(self):
+        self.requester = make_profile('requester').user
+        now = timezone.now()
+        self.overdue = [self.make_request(now - timedelta(hours=i + 1)) for i in range(5)]
+        self.future = self.make_request(now + timedelta(hours=2))
+        self.accepted = self.make_request(now - timedelta(hours=1), status='accepted')
+
+    def make_request(self, needed_by, status='pending'):
+        return BloodRequest.objects.create(
+            requester=self.requester, blood_group='A+', hospital_name='UAP Medical Center',
+            needed_by=needed_by, status=status,
+        )
+
+    def test_only_overdue_pending_requests_expire(self):
+        stats = expire_overdue_requests()
+        self.assertEqual(stats['swept'], 5)
+        self.assertEqual(stats['still_pending'], 1)
+        self.assertEqual(BloodRequest.objects.filter(status='expired').count(), 5)
+        self.future.refresh_from_db()
+        self.accepted.refresh_from_db()
+        self.assertEqual(self.future.status, 'pending')
+        self.assertEqual(self.accepted.status, 'accepted')
+
+        # A second run has nothing left to do
+        self.assertEqual(expire_overdue_requests()['swept'], 0)
+
+    def test_requesters_are_notified_in_bulk(self):
+        stats = expire_overdue_requests(batch_size=2)
+        self.assertEqual(stats['batches'], 3)
+        self.assertEqual(stats['notified'], 5)
+        notified = Notification.objects.filter(user=self.requester, notification_type='request_expired')
+        self.assertEqual(
+            set(notified.values_list('blood_request_id', flat=True)),
+            {request.pk for request in self.overdue},
+        )
+
+    def test_grace_period_and_no_notify(self):
+        stats = expire_overdue_requests(grace=timedelta(hours=3, minutes=30), notify=False)
+        self.assertEqual(stats['swept'], 2)
+        self.assertEqual(stats['notified'], 0)
+        self.assertFalse(Notification.objects.filter(notification_type='request_expired').exists())
+
+    def test_command_reports_rows_swept(self):
+        out = StringIO()
+        call_command('expire_requests', '--batch-size', '2', stdout=out)
+        self.assertIn('swept 5 requests in 3 batches', out.getvalue())
+
+
+class AcceptRequestTests(TestCase):
+    def setUp(self):
+        self.requester = make_profile('requester').user
+        self.donor = make_profile('donor').user
+        self.blood_request = BloodRequest.objects.create(requester=self.requester, blood_group='A+')
+        self.client.force_login(self.donor)
+
+    def accept(self):
+        return self.client.get(f'/accept-request/{self.blood_request.pk}/', follow=True)
+
+    def test_first_donor_wins(self):
+        self.assertContains(self.accept(), 'Request accepted successfully!')
+        self.blood_request.refresh_from_db()
+        self.assertEqual(self.blood_request.status, 'accepted')
+        self.assertEqual(self.blood_request.accepted_by, self.donor)
+
+        other = make_profile('other').user
+        self.client.force_login(other)
+        self.assertContains(self.accept(), 'already been taken')
+        self.blood_request.refresh_from_db()
+        self.assertEqual(self.blood_request.accepted_by, self.donor)
+        self.assertEqual(NotificationJob.objects.count(), 1)
+
+    def test_closed_requests_cannot_be_accepted(self):
+        BloodRequest.objects.filter(pk=self.blood_request.pk).update(status='completed')
+        self.assertContains(self.accept(), 'already been taken')
+        self.blood_request.refresh_from_db()
+        self.assertEqual(self.blood_request.status, 'completed')
+        self.assertIsNone(self.blood_request.accepted_by)
+
+
+class ConcurrentAcceptTests(TransactionTestCase):
+    DONORS = 200
+
+    def test_exactly_one_concurrent_accept_succeeds(self):
+        requester = make_profile('requester').user
+        blood_request = BloodRequest.objects.create(requester=requester, blood_group='A+')
+        donors = [make_profile(f'donor{i}').user for i in range(self.DONORS)]
+        barrier = threading.Barrier(self.DONORS)
+        results, errors = [], []
+
+        def accept(donor):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        results.append((donor, accept_blood_request(blood_request, donor)))
+                        break
+                    except OperationalError as exc:
+                        # The shared in-memory SQLite test database locks
+                        # whole tables; the transaction rolled back, try again
+                        if 'locked' not in str(exc):
+                            raise
+                        time.sleep(0.001)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=accept, args=(donor,)) for donor in donors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.DONORS)
+        winners = [donor for donor, accepted in results if accepted]
+        self.assertEqual(len(winners), 1)
+
+        blood_request.refresh_from_db()
+        self.assertEqual(blood_request.status, 'accepted')
+        self.assertEqual(blood_request.accepted_by, winners[0])
+        self.assertEqual(NotificationJob.objects.filter(job_type='request_accepted').count(), 1)
+
+
+class JsonApiTests(TestCase):
+    def setUp(self):
+        self.viewer = make_profile('api_viewer', 'O+', latitude=23.8151, longitude=90.4255)
+        make_profile('api_near_a', 'A+', latitude=23.8160, longitude=90.4260)
+        make_profile('api_near_b', 'B+', latitude=23.8200, longitude=90.4300)
+        make_profile('api_far_a', 'A+', latitude=23.8759, longitude=90.3795, address='Uttara, Dhaka')
+        self.client.force_login(self.viewer.user)
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def page_through(self, path, **params):
+        results, cursor = [], None
+        while True:
+            data = self.get(path, **params, **({'cursor': cursor} if cursor else {}))
+            results.extend(data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return results
+
+    def test_donor_search_with_field_selection_and_cursor(self):
+        data = self.get('/api/v1/donors/', fields='username,blood_group', page_size=2)
+        self.assertEqual(data['results'], [
+            {'username': 'api_far_a', 'blood_group': 'A+'}, {'username': 'api_near_b', 'blood_group': 'B+'},
+        ])
+        rest = self.get('/api/v1/donors/', fields='username', page_size=2, cursor=data['next_cursor'])
+        self.assertEqual(rest, {'results': [{'username': 'api_near_a'}], 'next_cursor': None})
+
+        data = self.get('/api/v1/donors/', blood_group='A+', location='uttara')
+        self.assertEqual([row['username'] for row in data['results']], ['api_far_a'])
+        self.assertEqual(set(data['results'][0]), set(api.DONOR_FIELDS))
+
+    def test_radius_search_pages_by_distance(self):
+        self.assertEqual(
+            self.page_through('/api/v1/donors/', radius=20, page_size=1, fields='username,distance_km'),
+            [
+                {'username': 'api_near_a', 'distance_km': round(calculate_distance(23.8151, 90.4255, 23.8160, 90.4260), 2)},
+                {'username': 'api_near_b', 'distance_km': round(calculate_distance(23.8151, 90.4255, 23.8200, 90.4300), 2)},
+                {'username': 'api_far_a', 'distance_km': round(calculate_distance(23.8151, 90.4255, 23.8759, 90.3795), 2)},
+            ],
+        )
+        data = self.get('/api/v1/donors/', radius=2, lat=23.8759, lng=90.3795, fields='username')
+        self.assertEqual(data['results'], [{'username': 'api_far_a'}])
+
+    def test_radius_search_skips_donors_gone_between_queries(self):
+        near_a = UserProfile.objects.get(user__username='api_near_a')
+        original = api.nearest_donor_ids
+
+        def nearest_then_unavailable(*args, **kwargs):
+            closest = original(*args, **kwargs)
+            UserProfile.objects.filter(pk=near_a.pk).update(is_available=False)
+            return closest
+
+        with mock.patch.object(api, 'nearest_donor_ids', nearest_then_unavailable):
+            data = self.get('/api/v1/donors/', radius=20, fields='username')
+        self.assertEqual(data['results'], [{'username': 'api_near_b'}, {'username': 'api_far_a'}])
+
+    def test_requests_and_notifications(self):
+        other = User.objects.get(username='api_near_a')
+        for blood_group in ('A+', 'O+', 'AB+'):
+            BloodRequest.objects.create(requester=other, blood_group=blood_group)
+        mine = BloodRequest.objects.create(requester=self.viewer.user, blood_group='B-', status='expired')
+
+        data = self.get('/api/v1/requests/', compatible_with='O+', fields='blood_group,requester')
+        self.assertEqual(
+            sorted(row['blood_group'] for row in data['results']), ['A+', 'AB+', 'O+'],
+        )
+        self.assertEqual(self.get('/api/v1/me/requests/', fields='id,status')['results'], [{'id': mine.pk, 'status': 'expired'}])
+        self.assertEqual(self.get('/api/v1/me/requests/', status='pending')['results'], [])
+
+        blood_request = BloodRequest.objects.create(requester=other, blood_group='O+')
+        send_blood_request_notifications(blood_request)
+        create_notification(self.viewer.user, 'system', 'Direct', 'Hello')
+        rows = self.page_through('/api/v1/me/notifications/', page_size=1, fields='type,title')
+        self.assertEqual(rows, [{'type': 'system', 'title': 'Direct'}, {'type': 'blood_request', 'title': 'New Blood Request for O+'}])
+        self.assertEqual(len(self.get('/api/v1/me/notifications/', type='system', unread='1')['results']), 1)
+
+    def test_etag_and_gzip(self):
+        for i in range(10):
+            create_notification(self.viewer.user, 'system', f'Notice {i}', 'Something long enough to compress ' * 5)
+
+        response = self.client.get('/api/v1/me/notifications/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get('/api/v1/me/notifications/', HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip').status_code, 304)
+        create_notification(self.viewer.user, 'system', 'Newer', 'Changed')
+        self.assertEqual(self.client.get('/api/v1/me/notifications/', HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+
+    def test_serializes_values_rows_without_model_instances(self):
+        with mock.patch.object(UserProfile, 'from_db', side_effect=AssertionError('model instance built')):
+            self.get('/api/v1/donors/')
+            self.get('/api/v1/donors/', radius=5)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/api/v1/donors/', {'fields': 'username,password'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/donors/', {'blood_group': 'C+'}).status_code, 400)
+        for path, params in (
+            ('/api/v1/donors/', {'radius': 5}), ('/api/v1/donors/', {}),
+            ('/api/v1/requests/', {}), ('/api/v1/me/notifications/', {}),
+        ):
+            response = self.client.get(path, {**params, 'cursor': 'bad!'})
+            self.assertEqual((response.status_code, response.json()), (400, {'error': 'Invalid cursor'}), path)
+        for radius in ('nan', 'inf', 'far'):
+            response = self.client.get('/api/v1/donors/', {'radius': radius})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('radius', response.json()['error'])
+        self.assertEqual(self.client.get('/api/v1/me/notifications/', {'type': 'spam'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/v1/donors/').status_code, 405)
+
+        self.client.logout()
+        response = self.client.get('/api/v1/donors/')
+        self.assertEqual((response.status_code, response.json()), (401, {'error': 'Authentication required'}))
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def test_tuned_sqlite_options(self):
+        options = settings.SQLITE_TUNED_OPTIONS
+        self.assertIn('PRAGMA journal_mode=WAL', options['init_command'])
+        self.assertIn('PRAGMA synchronous=NORMAL', options['init_command'])
+        self.assertGreater(options['timeout'], 0)
+
+
+class DatabaseBenchmarkTests(TestCase):
+    def test_runs_each_sqlite_mode(self):
+        out = StringIO()
+        # The command adds its own database alias, which the test has to allow
+        with mock.patch.object(type(self), 'databases', self.databases | {BENCH_ALIAS}):
+            call_command(
+                'bench_database', '--modes', 'sqlite', 'sqlite_tuned', '--threads', '2', '--duration', '0.2',
+                '--donors', '20', '--requests', '5', '--notifications', '50', stdout=out,
+            )
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('sqlite ') and lines[0].endswith('journal delete'))
+        self.assertTrue(lines[1].startswith('sqlite_tuned') and lines[1].endswith('journal wal'))
+        self.assertNotIn(BENCH_ALIAS, connections)
+
+
+
+class NotificationRetentionTests(TestCase):
+    POLICY = {'blood_request': 30, 'system': 365}
+
+    def setUp(self):
+        self.user = User.objects.create(username='retained')
+        now = timezone.now()
+        self.old_read = [self.notify('blood_request', now - timedelta(days=40 + i), is_read=True) for i in range(5)]
+        self.old_unread = self.notify('blood_request', now - timedelta(days=40))
+        self.recent_read = self.notify('blood_request', now - timedelta(days=5), is_read=True)
+        self.old_system = self.notify('system', now - timedelta(days=100), is_read=True)
+
+    def notify(self, notification_type, created_at, is_read=False):
+        notification = Notification.objects.create(
+            user=self.user, notification_type=notification_type, title='Old news', message='Something happened',
+            is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        return notification
+
+    def test_moves_only_read_rows_past_their_type_limit(self):
+        stats = archive_notifications(self.POLICY, batch_size=2)
+        self.assertEqual(stats['moved'], {'blood_request': 5, 'system': 0})
+        self.assertEqual(stats['batches'], 3)
+
+        kept = set(Notification.objects.values_list('pk', flat=True))
+        self.assertEqual(kept, {self.old_unread.pk, self.recent_read.pk, self.old_system.pk})
+        archived = ArchivedNotification.objects.get(pk=self.old_read[0].pk)
+        self.assertEqual((archived.user_id, archived.notification_type, archived.title), (self.user.pk, 'blood_request', 'Old news'))
+
+        # Nothing left to move the second time
+        self.assertEqual(archive_notifications(self.POLICY)['total'], 0)
+
+    def test_dry_run_only_counts(self):
+        stats = archive_notifications(self.POLICY, dry_run=True)
+        self.assertEqual(stats['total'], 5)
+        self.assertEqual(Notification.objects.count(), 8)
+
+    def test_file_archive_writes_one_file_per_month(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stats = archive_notifications(self.POLICY, FileArchive(directory))
+
+        files = sorted(os.listdir(directory))
+        self.assertTrue(all(re.fullmatch(r'notifications-\d{4}-\d{2}\.jsonl', name) for name in files))
+        rows = []
+        for name in files:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                rows.extend(json.loads(line) for line in f)
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(n.pk for n in self.old_read))
+        self.assertEqual(stats['archived_bytes'], sum(os.path.getsize(os.path.join(directory, name)) for name in files))
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_archives_broadcast_text_and_prunes_empty_broadcasts(self):
+        broadcast = NotificationBroadcast.objects.create(notification_type='blood_request', title='Shared', message='Once')
+        Notification.objects.filter(pk__in=[n.pk for n in self.old_read]).update(broadcast=broadcast, title='', message='')
+        kept = NotificationBroadcast.objects.create(notification_type='blood_request', title='Kept', message='Still read')
+        Notification.objects.filter(pk=self.recent_read.pk).update(broadcast=kept)
+
+        stats = archive_notifications(self.POLICY)
+        self.assertEqual(stats['pruned_broadcasts'], 1)
+        self.assertEqual(set(NotificationBroadcast.objects.values_list('pk', flat=True)), {kept.pk})
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list('title', 'message')), {('Shared', 'Once')},
+        )
+
+    def test_prunes_broadcasts_in_batches(self):
+        broadcasts = NotificationBroadcast.objects.bulk_create([
+            NotificationBroadcast(notification_type='system', title=f'Empty {i}', message='m') for i in range(5)
+        ])
+        kept = broadcasts[2]
+        Notification.objects.filter(pk=self.recent_read.pk).update(broadcast=kept)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(prune_broadcasts(batch_size=2), 4)
+        self.assertEqual(set(NotificationBroadcast.objects.values_list('pk', flat=True)), {kept.pk})
+        # One bounded DELETE per batch of ids, never the whole table at once
+        table = NotificationBroadcast._meta.db_table
+        deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(f'DELETE FROM "{table}"')]
+        self.assertEqual(len(deletes), 2)
+        self.assertTrue(all(' IN (' in sql for sql in deletes))
+
+    def test_command_reports_rows_and_bytes(self):
+        out = StringIO()
+        with override_settings(NOTIFICATION_RETENTION_DAYS=self.POLICY):
+            call_command('archive_notifications', stdout=out)
+        self.assertIn('blood_request      older than  30 days: moved 5', out.getvalue())
+        self.assertIn('5 notifications moved in 1 batches', out.getvalue())
+        self.assertIn('reclaimed', out.getvalue())
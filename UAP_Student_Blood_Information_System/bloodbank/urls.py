@@ -3,7 +3,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from UAP_Student_Blood_Information_System.bloodbank import views
+from UAP_Student_Blood_Information_System.bloodbank import views, api
 from django.views.generic import TemplateView
 
 urlpatterns = [
@@ -20,12 +20,25 @@ urlpatterns = [
     path('profile/edit/', views.edit_profile, name='edit_profile'),
     path('profile/toggle-availability/', views.toggle_availability, name='toggle_availability'),
     path('donors/', views.donor_list, name='donor_list'),
+    path('donors/page/', views.donor_list_page, name='donor_list_page'),
     path('request-blood/', views.request_blood, name='request_blood'),
     path('request-history/', views.request_history, name='request_history'),
+    path('request-history/page/', views.request_history_page, name='request_history_page'),
     path('accept-request/<int:request_id>/', views.accept_request, name='accept_request'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/page/', views.notifications_page, name='notifications_page'),
     path('notifications/count/', views.notification_count, name='notification_count'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
+    path('notifications/poll/', views.notification_poll, name='notification_poll'),
+    path('notifications/mark/', views.bulk_mark_notifications, name='bulk_mark_notifications'),
     path('notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('profiling/', views.profiling_report, name='profiling_report'),
+
+    # Read-only JSON API for the mobile and kiosk clients
+    path('api/v1/donors/', api.donors, name='api_donors'),
+    path('api/v1/requests/', api.open_requests, name='api_open_requests'),
+    path('api/v1/me/requests/', api.my_requests, name='api_my_requests'),
+    path('api/v1/me/notifications/', api.my_notifications, name='api_my_notifications'),
 ]
     
     
@@ -1,5 +1,87 @@
-from django.contrib.auth.models import User
-from .models import Notification, BloodRequest, UserProfile
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from .models import Notification, NotificationBroadcast, BloodRequest
+from .matching import eligible_donors_query, recipient_groups_for, can_donate_today
+
+# Rows per INSERT when fanning notifications out to many users
+NOTIFICATION_BATCH_SIZE = 500
+
+# Cached unread counters expire after a day even if nothing touches them
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def unread_count_key(user_id):
+    return f"unread_count:{user_id}"
+
+def notification_version_key(user_id):
+    return f"notification_version:{user_id}"
+
+def unread_count_for(user_id):
+    """Unread count from the cache, counted in the database on a miss"""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+def get_unread_count(user):
+    """
+    Unread notification count for a user. Looked up once per request (the
+    value is memoized on the user object), served from the cache, and only
+    counted in the database on a cache miss.
+    """
+    if not user.is_authenticated:
+        return 0
+
+    count = getattr(user, '_unread_count', None)
+    if count is None:
+        count = unread_count_for(user.pk)
+        user._unread_count = count
+    return count
+
+def get_notification_version(user_id):
+    """Changes whenever the user's notifications do, 0 if never recorded"""
+    return cache.get(notification_version_key(user_id)) or 0
+
+def bump_notification_versions(user_ids):
+    """
+    Give users a new notification version once the transaction commits.
+    Push and long-poll clients watch this key instead of querying the table.
+    """
+    keys = [notification_version_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), UNREAD_COUNT_TIMEOUT))
+
+def mark_notifications(user, notifications, is_read=True):
+    """
+    Set is_read on the user's notifications in the queryset with one
+    UPDATE, skipping rows already in that state. Returns the number of rows
+    changed and the new unread count. The cached counter is dropped rather
+    than set to that count: a notification created by another process after
+    the recount would otherwise be overwritten by a stale value.
+    """
+    changed = notifications.filter(user=user, is_read=not is_read).update(is_read=is_read)
+    if not changed:
+        return 0, get_unread_count(user)
+    count = Notification.objects.filter(user=user, is_read=False).count()
+    user._unread_count = count
+    invalidate_unread_counts([user.pk])
+    return changed, count
+
+def invalidate_unread_counts(user_ids):
+    """
+    Drop cached counters once the transaction commits, one cache round-trip;
+    the next read counts them. Changes are never applied as increments: the
+    cache is shared by the web and worker processes, and its incr is a read
+    then a write that two processes could interleave.
+    """
+    keys = [unread_count_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+    bump_notification_versions(user_ids)
 
 def create_notification(user, notification_type, title, message, blood_request=None):
     """
@@ -12,27 +94,79 @@ def create_notification(user, notification_type, title, message, blood_request=N
         message=message,
         blood_request=blood_request
     )
+    invalidate_unread_counts([user.pk])
     return notification
 
-def send_blood_request_notifications(blood_request):
+def bulk_create_notifications(notifications, batch_size=NOTIFICATION_BATCH_SIZE):
     """
-    Send notifications to potential donors when a new blood request is created
+    Insert an iterable of unsaved Notification objects in chunked
+    bulk_create calls inside one transaction. Returns the number created.
+    """
+    created = 0
+    user_ids = set()
+    with transaction.atomic():
+        batch = []
+        for notification in notifications:
+            batch.append(notification)
+            user_ids.add(notification.user_id)
+            if len(batch) >= batch_size:
+                Notification.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            Notification.objects.bulk_create(batch)
+            created += len(batch)
+        invalidate_unread_counts(user_ids)
+    return created
+
+def broadcast_notifications(notification_type, title, message, deliveries, blood_request=None):
+    """
+    Fan one notification out: the text is stored once in a
+    NotificationBroadcast, each recipient only gets a compact Notification
+    row pointing at it. deliveries yields (user_id, blood_request_id) pairs.
+    Returns the number of recipients.
     """
-    # Find available donors with matching blood group
-    matching_donors = UserProfile.objects.filter(
-        blood_group=blood_request.blood_group,
-        is_donor=True,
-        is_available=True
-    ).exclude(user=blood_request.requester)
-
-    for donor_profile in matching_donors:
-        create_notification(
-            user=donor_profile.user,
-            notification_type='blood_request',
-            title=f"New Blood Request for {blood_request.blood_group}",
-            message=f"Urgent: {blood_request.requester.username} needs {blood_request.units_required} unit(s) of {blood_request.blood_group} blood at {blood_request.hospital_name}. Please check if you can help.",
+    with transaction.atomic():
+        broadcast = NotificationBroadcast.objects.create(
+            notification_type=notification_type,
+            title=title,
+            message=message,
             blood_request=blood_request
         )
+        created = bulk_create_notifications(
+            Notification(
+                user_id=user_id,
+                notification_type=notification_type,
+                broadcast=broadcast,
+                blood_request_id=blood_request_id
+            )
+            for user_id, blood_request_id in deliveries
+        )
+        if not created:
+            broadcast.delete()
+    return created
+
+def blood_request_notification_text(blood_request):
+    """Title and message every donor gets for a new blood request"""
+    title = f"New Blood Request for {blood_request.blood_group}"
+    message = f"Urgent: {blood_request.requester.username} needs {blood_request.units_required} unit(s) of {blood_request.blood_group} blood at {blood_request.hospital_name}. Please check if you can help."
+    return title, message
+
+def send_blood_request_notifications(blood_request):
+    """
+    Send notifications to potential donors when a new blood request is created
+    """
+    # Find available donors with a compatible blood group, only their user ids are needed
+    recipient_ids = eligible_donors_query(blood_request).values_list('user_id', flat=True)
+
+    # Same text for every donor, stored once
+    title, message = blood_request_notification_text(blood_request)
+
+    return broadcast_notifications(
+        'blood_request', title, message,
+        ((user_id, blood_request.pk) for user_id in recipient_ids.iterator(chunk_size=NOTIFICATION_BATCH_SIZE)),
+        blood_request=blood_request
+    )
 
 def send_request_accepted_notification(blood_request):
     """ 
@@ -50,17 +184,20 @@ def send_donor_available_notifications(donor_profile):
     """ 
     Send notifications to requesters when new donors become available
     """ 
-    # Find pending requests that match the donor's blood group
+    # A donor in the cooldown after a donation cannot help yet
+    if not can_donate_today(donor_profile):
+        return 0
+
+    # Find pending requests the donor's blood group can serve
     matching_requests = BloodRequest.objects.filter(
-        blood_group=donor_profile.blood_group,
+        blood_group__in=recipient_groups_for(donor_profile.blood_group),
         status='pending'
-    )
+    ).exclude(requester_id=donor_profile.user_id).only('id', 'requester_id')
 
-    for request in matching_requests:
-        create_notification(
-            user=request.requester,
-            notification_type='donor_available',
-            title=f"New Donor Available for {request.blood_group}",
-            message=f"A new donor with {donor_profile.blood_group} blood type has become available in your area.",
-            blood_request=request
-        )
\ No newline at end of file
+    title = f"New Donor Available for {donor_profile.blood_group}"
+    message = f"A new donor with {donor_profile.blood_group} blood type has become available in your area."
+
+    return broadcast_notifications(
+        'donor_available', title, message,
+        ((request.requester_id, request.pk) for request in matching_requests.iterator(chunk_size=NOTIFICATION_BATCH_SIZE))
+    )
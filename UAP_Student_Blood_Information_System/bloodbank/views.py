@@ -1,16 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils import timezone
+from django.conf import settings
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from .forms import CustomUserCreationForm, BloodRequestForm, ProfileEditForm
 from .models import UserProfile, BloodRequest, Notification
-from .utils import send_blood_request_notifications, send_request_accepted_notification, send_donor_available_notifications
+from .dispatch import enqueue, accept_blood_request
+from .utils import get_unread_count, invalidate_unread_counts, mark_notifications
+from .pagination import keyset_page, page_size_from, encode_cursor, decode_cursor, older_than
+from .caching import cached_cards, ALL_BLOOD_GROUPS
+from .profiling import store as profile_store
+from .matching import open_requests_for, recipient_groups_for, can_donate_today
+from .search import available_donors, float_param, search_origin, DEFAULT_SEARCH_RADIUS_KM, MAX_SEARCH_RADIUS_KM
+from .realtime import notification_events, notification_changes, notification_etag, wait_for_change, LONG_POLL_TIMEOUT, WSGI_POLL_INTERVAL
 from django.shortcuts import render
 
-from .geolocation import geocode_address, get_nearby_donors
+from .geocoding import geocode_address
+from .geolocation import get_nearby_donors, nearest_donors
 from .models import BLOOD_GROUPS
 
 from .models import UserProfile, BloodRequest, Notification, BLOOD_GROUPS
@@ -18,6 +32,12 @@ from .models import UserProfile, BloodRequest, Notification, BLOOD_GROUPS
 from django.contrib.auth import logout
 from django.contrib import messages
 
+# Open requests shown on the dashboard, and how many are cached per blood group
+DASHBOARD_OPEN_REQUESTS = 3
+OPEN_REQUEST_CARDS = 20
+
+# Most ids one bulk_mark_notifications request may list
+MARK_NOTIFICATIONS_MAX_IDS = 500
 
 def home(request):
     """Home page view"""
@@ -33,14 +53,15 @@ def edit_profile(request):
         profile_obj = UserProfile.objects.create(user=request.user)
 
     if request.method == 'POST':
+        # is_valid() copies the posted values onto the instance, read it first
+        old_address = profile_obj.address
         form = ProfileEditForm(request.POST, request.FILES, instance=profile_obj)
 
         if form.is_valid():
-            old_address = profile_obj.address
-
             remove_picture = request.POST.get('remove_picture') == 'true'
             if remove_picture and profile_obj.profile_picture:
-                profile_obj.profile_picture.delete(save=False)
+                # The model removes the old file once the change is saved
+                profile_obj.profile_picture = None
 
             profile = form.save(commit=False)
 
@@ -49,7 +70,8 @@ def edit_profile(request):
                 profile.latitude = lat
                 profile.longitude = lng
 
-            profile.save()
+            # Saves the user fields too; resizing happens in the background worker
+            form.save()
 
             messages.success(request, 'Profile updated successfully!')
             return redirect('profile')
@@ -71,57 +93,122 @@ def donor_list(request):
     blood_group = request.GET.get('blood_group', '')
     location = request.GET.get('location', '')
     use_radius = request.GET.get('use_radius', False)
-    
-    # Start with all available donors (excluding current user)
-    donors = UserProfile.objects.filter(
-        is_donor=True,
-        is_available=True
-    ).exclude(user=request.user)
-
-    # Apply blood group filter if provided
-    if blood_group:
-        donors = donors.filter(blood_group=blood_group)
-
-    # Apply location filter if provided (simple text search in address)
-    if location:
-        donors = donors.filter(address__icontains=location)
+    radius = float_param(request, 'radius', DEFAULT_SEARCH_RADIUS_KM)
+    radius = min(max(radius, 0.1), MAX_SEARCH_RADIUS_KM)
+    page_size = page_size_from(request)
 
     # Use BLOOD_GROUPS from models instead of UserProfile.BLOOD_GROUPS
     from .models import BLOOD_GROUPS  # Add this import
     blood_groups = BLOOD_GROUPS
 
-    # For radius search demonstration 
+    # Radius search around explicit coordinates or the viewer's own profile
     search_type = 'radius' if use_radius else 'text'
-    if use_radius:
-        for donor in donors:
-            donor.distance = round(0.5 + (donor.id * 0.1), 2)  # Mock distance
+    origin = None
+    next_cursor = None
+    if not use_radius:
+        donors, donor_cards, next_cursor = _donor_cards(
+            request.user, blood_group, location, request.GET.get('cursor'), page_size
+        )
+    else:
+        origin = search_origin(request)
+        if origin:
+            donors = available_donors(blood_group, location).exclude(user=request.user)
+            donors = nearest_donors(origin[0], origin[1], radius, page_size, donors)
+        else:
+            donors = []
+            messages.error(request, 'Set your address in your profile or share your location to search by radius.')
+        # Distances depend on the origin, so radius results are not cached
+        donor_cards = render_to_string('donor_cards.html', {'donors': donors})
 
     unread_count = get_unread_notification_count(request.user)
 
     return render(request, 'donor_list.html', {
         'donors': donors,
+        'donor_cards': donor_cards,
         'blood_groups': blood_groups, 
         'selected_blood_group': blood_group,
         'selected_location': location,
         'search_type': search_type,
+        'radius': radius,
+        'page_size': page_size,
+        'origin': origin,
+        'next_cursor': next_cursor,
         'unread_count': unread_count,
     })
 
 
+@login_required
+def donor_list_page(request):
+    """Next page of the text-mode donor list as JSON, for "Load more" """
+    _, donor_cards, next_cursor = _donor_cards(
+        request.user,
+        request.GET.get('blood_group', ''),
+        request.GET.get('location', ''),
+        request.GET.get('cursor'),
+        page_size_from(request),
+    )
+    return JsonResponse({'html': donor_cards, 'next_cursor': next_cursor})
+
+
+def _donor_cards(viewer, blood_group, location, cursor, page_size):
+    """
+    Text-mode page of donor cards as (donors, html, next_cursor). Cards are
+    cached per filter and blood group version for every viewer alike; the
+    viewer's own card is dropped afterwards, so a hit runs no SQL.
+    """
+    def build():
+        # One row for the viewer's card and one to tell if there is a next page
+        rows, _ = keyset_page(available_donors(blood_group, location), cursor, page_size + 2)
+        return [(donor, render_to_string('donor_card.html', {'donor': donor})) for donor in rows]
+
+    cards = cached_cards(
+        'donor_cards', 'donors', [blood_group] if blood_group else ALL_BLOOD_GROUPS,
+        # Eligibility depends on the date
+        (blood_group, location.lower(), cursor or '', page_size, timezone.localdate()),
+        build,
+    )
+    cards = [(donor, html) for donor, html in cards if donor.user_id != viewer.pk]
+    page = cards[:page_size]
+    next_cursor = encode_cursor(page[-1][0].created_at, page[-1][0].pk) if len(cards) > page_size else None
+    return [donor for donor, _ in page], mark_safe(''.join(html for _, html in page)), next_cursor
+
+
+def _page_response(request, template_name, context, next_cursor):
+    return JsonResponse({
+        'html': render_to_string(template_name, context, request=request),
+        'next_cursor': next_cursor,
+    })
+
 
 @login_required
 def request_history(request):
-    # Get user's blood requests
-    user_requests = BloodRequest.objects.filter(requester=request.user).order_by('-created_at')
+    # Get user's blood requests, one keyset page at a time
+    user_requests, next_cursor = keyset_page(
+        BloodRequest.objects.filter(requester=request.user).select_related('accepted_by'),
+        request.GET.get('cursor'),
+        page_size_from(request),
+    )
     unread_count = get_unread_notification_count(request.user)
     
     return render(request, 'request_history.html', {
         'user_requests': user_requests,
+        'next_cursor': next_cursor,
         'user': request.user,
         'unread_count': unread_count,
     })
 
 
+@login_required
+def request_history_page(request):
+    """Next page of request history as JSON, for "Load more" """
+    user_requests, next_cursor = keyset_page(
+        BloodRequest.objects.filter(requester=request.user).select_related('accepted_by'),
+        request.GET.get('cursor'),
+        page_size_from(request),
+    )
+    return _page_response(request, 'request_items.html', {'user_requests': user_requests}, next_cursor)
+
+
 
 
 @login_required
@@ -133,8 +220,8 @@ def request_blood(request):
             blood_request.requester = request.user
             blood_request.save()
            
-            from .utils import send_blood_request_notifications
-            send_blood_request_notifications(blood_request)
+            # Fan-out runs in the notification worker, not in this request
+            enqueue('blood_request', f'blood_request:{blood_request.pk}', blood_request_id=blood_request.pk)
             
             messages.success(request, 'Blood request submitted successfully!')
             return redirect('request_history')
@@ -189,18 +276,19 @@ def dashboard(request):
         profile = None
 
     # Get user's blood requests
-    user_requests = BloodRequest.objects.filter(requester=request.user).order_by('-created_at')[:5]
+    user_requests = BloodRequest.objects.filter(requester=request.user).only(
+        'id', 'blood_group', 'status', 'hospital_name', 'units_required', 'created_at'
+    ).order_by('-created_at')[:5]
 
-    # Get pending requests for user's blood group (if user is donor)
-    pending_requests = []
-    if profile and profile.is_donor and profile.is_available:
-        pending_requests = BloodRequest.objects.filter(
-            blood_group=profile.blood_group,
-            status='pending'
-        ).exclude(requester=request.user).order_by('-urgency', '-created_at')[:3]
+    # Get pending requests the user can donate to (if user is donor)
+    pending_requests, pending_request_cards = [], ''
+    if profile and profile.is_donor and profile.is_available and can_donate_today(profile):
+        pending_requests, pending_request_cards = _open_request_cards(profile, DASHBOARD_OPEN_REQUESTS)
 
     # Get recent notifications
-    recent_notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:5]
+    recent_notifications = Notification.objects.filter(user=request.user).select_related('broadcast').only(
+        'id', 'title', 'message', 'is_read', 'created_at', 'broadcast__title', 'broadcast__message'
+    ).order_by('-created_at')[:5]
     
     # Calculate unread count
     unread_count = get_unread_notification_count(request.user)
@@ -210,11 +298,38 @@ def dashboard(request):
         'profile': profile,
         'user_requests': user_requests,
         'pending_requests': pending_requests,
+        'pending_request_cards': pending_request_cards,
         'recent_notifications': recent_notifications,
         'unread_count': unread_count,
     })
 
 
+def _open_request_cards(profile, limit):
+    """
+    The first open requests profile can serve, as (requests, html). Cards are
+    cached per donor blood group and the versions of the groups it can give
+    to; the donor's own requests are dropped afterwards.
+    """
+    fields = ('id', 'requester_id', 'blood_group', 'urgency', 'hospital_name', 'needed_by', 'created_at')
+
+    def render_cards(requests):
+        return [
+            (blood_request, render_to_string('open_request_card.html', {'blood_request': blood_request}))
+            for blood_request in requests
+        ]
+
+    cached = cached_cards(
+        'open_requests', 'requests', recipient_groups_for(profile.blood_group), (profile.blood_group,),
+        lambda: render_cards(open_requests_for(profile, exclude_own=False).only(*fields)[:OPEN_REQUEST_CARDS]),
+    )
+    cards = [(blood_request, html) for blood_request, html in cached if blood_request.requester_id != profile.user_id]
+    if len(cards) < limit and len(cached) == OPEN_REQUEST_CARDS:
+        # The donor's own requests crowded out the cached ones, ask the database
+        cards = render_cards(open_requests_for(profile).only(*fields)[:limit])
+    page = cards[:limit]
+    return [blood_request for blood_request, _ in page], mark_safe(''.join(html for _, html in page))
+
+
 #profile
 # Update other views to include unread_count
 @login_required
@@ -236,7 +351,7 @@ def profile(request):
 
 #function to calculate unread notifications
 def get_unread_notification_count(user):
-    return Notification.objects.filter(user=user, is_read=False).count()
+    return get_unread_count(user)
 
     # Start with all available donors (excluding current user)
     donors = UserProfile.objects.filter(
@@ -270,73 +385,154 @@ def get_unread_notification_count(user):
 
 
 @login_required
-# In bloodbank/views.py - UPDATE edit_profile FUNCTION:
-
-@login_required
-def edit_profile(request):
-    try:
-        profile_obj = UserProfile.objects.get(user=request.user)
-    except UserProfile.DoesNotExist:
-        profile_obj = UserProfile.objects.create(user=request.user)
-
-    if request.method == 'POST':
-        form = ProfileEditForm(request.POST, instance=profile_obj)
-        if form.is_valid():
-            old_address = profile_obj.address
-            profile = form.save()
-            
-            # ✅ UPDATE GEOLOCATION if address changed
-            if old_address != profile.address:
-                lat, lng = geocode_address(profile.address)
-                profile.latitude = lat
-                profile.longitude = lng
-                profile.save()
-            
-            messages.success(request, 'Profile updated successfully!')
-            return redirect('profile')
+def notifications(request):
+    user_notifications = Notification.objects.filter(user=request.user)
+    page, next_cursor = keyset_page(
+        user_notifications.select_related('broadcast'), request.GET.get('cursor'), page_size_from(request)
+    )
+
+    # Mark all as read when user visits notifications page, up to the newest
+    # one shown: anything that arrived after the page was read stays unread
+    if page:
+        _, unread_count = mark_notifications(
+            request.user, user_notifications.filter(older_than(page[0].created_at, page[0].pk, inclusive=True))
+        )
     else:
-        form = ProfileEditForm(instance=profile_obj)
+        unread_count = get_unread_count(request.user)
 
-    unread_count = get_unread_notification_count(request.user)
-    return render(request, 'edit_profile.html', {
-        'form': form,
-        'profile': profile_obj,
+    return render(request, 'notifications.html', {
+        'notifications': page,
+        'next_cursor': next_cursor,
         'user': request.user,
         'unread_count': unread_count,
     })
-    
-
-
 
 
 @login_required
-def notifications(request):
-    user_notifications = Notification.objects.filter(user=request.user)
+def notifications_page(request):
+    """Next page of notifications as JSON, for "Load more" """
+    page, next_cursor = keyset_page(
+        Notification.objects.filter(user=request.user).select_related('broadcast'),
+        request.GET.get('cursor'),
+        page_size_from(request),
+    )
+    return _page_response(request, 'notification_items.html', {'notifications': page}, next_cursor)
 
-    # Mark all as read when user visits notifications page
-    user_notifications.filter(is_read=False).update(is_read=True)
 
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
-    
-    return render(request, 'notifications.html', {
-        'notifications': user_notifications,
-        'user': request.user,
-        'unread_count': unread_count,
-    })
 
 
 
+@login_required
+def bulk_mark_notifications(request):
+    """
+    Mark notifications read, or unread with read=0, in one UPDATE. Pick them
+    with repeated `ids`, `before` (a notifications cursor: that row and all
+    older ones) or `type`; given together they narrow each other. Returns
+    how many changed and the new unread count.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=405)
+
+    ids, before, notification_type = request.POST.getlist('ids'), request.POST.get('before'), request.POST.get('type')
+    if not (ids or before or notification_type):
+        return JsonResponse({'error': 'Give ids, before or type'}, status=400)
+
+    selected = Notification.objects.all()
+    if ids:
+        try:
+            ids = [int(notification_id) for notification_id in ids]
+        except ValueError:
+            return JsonResponse({'error': 'Invalid ids'}, status=400)
+        if len(ids) > MARK_NOTIFICATIONS_MAX_IDS:
+            return JsonResponse({'error': f'At most {MARK_NOTIFICATIONS_MAX_IDS} ids'}, status=400)
+        selected = selected.filter(pk__in=ids)
+    if before:
+        position = decode_cursor(before)
+        if position is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        selected = selected.filter(older_than(*position, inclusive=True))
+    if notification_type:
+        if notification_type not in dict(Notification.NOTIFICATION_TYPES):
+            return JsonResponse({'error': 'Unknown type'}, status=400)
+        selected = selected.filter(notification_type=notification_type)
+
+    changed, count = mark_notifications(request.user, selected, is_read=request.POST.get('read', '1') != '0')
+    return JsonResponse({'changed': changed, 'count': count})
 
 
 @login_required
 def notification_count(request):
     """API endpoint to get unread notification count (for AJAX updates)"""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        count = get_unread_count(request.user)
         return JsonResponse({'count': count})
     return JsonResponse({'error': 'Invalid request'})
 
 
+def _last_notification_id(request):
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        return max(int(last_id), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events push of new notifications and unread count changes"""
+    # A WSGI server would buffer the whole stream, 204 tells EventSource to
+    # give up so the page falls back to long-polling
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    response = StreamingHttpResponse(
+        notification_events(user.pk, _last_notification_id(request)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _set_poll_interval(request, response):
+    """Under WSGI polls are answered at once, so the client has to pace itself"""
+    if not isinstance(request, ASGIRequest):
+        response['X-Poll-Interval'] = WSGI_POLL_INTERVAL
+
+
+@login_required
+async def notification_poll(request):
+    """
+    Long-poll fallback for the push channel. Waits while the client's ETag
+    is current and answers 304 at the timeout, so idle clients never touch
+    the database. Holding the request open needs ASGI: under WSGI every
+    waiting client would pin a worker thread, so the poll is answered at
+    once and X-Poll-Interval tells the client how long to wait before the
+    next one.
+    """
+    user = await request.auser()
+    etag = request.headers.get('If-None-Match')
+    if isinstance(request, ASGIRequest):
+        # Clients behind proxies with short idle timeouts can ask for less
+        timeout = min(max(float_param(request, 'timeout', LONG_POLL_TIMEOUT), 0), LONG_POLL_TIMEOUT)
+    else:
+        timeout = 0
+    version = await wait_for_change(user.pk, etag, timeout)
+    if version is None:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        _set_poll_interval(request, response)
+        return response
+
+    changes = await sync_to_async(notification_changes)(user.pk, _last_notification_id(request))
+    response = JsonResponse(changes)
+    response['ETag'] = notification_etag(user.pk, version)
+    response['Cache-Control'] = 'no-cache'
+    _set_poll_interval(request, response)
+    return response
+
+
 
 
 
@@ -351,8 +547,11 @@ def toggle_availability(request):
         
         # ✅ ADD NOTIFICATION: If becoming available, notify matching requests
         if not old_availability and profile.is_available:
-            from .utils import send_donor_available_notifications
-            send_donor_available_notifications(profile)
+            enqueue(
+                'donor_available',
+                f'donor_available:{profile.pk}:{timezone.now().timestamp()}',
+                profile_id=profile.pk,
+            )
         
         messages.success(request, f'Availability set to {profile.is_available}')
         return redirect('profile')
@@ -364,19 +563,15 @@ def toggle_availability(request):
 def accept_request(request, request_id):
     """Accept a blood request"""
     blood_request = get_object_or_404(BloodRequest, id=request_id)
-    if request.user != blood_request.requester:
-        blood_request.accepted_by = request.user
-        blood_request.accepted_at = timezone.now()
-        blood_request.status = 'accepted'
-        blood_request.save()
-        
-        # ✅ ADD NOTIFICATION: Notify requester
-        from .utils import send_request_accepted_notification
-        send_request_accepted_notification(blood_request)
-        
-        messages.success(request, 'Request accepted successfully!')
-    else:
+    if request.user == blood_request.requester:
         messages.error(request, 'You cannot accept your own request!')
+        return redirect('dashboard')
+
+    if not accept_blood_request(blood_request, request.user):
+        messages.error(request, 'This request has already been taken or is no longer open.')
+        return redirect('dashboard')
+
+    messages.success(request, 'Request accepted successfully!')
     return redirect('dashboard')
 
 
@@ -386,9 +581,13 @@ def accept_request(request, request_id):
 def mark_notification_read(request, notification_id):
     """Mark notification as read"""
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-        notification.is_read = True
-        notification.save()
+        updated = Notification.objects.filter(
+            id=notification_id, user=request.user, is_read=False
+        ).update(is_read=True)
+        if updated:
+            invalidate_unread_counts([request.user.pk])
+        else:
+            get_object_or_404(Notification, id=notification_id, user=request.user)
         return JsonResponse({'success': True})
     return JsonResponse({'error': 'Invalid request'})
 
@@ -405,4 +604,21 @@ def custom_logout(request):
     return render(request, 'logout.html', {
         'user': request.user,
         'unread_count': unread_count,
-    })
\ No newline at end of file
+    })
+
+
+@staff_member_required
+def profiling_report(request):
+    """Recent request profiles recorded by ProfilingMiddleware, for staff"""
+    if request.method == 'POST':
+        profile_store.clear()
+        return redirect('profiling_report')
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'summary': profile_store.summary(), 'requests': profile_store.entries()})
+
+    return render(request, 'profiling.html', {
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'summary': profile_store.summary(),
+        'entries': profile_store.entries(),
+    })
@@ -0,0 +1,29 @@
+// "Load more" buttons: fetch the next keyset page as JSON and append its HTML.
+// The current page's query string (filters) is kept, only the cursor changes.
+document.addEventListener('click', function(event) {
+    const button = event.target.closest('.load-more');
+    if (!button) {
+        return;
+    }
+
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', button.dataset.cursor);
+    button.disabled = true;
+
+    fetch(`${button.dataset.url}?${params.toString()}`, {
+        headers: {'X-Requested-With': 'XMLHttpRequest'}
+    })
+    .then(response => response.json())
+    .then(data => {
+        document.getElementById(button.dataset.target).insertAdjacentHTML('beforeend', data.html);
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    })
+    .catch(() => {
+        button.disabled = false;
+    });
+});
@@ -0,0 +1,60 @@
+// Push channel for notifications: Server-Sent Events when the server runs
+// under ASGI, otherwise polling with ETag/If-None-Match (held open under
+// ASGI, paced by X-Poll-Interval under WSGI). Either way new
+// notifications are prepended to #notification-items and the badge is updated.
+(function() {
+    const list = document.querySelector('[data-last-id]');
+    let lastId = list ? list.dataset.lastId : '0';
+    let etag = null;
+
+    function apply(data) {
+        lastId = String(data.last_id);
+        if (data.html) {
+            const items = document.getElementById('notification-items');
+            if (items) {
+                items.insertAdjacentHTML('afterbegin', data.html);
+            }
+        }
+        renderNotificationCount(data.count);
+    }
+
+    function longPoll() {
+        const headers = {'X-Requested-With': 'XMLHttpRequest'};
+        if (etag) {
+            headers['If-None-Match'] = etag;
+        }
+        // Set when the server runs under WSGI and cannot hold the poll open
+        let interval = 0;
+        fetch(`/notifications/poll/?last_id=${lastId}`, {headers: headers})
+            .then(response => {
+                interval = Number(response.headers.get('X-Poll-Interval')) || 0;
+                if (response.status === 304) {
+                    return null;
+                }
+                etag = response.headers.get('ETag');
+                return response.json();
+            })
+            .then(data => {
+                if (data) {
+                    apply(data);
+                }
+                setTimeout(longPoll, interval * 1000);
+            })
+            .catch(() => setTimeout(longPoll, 5000));
+    }
+
+    if (!window.EventSource) {
+        longPoll();
+        return;
+    }
+
+    const source = new EventSource(`/notifications/stream/?last_id=${lastId}`);
+    source.addEventListener('notifications', event => apply(JSON.parse(event.data)));
+    source.onerror = () => {
+        // CLOSED means the server refused the stream (e.g. no ASGI server),
+        // otherwise EventSource reconnects by itself
+        if (source.readyState === EventSource.CLOSED) {
+            longPoll();
+        }
+    };
+})();